@@ -0,0 +1,102 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+#!/bin/bash
+
+#Configures one of the masternodes of a server and runs its daemon as a systemd unit
+#Usage: mn_colocate.sh <unit> <datadir> <conf> <ip> <port> <rpc port> <genkey> <daemon> <cli> [<max memory MB>]
+set -e
+unit="$1"
+datadir="$2"
+conf="$3"
+ip="$4"
+port="$5"
+rpc_port="$6"
+genkey="$7"
+daemon="$8"
+cli="$9"
+max_memory_mb="${10}"
+pid_file="$datadir/$(basename "$daemon").pid"
+
+#Routes the masternode's IP to the server, unless it has it already
+interface="$(ip route show default | awk '{print $5; exit}')"
+main_ip="$(ip -4 route get 1.1.1.1 | awk '{for (i = 1; i < NF; i++) if ($i == "src") print $(i + 1)}')"
+ip -o addr show | grep -q " $ip/" || ip addr add "$ip/32" dev "$interface"
+
+#Persists the additional IPs of all masternodes in the network config, so they are bound after a reboot
+path_ips=/root/.pymasternode/ips
+mkdir -p "$(dirname "$path_ips")"
+touch "$path_ips"
+if [ "$ip" != "$main_ip" ] && ! grep -qx "$ip" "$path_ips"; then
+  echo "$ip" >> "$path_ips"
+fi
+if [ -s "$path_ips" ]; then
+  if [ -d /etc/netplan ]; then
+    {
+      printf '%s\n' "network:" "  version: 2" "  ethernets:" "    $interface:" "      addresses:"
+      sed 's|.*|        - &/32|' "$path_ips"
+    } > /etc/netplan/60-pymasternode.yaml
+    chmod 600 /etc/netplan/60-pymasternode.yaml
+    netplan generate
+  else
+    mkdir -p /etc/network/interfaces.d
+    grep -q '^source /etc/network/interfaces.d/' /etc/network/interfaces \
+      || echo 'source /etc/network/interfaces.d/*' >> /etc/network/interfaces
+    awk -v interface="$interface" '{
+      printf "auto %s:%d\niface %s:%d inet static\n    address %s/32\n\n", interface, NR, interface, NR, $0
+    }' "$path_ips" > /etc/network/interfaces.d/60-pymasternode
+  fi
+fi
+
+#Stops a daemon which was not started by the unit, e.g. by the wallet's setup script
+if ! systemctl is-active --quiet "$unit" && [ -f "$pid_file" ]; then
+  "$cli" -datadir="$datadir" stop || true
+  while [ -f "$pid_file" ]; do sleep 1; done
+fi
+
+mkdir -p "$datadir"
+touch "$conf"
+grep -q '^rpcuser=' "$conf" || echo "rpcuser=$(head -c 16 /dev/urandom | od -An -tx1 | tr -d ' \n')" >> "$conf"
+grep -q '^rpcpassword=' "$conf" || echo "rpcpassword=$(head -c 32 /dev/urandom | od -An -tx1 | tr -d ' \n')" >> "$conf"
+sed -i '/^\(daemon\|server\|listen\|port\|bind\|externalip\|rpcport\|rpcbind\|rpcallowip\|masternode\|masternodeprivkey\|dbcache\|maxmempool\)=/d' "$conf"
+
+#Every daemon binds to its own IP, and its caches are sized by its memory cap
+dbcache=100
+if [ -n "$max_memory_mb" ]; then
+  dbcache=$((max_memory_mb / 4 > 4 ? max_memory_mb / 4 : 4))
+fi
+printf '%s\n' \
+  "daemon=0" "server=1" "listen=1" "port=$port" "bind=$ip:$port" "externalip=$ip" \
+  "rpcport=$rpc_port" "rpcbind=127.0.0.1" "rpcallowip=127.0.0.1" \
+  "masternode=1" "masternodeprivkey=$genkey" "dbcache=$dbcache" "maxmempool=$dbcache" >> "$conf"
+
+printf '%s\n' \
+  "[Unit]" \
+  "Description=$unit" \
+  "Wants=network-online.target" \
+  "After=network-online.target" \
+  "" \
+  "[Service]" \
+  "ExecStart=$daemon -datadir=$datadir -conf=$conf -pid=$pid_file -printtoconsole=0" \
+  "ExecStop=$cli -datadir=$datadir -conf=$conf stop" \
+  "Restart=on-failure" \
+  "RestartSec=30" \
+  "TimeoutStopSec=600" \
+  ${max_memory_mb:+"MemoryMax=${max_memory_mb}M"} \
+  "" \
+  "[Install]" \
+  "WantedBy=multi-user.target" > "/etc/systemd/system/$unit.service"
+
+systemctl daemon-reload
+systemctl enable "$unit"
+systemctl restart "$unit"
@@ -16,6 +16,6 @@
 #Donwloads and sets up wallet
 wget http://cryptopowered.club/glt/setup.sh
 chmod 777 setup.sh
-./setup.sh %s
+./setup.sh "$@"
 sleep 10
 /root/globaltoken/bin/globaltoken-cli -getinfo | grep "[b]locks"
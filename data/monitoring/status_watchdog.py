@@ -13,40 +13,56 @@
 
 # !/usr/bin/env python3
 
+import glob
 import json
+import os
 import subprocess
 
 from . import telegram_bot
 
-last_status = ""
-current_status = ""
-
-with open("/root/monitoring/last_status.txt", "r") as f:
-    last_status = f.read()
-
 HOSTNAME = subprocess.run(  # noqa: S607
     "hostname", stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True
 ).stdout.decode("utf-8")
 
-try:
-    status_json = subprocess.run(
-        ["/root/globaltoken/bin/globaltoken-cli", "masternode", "status"],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        check=True,
-        encoding="utf-8",
-    )
-    current_status = json.loads(status_json.stdout.decode("utf-8"))["status"]
-
-except (subprocess.CalledProcessError, json.decoder.JSONDecodeError) as e:
-    print("Error getting status")
-    telegram_bot.send_message("Error getting status on {}".format(HOSTNAME))
-
-if last_status not in ("", current_status):
-    telegram_bot.send_message(
-        "Status change from {} to {} on {}".format(
-            last_status, current_status, HOSTNAME
+# Every masternode of the server has its own data directory, the first one the default
+for datadir in ["/root/.globaltoken", *sorted(glob.glob("/root/.globaltoken-*"))]:
+    if not os.path.isfile(os.path.join(datadir, "globaltoken.conf")):
+        continue
+
+    # The first masternode keeps the status file of servers with one masternode
+    suffix = datadir[len("/root/.globaltoken"):]
+    path_last_status = "/root/monitoring/last_status{}.txt".format(suffix)
+    last_status = ""
+    current_status = ""
+
+    if os.path.isfile(path_last_status):
+        with open(path_last_status, "r") as f:
+            last_status = f.read()
+
+    try:
+        status_json = subprocess.run(
+            [
+                "/root/globaltoken/bin/globaltoken-cli",
+                "-datadir={}".format(datadir),
+                "masternode",
+                "status",
+            ],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            check=True,
+            encoding="utf-8",
+        )
+        current_status = json.loads(status_json.stdout)["status"]
+
+    except (subprocess.CalledProcessError, json.decoder.JSONDecodeError) as e:
+        print("Error getting status of {}".format(datadir))
+        telegram_bot.send_message("Error getting status of {} on {}".format(datadir, HOSTNAME))
+
+    if last_status not in ("", current_status):
+        telegram_bot.send_message(
+            "Status change from {} to {} of {} on {}".format(
+                last_status, current_status, datadir, HOSTNAME
+            )
         )
-    )
-with open("/root/monitoring/last_status.txt", "w") as f:
-    f.write(current_status)
+    with open(path_last_status, "w") as f:
+        f.write(current_status)
@@ -13,13 +13,25 @@
 
 #!/usr/bin/env bash
 
-if pgrep globaltokend >/dev/null 2>&1; then
-  :
+#Every masternode of the server has its own data directory, the first one the default
+for datadir in /root/.globaltoken /root/.globaltoken-*; do
+  [ -f "$datadir/globaltoken.conf" ] || continue
 
-else
-  /root/globaltoken/bin/globaltokend
-  python3 -c "import telegram_bot; telegram_bot.send_message('Remote wallet restart on $(hostname).')"
-fi
+  if [ -f "$datadir/globaltokend.pid" ] && kill -0 "$(cat "$datadir/globaltokend.pid")" 2>/dev/null; then
+    continue
+  fi
+
+  #Masternodes set up by colocation run as systemd units, see data/mn_colocate.sh
+  index="${datadir#/root/.globaltoken}"
+  index="${index#-}"
+  unit="globaltoken-mn${index:-0}"
+  if systemctl cat "$unit" >/dev/null 2>&1; then
+    systemctl restart "$unit"
+  else
+    /root/globaltoken/bin/globaltokend -datadir="$datadir" -daemon
+  fi
+  python3 -c "import telegram_bot; telegram_bot.send_message('Remote wallet restart of $datadir on $(hostname).')"
+done
 python3 -c "import telegram_bot; import status_watchdog"
 
 if (($(wc -l /tmp/cron_watchdog.log | awk '{print $1}') >= 10000)); then
@@ -13,12 +13,14 @@
 
 #!/bin/bash
 
-#Creates swap
-sudo fallocate -l 1G /swapfile
-sudo chmod 600 /swapfile
-sudo mkswap /swapfile
-sudo swapon /swapfile
-sudo echo '/swapfile swap swap defaults 0 0' | sudo tee -a /etc/fstab
+#Creates swap, unless it already exists
+if [ ! -f /swapfile ]; then
+  sudo fallocate -l 1G /swapfile
+  sudo chmod 600 /swapfile
+  sudo mkswap /swapfile
+fi
+swapon --show=NAME --noheadings | grep -qx /swapfile || sudo swapon /swapfile
+grep -q '^/swapfile ' /etc/fstab || echo '/swapfile swap swap defaults 0 0' | sudo tee -a /etc/fstab
 
 #Updates packages and installs fail2ban
 apt update
@@ -0,0 +1,50 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+#!/bin/bash
+
+#Shares the chain of a synced data directory with the data directory of a new masternode
+#Usage: share_chain.sh <source datadir> <new datadir>, the source's daemon has to be stopped
+set -e
+src="$1"
+dst="$2"
+
+if [ -d "$dst/blocks" ]; then
+  echo "$dst has its own chain already"
+  exit 0
+fi
+mkdir -p "$dst/blocks"
+
+newest="$(find "$src/blocks" -maxdepth 1 -name 'blk*.dat' | sort | tail -n 1)"
+newest_number="$(basename "$newest" .dat | cut -c4-)"
+
+for file in "$src"/blocks/blk*.dat "$src"/blocks/rev*.dat; do
+  [ -e "$file" ] || continue
+  name="$(basename "$file")"
+  number="$(basename "$name" .dat | cut -c4-)"
+
+  #Block and undo files before the newest are never written again, so they are shared,
+  #as a copy-on-write reflink if the filesystem supports it, as a hardlink otherwise
+  if [[ "$number" < "$newest_number" ]]; then
+    cp --reflink=always "$file" "$dst/blocks/$name" 2>/dev/null || ln -f "$file" "$dst/blocks/$name"
+  else
+    cp --reflink=auto "$file" "$dst/blocks/$name"
+  fi
+done
+
+#The block index and the chainstate are databases written by every daemon, so they are copied
+for dir in blocks/index chainstate; do
+  if [ -d "$src/$dir" ]; then
+    cp -a --reflink=auto "$src/$dir" "$dst/$dir"
+  fi
+done
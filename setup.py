@@ -47,6 +47,7 @@ setup(
     packages=["pymasternode"],
     install_requires=[
         "html2text",
+        "aiohttp",
         "attrs",
         "bcrypt",
         "certifi",
@@ -0,0 +1,576 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""asyncio versions of the Vultr API, the wallet and vps.Instance.
+
+Waiting is done in coroutines instead of sleeping threads or greenlets, so thousands
+of instances can be set up concurrently from one event loop:
+
+    >>> async def setup(labels):
+    ...     async with AsyncVultr() as vultr:
+    ...         await gather_limited(
+    ...             [AsyncInstance(label, vultr=vultr).complete_setup() for label in labels], 100
+    ...         )
+    >>> asyncio.run(setup(labels))
+
+The blocking API in vps and wallet is unchanged.
+"""
+
+import asyncio
+import functools
+import json
+import shlex
+from pathlib import PosixPath
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import aiohttp
+
+from src import journal, keys, pymasternode, vps, wallet
+from src.coin import Coin
+from src.helpers import (
+    Genkey,
+    Label,
+    ReceivingAddress,
+    Subid,
+    async_call_until_returns_true,
+    gather_limited,
+)
+from src.wallet import MasternodeListEntry
+
+VULTR_API_ENDPOINT: str = "https://api.vultr.com"
+# The OSID of servers created from a snapshot
+VULTR_SNAPSHOT_OS_ID: int = 164
+
+
+async def _communicate(
+        process: asyncio.subprocess.Process, stdin: Optional[bytes] = None
+) -> Tuple[bytes, bytes]:
+    """Communicate with a subprocess, killing it if cancelled, e.g. by a timeout."""
+    try:
+        return await process.communicate(stdin)
+    except asyncio.CancelledError:
+        if process.returncode is None:
+            process.kill()
+        raise
+
+
+class AsyncVultr:
+    """A client of the Vultr API v1 that is rate limited without blocking the event loop.
+
+    Use as an async context manager, or call close when done.
+
+    """
+
+    def __init__(
+            self,
+            api_key: Optional[str] = None,
+            requests_per_second: float = 2.0,
+            endpoint: str = VULTR_API_ENDPOINT,
+    ) -> None:
+        self.api_key: str = api_key if api_key is not None else pymasternode.VULTR.api_key
+        self.endpoint: str = endpoint
+        self.request_interval_seconds: float = 1 / requests_per_second
+        self.request_count: int = 0
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._rate_lock: Optional[asyncio.Lock] = None
+        self._next_request: float = 0.0
+
+    async def __aenter__(self) -> "AsyncVultr":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _wait_for_slot(self) -> None:
+        if self._rate_lock is None:
+            self._rate_lock = asyncio.Lock()
+
+        async with self._rate_lock:
+            now: float = asyncio.get_running_loop().time()
+            delay: float = max(self._next_request - now, 0.0)
+            self._next_request = max(self._next_request, now) + self.request_interval_seconds
+
+        await asyncio.sleep(delay)
+
+    async def request(
+            self, path: str, params: Optional[Dict[str, Any]] = None, method: str = "GET"
+    ) -> Any:
+        """Send a request to the API.
+
+        Raises RuntimeError if the API returns an error.
+
+        Args:
+            path: The path of the API call, e.g. /v1/server/list
+            params: The parameters of the API call
+            method: GET or POST
+
+        Returns:
+            The parsed JSON response, an empty dict if the response is empty
+
+        """
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=60)
+            )
+
+        await self._wait_for_slot()
+        self.request_count += 1
+        params = {key: str(value) for key, value in (params or {}).items()}
+
+        async with self._session.request(
+                method,
+                self.endpoint + path,
+                params=params if method == "GET" else None,
+                data=params if method == "POST" else None,
+                headers={"API-Key": self.api_key},
+        ) as response:
+            text: str = await response.text()
+            if response.status != 200:
+                raise RuntimeError(f"Vultr API error {response.status} on {path}: {text}")
+
+        return json.loads(text) if text else {}
+
+    async def server_list(self, subid: Optional[Subid] = None) -> Dict[str, Any]:
+        return await self.request("/v1/server/list", {"SUBID": subid} if subid else None)
+
+    async def server_create(
+            self, dcid: int, vpsplanid: int, osid: int, params: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        return await self.request(
+            "/v1/server/create",
+            {**(params or {}), "DCID": dcid, "VPSPLANID": vpsplanid, "OSID": osid},
+            "POST",
+        )
+
+    async def server_destroy(self, subid: Subid) -> None:
+        await self.request("/v1/server/destroy", {"SUBID": subid}, "POST")
+
+    async def server_reboot(self, subid: Subid) -> None:
+        await self.request("/v1/server/reboot", {"SUBID": subid}, "POST")
+
+    async def server_reinstall(self, subid: Subid) -> None:
+        await self.request("/v1/server/reinstall", {"SUBID": subid}, "POST")
+
+    async def server_label_set(self, subid: Subid, label: Label) -> None:
+        await self.request("/v1/server/label_set", {"SUBID": subid, "label": label}, "POST")
+
+    async def server_list_ipv4(self, subid: Subid) -> List[Dict[str, Any]]:
+        return (await self.request("/v1/server/list_ipv4", {"SUBID": subid}))[str(subid)]
+
+    async def server_create_ipv4(self, subid: Subid, reboot: bool = False) -> None:
+        await self.request(
+            "/v1/server/create_ipv4", {"SUBID": subid, "reboot": "yes" if reboot else "no"}, "POST"
+        )
+
+    async def snapshot_create(self, subid: Subid, description: str = "") -> str:
+        return (
+            await self.request(
+                "/v1/snapshot/create", {"SUBID": subid, "description": description}, "POST"
+            )
+        )["SNAPSHOTID"]
+
+    async def snapshot_list(self) -> Dict[str, Any]:
+        return await self.request("/v1/snapshot/list")
+
+    async def snapshot_destroy(self, snapshot_id: str) -> None:
+        await self.request("/v1/snapshot/destroy", {"SNAPSHOTID": snapshot_id}, "POST")
+
+
+class AsyncWallet:
+    """A client of a coin's wallet that calls its RPC server, or its cli if RPC is not configured."""
+
+    def __init__(self, coin: Optional[Coin] = None) -> None:
+        self.coin: Coin = coin if coin is not None else wallet.DEFAULT_COIN
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def __aenter__(self) -> "AsyncWallet":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def rpc_batch(self, calls: List[Tuple[str, List[Any]]]) -> List[Dict[str, Any]]:
+        """Send multiple calls to the wallet's RPC server in one request, see wallet.rpc_batch."""
+        if self.coin.rpc_url is None:
+            raise ValueError(f"No RPC server configured for {self.coin.name}.")
+
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                auth=aiohttp.BasicAuth(self.coin.rpc_user or "", self.coin.rpc_password or ""),
+                timeout=aiohttp.ClientTimeout(total=60),
+            )
+
+        async with self._session.post(
+                self.coin.rpc_url,
+                json=[
+                    {"jsonrpc": "1.0", "id": i, "method": method, "params": params}
+                    for i, (method, params) in enumerate(calls)
+                ],
+        ) as response:
+            response.raise_for_status()
+            replies: List[Dict[str, Any]] = await response.json(content_type=None)
+
+        return sorted(replies, key=lambda reply: reply["id"])
+
+    async def call(self, method: str, *params: Any) -> Any:
+        """Call a wallet command, see wallet.call."""
+        if self.coin.rpc_url is not None:
+            reply: Dict[str, Any] = (await self.rpc_batch([(method, list(params))]))[0]
+            if reply["error"]:
+                raise wallet.RpcError(reply["error"])
+            return reply["result"]
+
+        process: asyncio.subprocess.Process = await asyncio.create_subprocess_exec(
+            str(self.coin.path_wallet_cli),
+            "-server",
+            method,
+            *[param if isinstance(param, str) else json.dumps(param) for param in params],
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        stdout, stderr = await process.communicate()
+        if process.returncode != 0:
+            raise wallet.RpcError({"code": process.returncode, "message": stderr.decode().strip()})
+
+        output: str = stdout.decode().strip()
+        try:
+            return json.loads(output)
+        except json.decoder.JSONDecodeError:
+            return output
+
+    async def generate_address(self, label: Label) -> ReceivingAddress:
+        return ReceivingAddress(await self.call("getnewaddress", str(label)))
+
+    async def generate_genkey(self) -> Genkey:
+        if self.coin.secret_key_version is not None:
+            return keys.generate_genkey(self.coin)
+
+        return Genkey(await self.call(self.coin.node_term, "genkey"))
+
+    async def get_masternode_list(self) -> Dict[str, MasternodeListEntry]:
+        return wallet.parse_masternode_list(
+            await self.call(self.coin.node_term, "list", "full")
+        )
+
+    async def start_alias(self, label: Label) -> Dict[str, Any]:
+        return await self.call(self.coin.node_term, "start-alias", label)
+
+    async def wait_for_confirmations(
+            self, txid: str, min_conf: int = 1, call_interval_seconds: float = 10.0
+    ) -> None:
+        """Return once a transaction has min_conf confirmations."""
+
+        async def is_confirmed() -> bool:
+            return (await self.call("gettransaction", txid))["confirmations"] >= min_conf
+
+        await async_call_until_returns_true(
+            is_confirmed, call_interval_seconds=call_interval_seconds
+        )
+
+
+class AsyncInstance(vps.Instance):
+    """A vps.Instance whose setup steps are coroutines.
+
+    SSH commands and file transfers are run with the ssh and scp binaries as
+    asyncio subprocesses, using the key configured in data/Settings.json.
+
+    Setup stages are recorded in the journal module, or in setup_journal if passed,
+    which has to provide the same functions. They are recorded in the default executor,
+    so that the journal's commits do not block the event loop.
+
+    """
+
+    def __init__(
+            self,
+            label: Label,
+            coin: Optional[Coin] = None,
+            vultr: Optional[AsyncVultr] = None,
+            async_wallet: Optional[AsyncWallet] = None,
+            setup_journal: Any = journal,
+    ) -> None:
+        super().__init__(label, coin)
+        self.journal: Any = setup_journal
+        self.vultr: AsyncVultr = vultr if vultr is not None else AsyncVultr()
+        self.async_wallet: AsyncWallet = (
+            async_wallet if async_wallet is not None else AsyncWallet(self.coin)
+        )
+
+    async def is_built(self) -> bool:
+        server_info: Dict[str, str] = await self.vultr.server_list(self.subid)
+
+        if server_info["status"] == "active" and server_info["server_state"] == "ok":
+            self.ip = server_info["main_ip"]
+            return True
+
+        return False
+
+    async def create(
+            self, delay_return_until_built: bool = True, snapshot_id: Optional[str] = None
+    ) -> Subid:
+        """Create the server, see vps.Instance.create.
+
+        Args:
+            delay_return_until_built: If True, do not return until the server is built
+            snapshot_id: Create the server from this snapshot instead of the configured OS
+
+        """
+        vps_settings: Dict[str, Any] = pymasternode.CONFIG["vps"]
+        params: Dict[str, Any] = {
+            "SSHKEYID": vps_settings["ssh_keys"],
+            "SCRIPTID": vps_settings["script_id"],
+            "hostname": self.hostname,
+            "label": self.label,
+            "tag": self.coin.name,
+        }
+        if snapshot_id is not None:
+            params["SNAPSHOTID"] = snapshot_id
+
+        await self.journal_stage("create_requested")
+        created_server = Subid(
+            (
+                await self.vultr.server_create(
+                    vps_settings["location_id"],
+                    vps_settings["plan_id"],
+                    vps_settings["os_id"] if snapshot_id is None else VULTR_SNAPSHOT_OS_ID,
+                    params=params,
+                )
+            )["SUBID"]
+        )
+        self._subid = created_server
+        await self.journal_stage("created", subid=created_server)
+
+        if delay_return_until_built:
+            await async_call_until_returns_true(self.is_built, call_interval_seconds=5.0)
+            await self.journal_stage("built", subid=self.subid, ip=self.ip)
+
+        return created_server
+
+    async def reboot(self) -> None:
+        await self.vultr.server_reboot(self.subid)
+
+    async def destroy(self) -> None:
+        await self.vultr.server_destroy(self.subid)
+
+    async def reinstall(self) -> None:
+        await self.vultr.server_reinstall(self.subid)
+        self.markers = None
+
+    def _ssh_options(self) -> List[str]:
+        return [
+            "-i",
+            str(vps.privkey),
+            "-o",
+            "BatchMode=yes",
+            "-o",
+            "StrictHostKeyChecking=accept-new",
+            "-o",
+            "ConnectTimeout=60",
+        ]
+
+    async def command_send(self, commands: List[str], stdin: Optional[bytes] = None) -> Tuple[int, str, str]:
+        """Run commands on the instance.
+
+        Args:
+            commands: The commands to run, joined with &&
+            stdin: Data to send to the standard input of the commands
+
+        Returns:
+            The exit code, stdout and stderr
+
+        """
+        process: asyncio.subprocess.Process = await asyncio.create_subprocess_exec(
+            "ssh",
+            *self._ssh_options(),
+            f"root@{self.ip}",
+            " && ".join(commands),
+            stdin=asyncio.subprocess.PIPE if stdin is not None else asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        stdout, stderr = await _communicate(process, stdin)
+
+        return process.returncode, stdout.decode(errors="replace"), stderr.decode(errors="replace")
+
+    async def send_files(self, path_from: PosixPath, path_to: PosixPath, is_dir: bool = False) -> None:
+        process: asyncio.subprocess.Process = await asyncio.create_subprocess_exec(
+            "scp",
+            *self._ssh_options(),
+            *(["-r"] if is_dir else []),
+            str(path_from),
+            f"root@{self.ip}:{path_to}",
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        _, stderr = await _communicate(process)
+        if process.returncode != 0:
+            raise RuntimeError(f"Sending {path_from} to {self.ip} failed: {stderr.decode().strip()}")
+
+    async def _run_script(self, name: str, *args: str, then: Optional[str] = None) -> None:
+        """Stream a script in data to bash's stdin on the instance, in one SSH session.
+
+        The script's commands read /dev/null as their stdin, see vps.isolate_stdin.
+        The command then is run after the script, only if it succeeded.
+        """
+        script: bytes = vps.isolate_stdin(
+            (pymasternode.PATH_PROJECT_ROOT / "data" / name).read_text()
+        ).encode()
+        exit_code, _, stderr = await self.command_send(
+            [" ".join(["bash", "-s", "--", *map(shlex.quote, args)]), *([then] if then else [])],
+            stdin=script,
+        )
+        if exit_code != 0:
+            raise RuntimeError(f"{name} failed on {self.ip}: {stderr.strip()}")
+
+    async def fetch_markers(self) -> Dict[str, str]:
+        """Get the checksums of the completed setup steps, see vps.Instance.markers."""
+        if self._markers is None:
+            exit_code, stdout, _ = await self.command_send([vps.MARKERS_COMMAND])
+            if exit_code != 0:
+                return {}
+            self._markers = vps.parse_markers(stdout.splitlines())
+
+        return self._markers
+
+    async def _run_step(
+            self, step: str, name: str, force: bool, host_arg: Optional[str] = None
+    ) -> bool:
+        # The same checksum as vps.Instance's, so that either skips the steps of the other
+        inputs: List[str] = [host_arg] if host_arg is not None else []
+        checksum: str = vps.get_step_checksum(pymasternode.PATH_PROJECT_ROOT / "data" / name, *inputs)
+        if not force and (await self.fetch_markers()).get(step) == checksum:
+            return False
+
+        await self._run_script(
+            name, *(host_arg.split() if host_arg is not None else []),
+            then=vps.get_marker_command(step, checksum),
+        )
+        if self._markers is not None:
+            self._markers[step] = checksum
+
+        return True
+
+    async def pre_setup(self, force: bool = False) -> bool:
+        """Stream pre_setup.sh unless it already completed on the host, see vps.Instance.pre_setup."""
+        return await self._run_step("pre_setup", "pre_setup.sh", force)
+
+    async def install_mn(self, force: bool = False) -> bool:
+        """Stream mn_setup.sh unless it already completed on the host, see vps.Instance.install_mn."""
+        return await self._run_step("install_mn", "mn_setup.sh", force, self.get_host_arg())
+
+    async def is_synced(self, delay_return_until_synced: bool = True) -> bool:
+        if delay_return_until_synced:
+            await async_call_until_returns_true(
+                self.is_synced, [False], call_interval_seconds=10.0
+            )
+            return True
+
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=60)) as session:
+            async with session.get(self.coin.sync_source_url) as response:
+                json_data: Dict[str, Any] = json.loads(await response.text())
+        block_height_global: int = functools.reduce(
+            lambda data, key: data[key], self.coin.sync_source_height_keys, json_data
+        )
+
+        exit_code, stdout, _ = await self.command_send(
+            [f"{self.coin.path_remote_wallet_cli} getblockcount"]
+        )
+        if exit_code != 0:
+            return False
+
+        return (int(stdout.strip()) + 100) >= block_height_global
+
+    async def complete_setup(self, delay_return_until_synced: bool = True) -> None:
+        """Run all setup stages, skipping the ones the journal marks as completed, see vps.Instance."""
+        await self.resume_from_journal()
+
+        if self.subid is None:
+            await self.create(delay_return_until_built=False)
+
+        for stage in await self._in_executor(self.get_pending_stages):
+            await getattr(self, vps.SETUP_STEPS[stage])()
+            await self.journal_stage(stage, subid=self.subid, ip=self.ip)
+
+        await self.finish_setup(delay_return_until_synced)
+
+    async def resume_from_journal(self) -> None:
+        """Set the journaled subid and IP, adopting the server of an interrupted create."""
+        last_stage: Optional[str] = await self._in_executor(self.restore_server_info)
+        if last_stage == "create_requested" and self.subid is None:
+            await self.adopt_existing()
+
+    async def adopt_existing(self) -> bool:
+        """Look up a server with this instance's label and adopt its subid, see vps.Instance."""
+        for server_info in (await self.vultr.server_list()).values():
+            if server_info["label"] == self.label:
+                self.subid = server_info["SUBID"]
+                await self.journal_stage("created", subid=self.subid)
+                return True
+
+        return False
+
+    async def wait_until_built(self) -> None:
+        await async_call_until_returns_true(self.is_built, call_interval_seconds=5.0)
+
+    async def journal_stage(
+            self, stage: str, subid: Optional[str] = None, ip: Optional[str] = None
+    ) -> None:
+        """Record a stage like record_stage, in the default executor as the journal commits blocking."""
+        await self._in_executor(self.record_stage, stage, subid=subid, ip=ip)
+
+    async def _in_executor(self, function: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(
+            None, functools.partial(function, *args, **kwargs)
+        )
+
+    async def finish_setup(self, delay_return_until_synced: bool = True) -> None:
+        """Record the synced stage once the wallet is synced, the last step of complete_setup."""
+        if await self.is_synced(delay_return_until_synced):
+            await self.journal_stage("synced")
+
+
+async def complete_setups(
+        labels: List[Label],
+        coin: Optional[Coin] = None,
+        max_concurrency: int = 100,
+        delay_return_until_synced: bool = True,
+) -> List[Any]:
+    """Set up many instances concurrently, sharing one Vultr client.
+
+    Args:
+        labels: Labels of the instances to set up
+        coin: The coin of the instances, wallet.DEFAULT_COIN if not provided
+        max_concurrency: Maximum number of instances being set up at the same time
+        delay_return_until_synced: if True, do not return until the wallets are synced
+
+    Returns:
+        None for every instance set up successfully, the raised exception otherwise
+
+    """
+    async with AsyncVultr() as vultr:
+        return await gather_limited(
+            [
+                AsyncInstance(label, coin, vultr=vultr).complete_setup(delay_return_until_synced)
+                for label in labels
+            ],
+            max_concurrency,
+        )
@@ -0,0 +1,187 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Capture the output of remote commands with a fixed memory budget.
+
+Only the last lines of every host's stdout and stderr are kept in memory. If a spill
+directory is set, the full output is streamed into gzip files there, one per host and
+stream, and indexed by host and command in an SQLite database next to them:
+
+    >>> capture = OutputCapture(tail_lines=20, path_spill_dir=PosixPath("data/output"))
+    >>> results = vps.run_script(hosts, path_script, capture=capture)
+    >>> for entry in capture.find(host="1.2.3.4"):
+    ...     print(entry.command, list(read_spill(entry.path_stdout))[-100:])
+
+"""
+
+import gzip
+import hashlib
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque, namedtuple
+from pathlib import PosixPath
+from typing import Any, Deque, Iterable, Iterator, List, Optional, Tuple
+
+from src.helpers import Command, Path
+
+CapturedOutput = namedtuple("CapturedOutput", ["stdout", "stderr", "output_id"])
+
+IndexEntry = namedtuple(
+    "IndexEntry",
+    ["output_id", "host", "command", "timestamp", "path_stdout", "path_stderr", "stdout_lines", "stderr_lines"],
+)
+
+
+def read_spill(path: Path) -> Iterator[str]:
+    """Lazily read the lines of a spilled output file."""
+    with gzip.open(path, "rt") as spill:
+        for line in spill:
+            yield line.rstrip("\n")
+
+
+class OutputCapture:
+    """A capture mode for the output of remote commands.
+
+    The capture only holds its settings until it spills, so it can be passed to
+    worker processes, see sharding.ShardedExecutor.
+
+    Args:
+        tail_lines: The number of last lines of stdout and stderr kept in memory per host
+        path_spill_dir: Directory of the spilled output and its index, nothing is spilled if None
+
+    """
+
+    def __init__(self, tail_lines: int = 100, path_spill_dir: Optional[Path] = None) -> None:
+        self.tail_lines: int = tail_lines
+        self.path_spill_dir: Optional[PosixPath] = (
+            PosixPath(path_spill_dir) if path_spill_dir is not None else None
+        )
+        self._db: Optional[sqlite3.Connection] = None
+        self._lock: threading.Lock = threading.Lock()
+
+    def __getstate__(self) -> dict:
+        return {"tail_lines": self.tail_lines, "path_spill_dir": self.path_spill_dir}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__(state["tail_lines"], state["path_spill_dir"])
+
+    def _get_db(self) -> sqlite3.Connection:
+        if self._db is None:
+            self.path_spill_dir.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(
+                self.path_spill_dir / "index.db", check_same_thread=False, timeout=60
+            )
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS outputs(host TEXT NOT NULL, command TEXT NOT NULL,"
+                " timestamp REAL NOT NULL, path_stdout TEXT, path_stderr TEXT,"
+                " stdout_lines INTEGER, stderr_lines INTEGER)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS outputs_host ON outputs(host, timestamp)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS outputs_command ON outputs(command, timestamp)")
+            self._db.commit()
+
+        return self._db
+
+    def _consume(self, lines: Optional[Iterable[str]], path: Optional[PosixPath]) -> Tuple[List[str], int]:
+        tail: Deque[str] = deque(maxlen=self.tail_lines)
+        count: int = 0
+
+        spill: Any = gzip.open(path, "wt", compresslevel=6) if path is not None else None
+        try:
+            for line in lines or ():
+                tail.append(line)
+                count += 1
+                if spill is not None:
+                    spill.write(line + "\n")
+        finally:
+            if spill is not None:
+                spill.close()
+
+        return list(tail), count
+
+    def capture(
+            self,
+            host: str,
+            command: Command,
+            stdout: Optional[Iterable[str]],
+            stderr: Optional[Iterable[str]],
+    ) -> CapturedOutput:
+        """Consume the output of a command on a host, keeping the last lines and spilling the rest.
+
+        Args:
+            host: The host the command ran on
+            command: The command, as it is indexed
+            stdout: The lines of stdout, consumed lazily
+            stderr: The lines of stderr, consumed lazily
+
+        Returns:
+            The last lines of stdout and stderr, and the id of the spilled output in the index,
+            None if nothing was spilled
+
+        """
+        if self.path_spill_dir is None:
+            return CapturedOutput(self._consume(stdout, None)[0], self._consume(stderr, None)[0], None)
+
+        timestamp: float = time.time()
+        # The uuid keeps the names of the same command on a host in the same millisecond apart
+        name: str = "{}-{}-{}-{}".format(
+            host.replace(":", "_"),
+            hashlib.sha256(command.encode()).hexdigest()[:12],
+            int(timestamp * 1000),
+            uuid.uuid4().hex,
+        )
+        path_stdout: PosixPath = self.path_spill_dir / f"{name}.stdout.gz"
+        path_stderr: PosixPath = self.path_spill_dir / f"{name}.stderr.gz"
+        # Creates the directory before the files are written
+        db: sqlite3.Connection = self._get_db()
+
+        tail_stdout, stdout_lines = self._consume(stdout, path_stdout)
+        tail_stderr, stderr_lines = self._consume(stderr, path_stderr)
+
+        with self._lock:
+            cursor: sqlite3.Cursor = db.execute(
+                "INSERT INTO outputs VALUES(?, ?, ?, ?, ?, ?, ?)",
+                (host, command, timestamp, str(path_stdout), str(path_stderr), stdout_lines, stderr_lines),
+            )
+            db.commit()
+
+        return CapturedOutput(tail_stdout, tail_stderr, cursor.lastrowid)
+
+    def find(
+            self, host: Optional[str] = None, command: Optional[Command] = None, since: float = 0.0
+    ) -> List[IndexEntry]:
+        """Find spilled outputs in the index.
+
+        Args:
+            host: Only outputs of this host
+            command: Only outputs of this command
+            since: Only outputs of commands started after this point in time, as returned by time.time()
+
+        Returns:
+            The matching index entries, oldest first
+
+        """
+        if self.path_spill_dir is None:
+            return []
+
+        with self._lock:
+            rows: List[tuple] = self._get_db().execute(
+                "SELECT rowid, * FROM outputs WHERE (? IS NULL OR host = ?)"
+                " AND (? IS NULL OR command = ?) AND timestamp >= ? ORDER BY timestamp",
+                (host, host, command, command, since),
+            ).fetchall()
+
+        return [IndexEntry(*row) for row in rows]
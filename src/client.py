@@ -0,0 +1,161 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""A thin command line client of the controller daemon.
+
+Only the standard library is imported, so that a command costs a few milliseconds
+on top of the controller's answer:
+
+    $ python -m src.client serve &
+    $ python -m src.client status MN001
+    $ python -m src.client run --labels MN001 MN002 -- uptime
+
+"""
+
+import argparse
+import http.client
+import json
+import socket
+import sys
+import urllib.parse
+from pathlib import PosixPath
+from typing import Any, Dict, List, Optional
+
+# The Unix socket the controller listens on
+PATH_SOCKET: PosixPath = PosixPath(__file__).parents[1] / "data" / "controller.sock"
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """An HTTP connection over a Unix socket."""
+
+    def __init__(self, path_socket: PosixPath, timeout: float = 600.0) -> None:
+        super().__init__("localhost", timeout=timeout)
+        self.path_socket: PosixPath = path_socket
+
+    def connect(self) -> None:
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(str(self.path_socket))
+
+
+def request(
+        path: str,
+        params: Optional[Dict[str, Any]] = None,
+        body: Optional[Dict[str, Any]] = None,
+        path_socket: PosixPath = PATH_SOCKET,
+) -> Any:
+    """Send a request to the controller.
+
+    Args:
+        path: The path of the endpoint, e.g. /status
+        params: Query parameters, None values are left out
+        body: The JSON body of a POST request, a GET request is sent if None
+        path_socket: The Unix socket of the controller
+
+    Returns:
+        The decoded JSON answer
+
+    Raises:
+        RuntimeError: If the controller answers with an error
+
+    """
+    query: str = urllib.parse.urlencode(
+        {key: value for key, value in (params or {}).items() if value is not None}
+    )
+    connection: UnixHTTPConnection = UnixHTTPConnection(path_socket)
+    try:
+        connection.request(
+            "GET" if body is None else "POST",
+            f"{urllib.parse.quote(path)}?{query}" if query else urllib.parse.quote(path),
+            body=None if body is None else json.dumps(body),
+            headers={"Content-Type": "application/json"},
+        )
+        response: http.client.HTTPResponse = connection.getresponse()
+        answer: Any = json.loads(response.read())
+    finally:
+        connection.close()
+
+    if response.status != 200:
+        raise RuntimeError(answer.get("error", response.reason))
+
+    return answer
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(prog="pymasternode")
+    parser.add_argument("--socket", type=PosixPath, default=PATH_SOCKET, help="socket of the controller")
+    parser.add_argument("--coin", help="the coin to use, the controller's default coin if not provided")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve = commands.add_parser("serve", help="run the controller")
+    serve.add_argument("--port", type=int, help="also listen on this port of localhost, without run")
+
+    status = commands.add_parser("status", help="status of own masternodes")
+    status.add_argument("key", nargs="?", help="label, IP or outpoint of one masternode")
+    status.add_argument("--status", help="only masternodes with this status, e.g. ENABLED")
+
+    commands.add_parser("servers", help="subid, IP and label of all servers")
+
+    probe = commands.add_parser("probe", help="probe the P2P ports of own masternodes")
+    probe.add_argument("--handshake", action="store_true", help="do the version handshake")
+
+    commands.add_parser("refresh", help="refresh the server index and statuses now")
+
+    run = commands.add_parser("run", help="run a command on servers")
+    run.add_argument("--labels", nargs="+", required=True, help="labels of the servers")
+    run.add_argument("remote_command", nargs=argparse.REMAINDER, help="the command to run")
+
+    args: argparse.Namespace = parser.parse_args(argv)
+
+    if args.command == "serve":
+        # Imported here, so that the other commands do not load the controller's dependencies
+        from src import controller
+
+        controller.main(args.socket, args.port)
+        return
+
+    try:
+        if args.command == "status":
+            if args.key is not None:
+                answer: Any = request(f"/status/{args.key}", {"coin": args.coin}, path_socket=args.socket)
+            else:
+                answer = request("/status", {"coin": args.coin, "status": args.status}, path_socket=args.socket)
+        elif args.command == "servers":
+            answer = request("/servers", {"coin": args.coin}, path_socket=args.socket)
+        elif args.command == "probe":
+            answer = request(
+                "/probe", {"coin": args.coin, "handshake": int(args.handshake)}, path_socket=args.socket
+            )
+        elif args.command == "refresh":
+            answer = request("/refresh", body={}, path_socket=args.socket)
+        else:
+            remote_command: List[str] = args.remote_command
+            if remote_command[:1] == ["--"]:
+                remote_command = remote_command[1:]
+            answer = request(
+                "/run",
+                body={
+                    "coin": args.coin,
+                    "labels": args.labels,
+                    "command": " ".join(remote_command),
+                },
+                path_socket=args.socket,
+            )
+    except (OSError, RuntimeError) as error:
+        sys.exit(f"pymasternode: {error}")
+
+    print(json.dumps(answer, indent=4))
+
+
+if __name__ == "__main__":
+    main()
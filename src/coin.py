@@ -0,0 +1,185 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Per-coin settings, so that multiple coins can be managed from one process."""
+
+import threading
+from pathlib import PosixPath
+from typing import Any, Dict, List, Optional
+
+from src import pymasternode
+from src.helpers import Path
+
+_coins: Dict[str, "Coin"] = {}
+_coins_lock: threading.Lock = threading.Lock()
+
+
+class Coin:
+    """The settings of a coin, as configured in data/Settings.json.
+
+    Instances are immutable after creation and can be shared between threads,
+    get one with get_coin instead of constructing it directly.
+
+    Settings for each coin:
+        path_mn_conf: Path of the local masternode.conf
+
+        path_wallet_bin: Directory of the local wallet binaries
+
+        daemon_name (optional): Name of the wallet, the binaries are expected to be
+        <daemon_name>d and <daemon_name>-cli (default: globaltoken)
+
+        path_wallet_cli (optional): Path of the local wallet cli (default: <path_wallet_bin>/<daemon_name>-cli)
+
+        path_remote_wallet_bin (optional): Directory of the wallet binaries on the servers
+        (default: /root/<daemon_name>/bin)
+
+        path_remote_conf (optional): Path of the wallet's config file on the servers
+        (default: /root/.<daemon_name>/<daemon_name>.conf)
+
+        node_port: The P2P port of the nodes
+
+        remote_rpc_port (optional): The RPC port of the first daemon on a server, the n-th
+        daemon uses the n-th port after it, see colocation (default: <node_port> + 1)
+
+        nodes_per_host (optional): The number of masternodes run on one server, see colocation (default: 1)
+
+        max_memory_mb (optional): The memory cap of every daemon on a server with several masternodes
+
+        network_magic (optional): The message start of the coin's P2P protocol as hex,
+        needed for the version handshake of probe.probe_fleet
+
+        protocol_version (optional): The P2P protocol version sent in the version handshake (default: 70208)
+
+        secret_key_version (optional): The version bytes of the coin's private keys in the
+        wallet import format as hex, genkeys are generated in-process instead of by the wallet if set
+
+        address_version (optional): The version bytes of the coin's pay-to-public-key-hash addresses as hex
+
+        collateral_xpub (optional): The extended public key of the wallet's account receiving
+        the collaterals, addresses are derived in-process instead of by the wallet if set,
+        see wallet.derive_addresses
+
+        collateral_path (optional): The path of a label's address below collateral_xpub,
+        {index} is replaced by the label's iterator (default: 0/{index})
+
+        node_term (optional): The term the wallet uses for masternodes (default: smartnode for SMART, masternode otherwise)
+
+        collateral (optional): The collateral of a masternode in coins
+
+        fee_margin (optional): The balance kept for the fee of a collateral transaction, in coins (default: 1)
+
+        rpc_port, rpc_user, rpc_password (optional): Credentials of the local wallet's RPC server
+
+        sync_source (optional): URL of an explorer API reporting the block height and the list of keys
+        leading to the height in its JSON response
+
+    """
+
+    def __init__(self, name: str, settings: Dict[str, Any]) -> None:
+        self.name: str = name
+        self.daemon_name: str = settings.get("daemon_name", "globaltoken")
+        self.path_mn_conf: Path = PosixPath(settings["path_mn_conf"]).expanduser()
+        self.path_wallet_bin: Path = PosixPath(settings["path_wallet_bin"]).expanduser()
+        self.path_wallet_cli: Path = PosixPath(
+            settings.get(
+                "path_wallet_cli", self.path_wallet_bin / f"{self.daemon_name}-cli"
+            )
+        ).expanduser()
+        self.path_remote_wallet_bin: PosixPath = PosixPath(
+            settings.get("path_remote_wallet_bin", f"/root/{self.daemon_name}/bin")
+        )
+        self.path_remote_conf: PosixPath = PosixPath(
+            settings.get(
+                "path_remote_conf", f"/root/.{self.daemon_name}/{self.daemon_name}.conf"
+            )
+        )
+        self.node_port: int = int(settings["node_port"])
+        self.remote_rpc_port: int = int(settings.get("remote_rpc_port", self.node_port + 1))
+        self.nodes_per_host: int = int(settings.get("nodes_per_host", 1))
+        self.max_memory_mb: Optional[int] = settings.get("max_memory_mb")
+        self.network_magic: Optional[bytes] = (
+            bytes.fromhex(settings.get("network_magic", "")) or None
+        )
+        self.protocol_version: int = int(settings.get("protocol_version", 70208))
+        self.secret_key_version: Optional[bytes] = (
+            bytes.fromhex(settings.get("secret_key_version", "")) or None
+        )
+        self.address_version: Optional[bytes] = (
+            bytes.fromhex(settings.get("address_version", "")) or None
+        )
+        self.collateral_xpub: Optional[str] = settings.get("collateral_xpub") or None
+        self.collateral_path: str = settings.get("collateral_path", "0/{index}")
+        self.node_term: str = settings.get(
+            "node_term", "smartnode" if name == "SMART" else "masternode"
+        )
+        self.collateral: Optional[float] = settings.get("collateral")
+        self.fee_margin: float = settings.get("fee_margin", 1)
+        self.rpc_port: Optional[int] = settings.get("rpc_port")
+        self.rpc_user: Optional[str] = settings.get("rpc_user")
+        self.rpc_password: Optional[str] = settings.get("rpc_password")
+        self.sync_source_url: str = settings.get(
+            "sync_source", {}
+        ).get("url", "https://explorer.globaltoken.org/api/status?q=getTxOutSetInfo")
+        self.sync_source_height_keys: List[str] = settings.get(
+            "sync_source", {}
+        ).get("height_keys", ["txoutsetinfo", "height"])
+
+        # Serializes writes to this coin's masternode.conf
+        self.conf_lock: threading.Lock = threading.Lock()
+        # Serializes funding this coin's masternodes, so that no collateral is sent twice
+        self.funding_lock: threading.Lock = threading.Lock()
+
+    @property
+    def path_remote_wallet_cli(self) -> PosixPath:
+        return self.path_remote_wallet_bin / f"{self.daemon_name}-cli"
+
+    @property
+    def path_remote_daemon(self) -> PosixPath:
+        return self.path_remote_wallet_bin / f"{self.daemon_name}d"
+
+    @property
+    def rpc_url(self) -> Optional[str]:
+        if self.rpc_port is None:
+            return None
+
+        return f"http://127.0.0.1:{self.rpc_port}"
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}:{self.name}"
+
+
+def get_coin(name: str) -> Coin:
+    """Get the settings of a coin.
+
+    Args:
+        name: The name of the coin, as used in data/Settings.json
+
+    Returns:
+        The coin's settings, the same object is returned on every call
+
+    """
+    with _coins_lock:
+        if name not in _coins:
+            _coins[name] = Coin(name, pymasternode.CONFIG["coins"][name])
+
+        return _coins[name]
+
+
+def get_all_coins() -> List[Coin]:
+    """Get the settings of all configured coins.
+
+    Returns:
+        The settings of every coin in data/Settings.json
+
+    """
+    return [get_coin(name) for name in pymasternode.CONFIG["coins"]]
@@ -0,0 +1,295 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Run several masternodes on one server, sharing its chain data.
+
+A host is a server labelled like any instance, running the masternodes of its node
+labels. Every masternode gets one of the server's IPs, additional IPs are ordered from
+Vultr, and its own data directory, RPC port and systemd unit with a memory cap. The
+first masternode uses the wallet's default data directory, so a host with one node is
+laid out like a plain instance:
+
+    >>> for host_label, node_labels in zip(host_labels, group_labels(labels, coin)):
+    ...     await AsyncHost(host_label, node_labels, coin, vultr=vultr).complete_setup()
+
+The other masternodes are started once the first one is synced. Block files the first
+daemon completed are never written again, so they are shared with the data directories
+of the others as reflinks or hardlinks instead of being downloaded again, see
+data/share_chain.sh.
+"""
+
+import ipaddress
+import shlex
+from collections import namedtuple
+from pathlib import PosixPath
+from typing import Any, Dict, List, Optional, Tuple
+
+from src import journal, wallet
+from src.aio import AsyncInstance, AsyncVultr, AsyncWallet
+from src.coin import Coin
+from src.helpers import Label, gather_limited
+
+# A masternode on a host, index 0 is the first one
+NodeSlot = namedtuple(
+    "NodeSlot", ["label", "index", "ip", "port", "genkey", "datadir", "rpc_port", "unit"]
+)
+
+
+def get_remote_datadir(coin: Coin, index: int) -> PosixPath:
+    """Get the data directory of the index-th masternode on a host, e.g. /root/.globaltoken-1."""
+    datadir: PosixPath = coin.path_remote_conf.parent
+
+    return datadir if index == 0 else datadir.with_name(f"{datadir.name}-{index}")
+
+
+def get_unit_name(coin: Coin, index: int) -> str:
+    """Get the name of the systemd unit of the index-th masternode on a host."""
+    return f"{coin.daemon_name}-mn{index}"
+
+
+def group_labels(labels: List[Label], coin: Coin) -> List[List[Label]]:
+    """Split labels into the node labels of hosts, by the coin's nodes_per_host."""
+    return [
+        labels[i:i + coin.nodes_per_host] for i in range(0, len(labels), coin.nodes_per_host)
+    ]
+
+
+def get_slots(node_labels: List[Label], coin: Coin) -> List[NodeSlot]:
+    """Get the masternodes of a host from their lines in masternode.conf.
+
+    Args:
+        node_labels: The labels of the masternodes, in the order of their indexes
+        coin: The coin of the masternodes
+
+    Returns:
+        The masternodes of the host
+
+    Raises:
+        ValueError: If a masternode has no line with an IP and genkey in masternode.conf
+
+    """
+    entries: Dict[Label, wallet.ConfEntry] = {
+        entry.label: entry for entry in wallet.read_mn_conf(coin)
+    }
+    slots: List[NodeSlot] = []
+
+    for index, label in enumerate(node_labels):
+        entry: Optional[wallet.ConfEntry] = entries.get(label)
+        if entry is None or entry.genkey is None or entry.address.startswith("<ip>"):
+            raise ValueError(f"{label} has no IP or genkey in masternode.conf")
+
+        ip, port = entry.address.rsplit(":", 1)
+        slots.append(
+            NodeSlot(
+                label,
+                index,
+                ip,
+                int(port),
+                entry.genkey,
+                get_remote_datadir(coin, index),
+                coin.remote_rpc_port + index,
+                get_unit_name(coin, index),
+            )
+        )
+
+    return slots
+
+
+class AsyncHost(AsyncInstance):
+    """An AsyncInstance running the masternodes of several labels.
+
+    The server is created, journaled and set up under the host's label, install_mn
+    additionally assigns the server's IPs to the masternodes and runs the first one.
+    The others are started from its chain once it is synced.
+
+    Args:
+        label: The label of the server
+        node_labels: The labels of the masternodes on the server
+        coin: The coin of the masternodes, wallet.DEFAULT_COIN if not provided
+        vultr: The Vultr client to use, a new one if not provided
+        async_wallet: The wallet to use, a new one if not provided
+        setup_journal: Where stages are recorded, see aio.AsyncInstance
+
+    """
+
+    def __init__(
+            self,
+            label: Label,
+            node_labels: List[Label],
+            coin: Optional[Coin] = None,
+            vultr: Optional[AsyncVultr] = None,
+            async_wallet: Optional[AsyncWallet] = None,
+            setup_journal: Any = journal,
+    ) -> None:
+        super().__init__(label, coin, vultr, async_wallet, setup_journal)
+        self.node_labels: List[Label] = list(node_labels)
+
+    def get_host_arg(self) -> Optional[str]:
+        """Returns the config-line of the first masternode, which the wallet's setup script installs."""
+        with open(self.coin.path_mn_conf, "r") as conf:
+            for line in conf:
+                if line.split(maxsplit=1)[:1] == [self.node_labels[0]]:
+                    return line.strip()
+
+    async def assign_ips(self) -> Dict[Label, str]:
+        """Order additional IPs until every masternode has one and write them into masternode.conf.
+
+        The first masternode gets the server's main IP, the others the additional IPs
+        in ascending order, so that a resumed setup assigns the same IPs.
+
+        Returns:
+            The IP's of the masternodes, keyed by label
+
+        """
+
+        async def get_ips() -> Tuple[List[str], List[str]]:
+            ips: List[Dict[str, Any]] = await self.vultr.server_list_ipv4(self.subid)
+            return (
+                [ip_info["ip"] for ip_info in ips if ip_info.get("type") == "main_ip"],
+                sorted(
+                    (ip_info["ip"] for ip_info in ips if ip_info.get("type") == "secondary_ip"),
+                    key=ipaddress.IPv4Address,
+                ),
+            )
+
+        main_ips, secondary_ips = await get_ips()
+        missing: int = len(self.node_labels) - 1 - len(secondary_ips)
+        if missing > 0:
+            for _ in range(missing):
+                await self.vultr.server_create_ipv4(self.subid)
+            main_ips, secondary_ips = await get_ips()
+
+        assigned: Dict[Label, str] = dict(zip(self.node_labels, main_ips[:1] + secondary_ips))
+        wallet.fill_in_ips(assigned, self.coin)
+
+        return assigned
+
+    async def share_chain(self, slots: List[NodeSlot]) -> None:
+        """Share the chain of the first masternode with the data directories of slots.
+
+        The first daemon is stopped meanwhile, so that its databases are consistent.
+        Data directories with a chain are skipped, the first daemon is not stopped if all have one.
+
+        Raises:
+            RuntimeError: If the first daemon could not be stopped or started again
+
+        """
+        first: NodeSlot = get_slots(self.node_labels[:1], self.coin)[0]
+
+        exit_code, stdout, stderr = await self.command_send(
+            [
+                f'for datadir in {" ".join(shlex.quote(str(slot.datadir)) for slot in slots)}; do'
+                f' [ -d "$datadir/blocks" ] && echo "$datadir"; done; true'
+            ]
+        )
+        if exit_code != 0:
+            raise RuntimeError(f"Listing the chains on {self.ip} failed: {stderr.strip()}")
+        with_chain: List[str] = stdout.split()
+        slots = [slot for slot in slots if str(slot.datadir) not in with_chain]
+        if not slots:
+            return
+
+        exit_code, _, stderr = await self.command_send([f"systemctl stop {first.unit}"])
+        if exit_code != 0:
+            raise RuntimeError(f"Stopping {first.unit} on {self.ip} failed: {stderr.strip()}")
+        try:
+            for slot in slots:
+                await self._run_script("share_chain.sh", str(first.datadir), str(slot.datadir))
+        finally:
+            # Raised in place of a failure of sharing, which is kept as its context
+            exit_code, _, stderr = await self.command_send([f"systemctl start {first.unit}"])
+            if exit_code != 0:
+                raise RuntimeError(f"Starting {first.unit} on {self.ip} failed: {stderr.strip()}")
+
+    async def colocate(self, slot: NodeSlot) -> None:
+        """Configure a masternode of the host and (re)start it as its systemd unit."""
+        await self._run_script(
+            "mn_colocate.sh",
+            slot.unit,
+            str(slot.datadir),
+            str(slot.datadir / self.coin.path_remote_conf.name),
+            slot.ip,
+            str(slot.port),
+            str(slot.rpc_port),
+            slot.genkey,
+            str(self.coin.path_remote_daemon),
+            str(self.coin.path_remote_wallet_cli),
+            str(self.coin.max_memory_mb or ""),
+        )
+
+    async def install_mn(self, force: bool = False) -> bool:
+        """Install the wallet with the first masternode and run it as its systemd unit.
+
+        The other masternodes are started by finish_setup, once the first one is synced.
+        Returns whether mn_setup.sh was run, see aio.AsyncInstance.install_mn.
+        """
+        await self.assign_ips()
+        installed: bool = await super().install_mn(force)
+        await self.colocate(get_slots(self.node_labels[:1], self.coin)[0])
+
+        return installed
+
+    async def finish_setup(self, delay_return_until_synced: bool = True) -> None:
+        """Once the first masternode is synced, share its chain with the others and start them.
+
+        The host is journaled as synced after all masternodes run, so an interrupted
+        setup starts them again and shares the chain with the data directories still
+        missing one, see share_chain.
+        """
+        if not await self.is_synced(delay_return_until_synced):
+            return
+
+        slots: List[NodeSlot] = get_slots(self.node_labels, self.coin)
+        if len(slots) > 1:
+            await self.share_chain(slots[1:])
+        for slot in slots[1:]:
+            await self.colocate(slot)
+
+        await self.journal_stage("synced")
+
+
+async def complete_setups(
+        labels: List[Label],
+        host_labels: List[Label],
+        coin: Optional[Coin] = None,
+        max_concurrency: int = 100,
+        delay_return_until_synced: bool = True,
+) -> List[Any]:
+    """Set up hosts running the masternodes of labels concurrently, see aio.complete_setups.
+
+    Args:
+        labels: Labels of the masternodes, grouped into hosts by the coin's nodes_per_host
+        host_labels: Labels of the hosts, one per group of masternodes
+        coin: The coin of the masternodes, wallet.DEFAULT_COIN if not provided
+        max_concurrency: Maximum number of hosts being set up at the same time
+        delay_return_until_synced: if True, do not return until the wallets are synced
+
+    Returns:
+        None for every host set up successfully, the raised exception otherwise
+
+    """
+    coin = coin if coin is not None else wallet.DEFAULT_COIN
+    groups: List[List[Label]] = group_labels(labels, coin)
+    if len(host_labels) != len(groups):
+        raise ValueError(f"{len(groups)} host labels needed, got {len(host_labels)}")
+
+    async with AsyncVultr() as vultr:
+        return await gather_limited(
+            [
+                AsyncHost(host_label, node_labels, coin, vultr=vultr).complete_setup(
+                    delay_return_until_synced
+                )
+                for host_label, node_labels in zip(host_labels, groups)
+            ],
+            max_concurrency,
+        )
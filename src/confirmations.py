@@ -0,0 +1,236 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Watch many wallet transactions until they reach their required confirmations."""
+
+import subprocess
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from src import wallet
+from src.coin import Coin
+
+# Called with the txid and its confirmations once a transaction is confirmed
+Subscriber = Callable[[str, int], Any]
+
+
+class ConfirmationWatcher:
+    """Track the confirmations of many transactions at once.
+
+    Every poll costs one getblockcount call. Only if a new block arrived, the
+    confirmations of all tracked transactions are updated with one listsinceblock
+    call, starting at the deepest block a tracked transaction can be in while
+    still needing confirmations. Tracked transactions missing from its result
+    have enough confirmations or are unknown to the wallet, which is checked with
+    one gettransaction call each.
+
+    Example:
+        >>> watcher = ConfirmationWatcher(coin)
+        >>> watcher.start()
+        >>> watcher.wait([wallet.make_transactions(coin=coin)], min_conf=15)
+        >>> wallet.start_mns(coin=coin)
+
+    """
+
+    def __init__(
+            self,
+            coin: Optional[Coin] = None,
+            poll_interval_seconds: float = 5.0,
+            call: Optional[Callable[..., Any]] = None,
+    ) -> None:
+        self.coin: Coin = coin if coin is not None else wallet.DEFAULT_COIN
+        self.poll_interval_seconds: float = poll_interval_seconds
+        self._call: Callable[..., Any] = (
+            call
+            if call is not None
+            else lambda method, *params: wallet.call(method, *params, coin=self.coin)
+        )
+        self._lock: threading.Lock = threading.Lock()
+        self._stop: threading.Event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # The exception that ended the background thread, re-raised by wait
+        self._error: Optional[BaseException] = None
+
+        self._block_count: Optional[int] = None
+        # Incremented by track, so that a poll running meanwhile does not store its block count
+        self._generation: int = 0
+        self._confirmations: Dict[str, int] = {}
+        self._min_conf: Dict[str, int] = {}
+        self._subscribers: Dict[str, List[Subscriber]] = {}
+        self._events: Dict[str, threading.Event] = {}
+
+    def track(
+            self, txid: str, min_conf: int = 1, subscriber: Optional[Subscriber] = None
+    ) -> threading.Event:
+        """Track a transaction until it has min_conf confirmations.
+
+        Args:
+            txid: The transaction to track
+            min_conf: The confirmations the transaction needs
+            subscriber: Called with the txid and its confirmations once it is confirmed
+
+        Returns:
+            An event that is set once the transaction is confirmed
+
+        """
+        with self._lock:
+            self._min_conf[txid] = max(self._min_conf.get(txid, 0), min_conf)
+            event: threading.Event = self._events.setdefault(txid, threading.Event())
+            if subscriber is not None:
+                self._subscribers.setdefault(txid, []).append(subscriber)
+            # Force an update on the next poll, the transaction might be confirmed already
+            self._block_count = None
+            self._generation += 1
+
+        return event
+
+    def poll(self) -> List[str]:
+        """Check for a new block and update the confirmations of all tracked transactions.
+
+        Returns:
+            The transactions that reached their required confirmations
+
+        """
+        block_count: int = self._call("getblockcount")
+
+        with self._lock:
+            if block_count == self._block_count or not self._min_conf:
+                return []
+            max_min_conf: int = max(self._min_conf.values())
+            generation: int = self._generation
+
+        # A transaction with less than max_min_conf confirmations is in a block after this one
+        since_block: str = self._call(
+            "getblockhash", max(block_count - max_min_conf + 1, 0)
+        )
+        transactions: List[Dict[str, Any]] = self._call(
+            "listsinceblock", since_block
+        )["transactions"]
+        listed: Dict[str, int] = {}
+        for transaction in transactions:
+            listed[transaction["txid"]] = max(
+                transaction["confirmations"], listed.get(transaction["txid"], 0)
+            )
+
+        with self._lock:
+            unlisted: List[str] = [txid for txid in self._min_conf if txid not in listed]
+
+        for txid in unlisted:
+            try:
+                listed[txid] = self._call("gettransaction", txid)["confirmations"]
+            except (wallet.RpcError, subprocess.CalledProcessError):
+                pass
+
+        with self._lock:
+            # A transaction tracked during this poll was not checked, so the next poll updates
+            if generation == self._generation:
+                self._block_count = block_count
+            for txid in self._min_conf:
+                if txid in listed:
+                    self._confirmations[txid] = listed[txid]
+
+            confirmed: List[str] = [
+                txid
+                for txid, min_conf in self._min_conf.items()
+                if self._confirmations.get(txid, 0) >= min_conf
+            ]
+            subscribers: List[Tuple[Subscriber, str, int]] = []
+            for txid in confirmed:
+                confirmations: int = self._confirmations.pop(txid)
+                del self._min_conf[txid]
+                self._events.pop(txid).set()
+                subscribers.extend(
+                    (subscriber, txid, confirmations)
+                    for subscriber in self._subscribers.pop(txid, [])
+                )
+
+        for subscriber, txid, confirmations in subscribers:
+            subscriber(txid, confirmations)
+
+        return confirmed
+
+    def wait(
+            self, txids: Iterable[str], min_conf: int = 1, timeout: Optional[float] = None
+    ) -> bool:
+        """Block until all transactions have min_conf confirmations.
+
+        Polls in the calling thread if the watcher was not started.
+
+        Args:
+            txids: The transactions to wait for
+            min_conf: The confirmations each transaction needs
+            timeout: Maximum seconds to wait, None to wait indefinitely
+
+        Returns:
+            True if all transactions are confirmed, False if the timeout expired
+
+        Raises:
+            Exception: The exception a poll of the background thread failed with
+
+        """
+        events: List[threading.Event] = [self.track(txid, min_conf) for txid in txids]
+        deadline: Optional[float] = None if timeout is None else time.monotonic() + timeout
+
+        while True:
+            if self._error is not None:
+                raise self._error
+            if self._thread is None:
+                self.poll()
+
+            pending: List[threading.Event] = [event for event in events if not event.is_set()]
+            if not pending:
+                return True
+
+            remaining: Optional[float] = (
+                None if deadline is None else deadline - time.monotonic()
+            )
+            if remaining is not None and remaining <= 0:
+                return False
+
+            if self._thread is None:
+                time.sleep(
+                    self.poll_interval_seconds
+                    if remaining is None
+                    else min(self.poll_interval_seconds, remaining)
+                )
+            else:
+                # Wakes up every poll interval to notice a failure of the background thread
+                pending[0].wait(
+                    self.poll_interval_seconds
+                    if remaining is None
+                    else min(self.poll_interval_seconds, remaining)
+                )
+
+    def start(self) -> None:
+        """Poll in a background thread until stop is called or a poll fails."""
+        self._stop.clear()
+        self._error = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop polling in the background."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.poll()
+            except Exception as error:
+                self._error = error
+                return
+            self._stop.wait(self.poll_interval_seconds)
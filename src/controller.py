@@ -0,0 +1,308 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""A long-running controller that keeps the state of the fleet warm.
+
+The config, the server index synced from Vultr, the status index of every coin, the
+wallets' RPC sessions and SSH connections are loaded once and kept, instead of once
+per script. They are served as JSON over a Unix socket, and optionally on a port of
+localhost, to the thin client in the client module.
+
+Endpoints:
+    GET /status?coin=<coin>&status=<status>: Status of own masternodes by label
+    GET /status/<key>?coin=<coin>: Status of one masternode by label, IP or outpoint
+    GET /servers?coin=<coin>: Subid, IP and label of all servers
+    GET /probe?coin=<coin>&handshake=<0|1>: Result of probing the P2P ports, see probe
+    POST /refresh: Sync the server index with Vultr and refresh all statuses
+    POST /run {"coin", "labels", "command"}: Run a command on servers, by IP
+
+POST requests need a JSON content type, which a browser cannot send to another origin
+without asking it first. /run runs commands as root on the fleet, so it is only served
+on the Unix socket, which only the current user can connect to.
+
+"""
+
+import asyncio
+import json
+import os
+import socket
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import PosixPath
+from typing import Any, Dict, List, Optional, Tuple
+
+from aiohttp import web
+from pssh.clients import ParallelSSHClient
+
+from src import database, probe, vps, wallet
+from src.client import PATH_SOCKET
+from src.coin import Coin, get_all_coins
+from src.status import StatusIndex
+
+
+def _error(error_class: Any, message: str) -> web.HTTPException:
+    return error_class(text=json.dumps({"error": message}), content_type="application/json")
+
+
+@web.middleware
+async def _json_errors(request: web.Request, handler: Any) -> web.StreamResponse:
+    try:
+        return await handler(request)
+    except web.HTTPException:
+        raise
+    except Exception as error:
+        raise _error(web.HTTPInternalServerError, repr(error))
+
+
+def _check_json(request: web.Request) -> None:
+    if request.content_type != "application/json":
+        raise _error(web.HTTPUnsupportedMediaType, "Content-Type must be application/json")
+
+
+def _is_unix_socket(request: web.Request) -> bool:
+    sock: Optional[socket.socket] = (
+        request.transport.get_extra_info("socket") if request.transport is not None else None
+    )
+
+    return sock is not None and sock.family == socket.AF_UNIX
+
+
+class Controller:
+    """The warm state of the fleet and the handlers of the controller's API.
+
+    Args:
+        coins: The coins to serve, all configured coins if not provided
+        status_interval_seconds: Interval of refreshing the status indexes in the background
+        server_interval_seconds: Interval of syncing the server index with Vultr in the background
+        max_ssh_clients: Number of SSH clients kept connected, by set of hosts
+
+    """
+
+    def __init__(
+            self,
+            coins: Optional[List[Coin]] = None,
+            status_interval_seconds: float = 60.0,
+            server_interval_seconds: float = 600.0,
+            max_ssh_clients: int = 32,
+    ) -> None:
+        self.coins: Dict[str, Coin] = {
+            coin.name: coin for coin in (coins if coins is not None else get_all_coins())
+        }
+        self.status_indexes: Dict[str, StatusIndex] = {
+            name: StatusIndex(coin) for name, coin in self.coins.items()
+        }
+        self.status_refreshed: Dict[str, float] = {}
+        self.status_interval_seconds: float = status_interval_seconds
+        self.server_interval_seconds: float = server_interval_seconds
+        self.max_ssh_clients: int = max_ssh_clients
+
+        # Wallet calls keep their RPC session per thread, SSH clients are used by one thread only
+        self._wallet_executor: ThreadPoolExecutor = ThreadPoolExecutor(
+            max_workers=4, thread_name_prefix="wallet"
+        )
+        self._ssh_executor: ThreadPoolExecutor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="ssh"
+        )
+        self._ssh_clients: "OrderedDict[Tuple[str, ...], ParallelSSHClient]" = OrderedDict()
+        self._tasks: List[asyncio.Task] = []
+
+    def get_coin(self, request: web.Request) -> Coin:
+        name: str = request.query.get("coin") or wallet.DEFAULT_COIN.name
+        if name not in self.coins:
+            raise _error(web.HTTPNotFound, f"Unknown coin: {name}")
+
+        return self.coins[name]
+
+    async def refresh_status(self, coin: Coin) -> None:
+        await asyncio.get_running_loop().run_in_executor(
+            self._wallet_executor, self.status_indexes[coin.name].refresh
+        )
+        self.status_refreshed[coin.name] = time.time()
+
+    async def refresh_servers(self) -> None:
+        await asyncio.get_running_loop().run_in_executor(self._wallet_executor, database.load_data)
+
+    async def _refresh_periodically(
+            self, refresh: Any, interval_seconds: float, delay_seconds: float = 0.0
+    ) -> None:
+        await asyncio.sleep(delay_seconds)
+        while True:
+            try:
+                await refresh()
+            except Exception as error:
+                print(f"Refreshing failed: {error!r}")
+            await asyncio.sleep(interval_seconds)
+
+    async def start(self, app: web.Application) -> None:
+        for coin in self.coins.values():
+            self._tasks.append(
+                asyncio.create_task(
+                    self._refresh_periodically(
+                        lambda coin=coin: self.refresh_status(coin), self.status_interval_seconds
+                    )
+                )
+            )
+        database.create_tables()
+        self._tasks.append(
+            asyncio.create_task(
+                self._refresh_periodically(self.refresh_servers, self.server_interval_seconds)
+            )
+        )
+
+    async def stop(self, app: web.Application) -> None:
+        for task in self._tasks:
+            task.cancel()
+        self._wallet_executor.shutdown(wait=False)
+        self._ssh_executor.shutdown(wait=False)
+
+    def app(self) -> web.Application:
+        app: web.Application = web.Application(middlewares=[_json_errors])
+        app.router.add_get("/status", self.get_statuses)
+        app.router.add_get("/status/{key}", self.get_status)
+        app.router.add_get("/servers", self.get_servers)
+        app.router.add_get("/probe", self.get_probe)
+        app.router.add_post("/refresh", self.post_refresh)
+        app.router.add_post("/run", self.post_run)
+        app.on_startup.append(self.start)
+        app.on_cleanup.append(self.stop)
+
+        return app
+
+    async def get_statuses(self, request: web.Request) -> web.Response:
+        index: StatusIndex = self.status_indexes[self.get_coin(request).name]
+        status: Optional[str] = request.query.get("status")
+        statuses: Dict[str, Optional[str]] = index.get_all()
+
+        if status is not None:
+            statuses = {label: value for label, value in statuses.items() if value == status}
+
+        return web.json_response(statuses)
+
+    async def get_status(self, request: web.Request) -> web.Response:
+        coin: Coin = self.get_coin(request)
+        index: StatusIndex = self.status_indexes[coin.name]
+        key: str = request.match_info["key"]
+        outpoint: Optional[str] = index.get_outpoint(key)
+
+        if outpoint is None:
+            raise _error(web.HTTPNotFound, f"Unknown masternode: {key}")
+
+        return web.json_response(
+            {
+                "label": index.get_label(outpoint),
+                "outpoint": outpoint,
+                "status": index.get_status(outpoint),
+                "refreshed": self.status_refreshed.get(coin.name),
+            }
+        )
+
+    async def get_servers(self, request: web.Request) -> web.Response:
+        return web.json_response(
+            [
+                {"subid": subid, "ip": ip, "label": label}
+                for subid, ip, label in database.get_all_servers(self.get_coin(request).name)
+            ]
+        )
+
+    async def get_probe(self, request: web.Request) -> web.Response:
+        results: Dict[str, probe.ProbeResult] = await probe.async_probe_fleet(
+            self.get_coin(request), request.query.get("handshake") == "1"
+        )
+
+        return web.json_response({label: result._asdict() for label, result in results.items()})
+
+    async def post_refresh(self, request: web.Request) -> web.Response:
+        _check_json(request)
+        await self.refresh_servers()
+        await asyncio.gather(*[self.refresh_status(coin) for coin in self.coins.values()])
+
+        return web.json_response(self.status_refreshed)
+
+    def _get_ssh_client(self, hosts: Tuple[str, ...]) -> ParallelSSHClient:
+        if hosts in self._ssh_clients:
+            self._ssh_clients.move_to_end(hosts)
+        else:
+            self._ssh_clients[hosts] = vps.get_client(list(hosts))
+            if len(self._ssh_clients) > self.max_ssh_clients:
+                self._ssh_clients.popitem(last=False)
+
+        return self._ssh_clients[hosts]
+
+    def _run(self, hosts: Tuple[str, ...], command: str) -> Dict[str, Dict[str, Any]]:
+        results: Dict[str, vps.ScriptResult] = vps.run_command(
+            list(hosts), command, self._get_ssh_client(hosts)
+        )
+
+        return {host: result._asdict() for host, result in results.items()}
+
+    async def post_run(self, request: web.Request) -> web.Response:
+        if not _is_unix_socket(request):
+            raise _error(web.HTTPForbidden, "/run is only served on the Unix socket")
+        _check_json(request)
+
+        body: Dict[str, Any] = await request.json()
+        coin_name: str = body.get("coin") or wallet.DEFAULT_COIN.name
+        ips: Dict[str, str] = {
+            ip: label
+            for subid, ip, label in database.get_all_servers(coin_name)
+            if label in body["labels"]
+        }
+        hosts: Tuple[str, ...] = tuple(sorted(ips))
+
+        outputs: Dict[str, Dict[str, Any]] = await asyncio.get_running_loop().run_in_executor(
+            self._ssh_executor, self._run, hosts, body["command"]
+        )
+
+        return web.json_response({ips[host]: output for host, output in outputs.items()})
+
+
+async def serve(
+        path_socket: PosixPath = PATH_SOCKET,
+        port: Optional[int] = None,
+        controller: Optional[Controller] = None,
+) -> None:
+    """Serve the controller's API until cancelled.
+
+    Args:
+        path_socket: The Unix socket to listen on, only the current user can connect
+        port: If provided, also listen on this port of localhost, without /run
+        controller: The controller to serve, a new one for all coins if not provided
+
+    """
+    controller = controller if controller is not None else Controller()
+    runner: web.AppRunner = web.AppRunner(controller.app())
+    await runner.setup()
+
+    try:
+        if path_socket.exists():
+            path_socket.unlink()
+        old_umask: int = os.umask(0o077)
+        try:
+            await web.UnixSite(runner, str(path_socket)).start()
+        finally:
+            os.umask(old_umask)
+        if port is not None:
+            await web.TCPSite(runner, "127.0.0.1", port).start()
+
+        print(f"Controller listening on {path_socket}")
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+def main(path_socket: PosixPath = PATH_SOCKET, port: Optional[int] = None) -> None:
+    try:
+        asyncio.run(serve(path_socket, port))
+    except KeyboardInterrupt:
+        pass
@@ -11,39 +11,87 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
-"""Interact with a database that stores server identification info."""
-# TODO: Create table for each coin.
+"""Interact with a database that stores server identification info.
+
+The servers of each coin are stored in their own table, named servers_<coin>.
+A server's coin is taken from its Vultr tag, see vps.Instance.create.
+Untagged servers are stored in the table servers.
+"""
 
 import sqlite3
+import threading
 from sqlite3.dbapi2 import Connection, Cursor
-from typing import Iterable, List
+from typing import Dict, Iterable, List, Optional, Tuple
 
 from src import pymasternode
-from src.helpers import Identifier, Ip, Label, Subid
+from src.helpers import Identifier, Ip, Label, LabelIndex, LabelScheme, Subid
 
 DB: Connection = sqlite3.connect(
-    pymasternode.PATH_PROJECT_ROOT / "data" / "server_info.db"
+    pymasternode.PATH_DATA / "server_info.db",
+    check_same_thread=False,
 )
 curs: Cursor = DB.cursor()
+lock: threading.Lock = threading.Lock()
+
+
+def get_table(coin: Optional[str] = None) -> str:
+    """Get the name of the table storing the servers of a coin.
+
+    Args:
+        coin: The name of the coin, None for untagged servers
+
+    Returns:
+        The name of the table
+
+    """
+    if coin is None:
+        return "servers"
+
+    if coin not in pymasternode.CONFIG["coins"] or not coin.isalnum():
+        raise ValueError(f"Unknown coin: {coin}")
+
+    return f"servers_{coin}"
+
+
+def create_tables() -> None:
+    """Create the tables of all configured coins, if they do not exist yet."""
+    with lock:
+        for coin in [None, *pymasternode.CONFIG["coins"]]:
+            curs.execute(
+                f"CREATE TABLE IF NOT EXISTS {get_table(coin)}(subid TEXT, ip TEXT, label TEXT)"
+            )
+        DB.commit()
 
 
 # CHECK: If it makes sense to create a database class and use the load_data function as a constructor
 def load_data() -> None:
     """Update database of server info."""
     response: Iterable = pymasternode.VULTR.server.list()
-    subids: List[Subid] = [response[i]["SUBID"] for i in response]
-    ips: List[Ip] = [response[i]["main_ip"] for i in response]
-    labels: List[Label] = [response[i]["label"] for i in response]
+    rows: Dict[str, List[Tuple[Subid, Ip, Label]]] = {
+        get_table(coin): [] for coin in [None, *pymasternode.CONFIG["coins"]]
+    }
+
+    for i in response:
+        coin: Optional[str] = response[i].get("tag") or None
+        if coin not in pymasternode.CONFIG["coins"]:
+            coin = None
+
+        rows[get_table(coin)].append(
+            (response[i]["SUBID"], response[i]["main_ip"], response[i]["label"])
+        )
 
-    curs.execute("DELETE FROM servers")
-    curs.executemany("INSERT INTO servers VALUES(?, ?, ?)", zip(subids, ips, labels))
-    DB.commit()
+    with lock:
+        for table, table_rows in rows.items():
+            curs.execute(f"DELETE FROM {table}")
+            curs.executemany(f"INSERT INTO {table} VALUES(?, ?, ?)", table_rows)
+        DB.commit()
 
 
 def get_info(
         input_data: Identifier,
         input_identifier: str = "Subid",
         output_identifier: str = "Ip",
+        coin: Optional[str] = None,
 ) -> Identifier:
     """Take input values of type input_type and returns output of type output_identifier.
 
@@ -58,33 +106,90 @@ def get_info(
         input_data: Input values of type input_type
         input_identifier: The type of the input
         output_identifier:  The type of the output
+        coin: The coin the server belongs to, None for untagged servers
 
     Returns:
         Alternative identifications for the input_data
 
     """
-    curs.execute(
-        f"SELECT {output_identifier} FROM servers WHERE {input_identifier} = ?",
-        (input_data,),
-    )
-    return curs.fetchone()[0]
+    with lock:
+        curs.execute(
+            f"SELECT {output_identifier} FROM {get_table(coin)} WHERE {input_identifier} = ?",
+            (str(input_data),),
+        )
+        return curs.fetchone()[0]
 
 
 # REFACTOR: Rename to get_all and use parameter to decide what to get
-def get_all_ips() -> List[Ip]:
+def get_all_ips(coin: Optional[str] = None) -> List[Ip]:
     """Create a list of all server IP's.
 
+    Args:
+        coin: The coin the servers belong to, None for untagged servers
+
     Returns:
         All server IP's
 
     """
-    curs.execute("SELECT ip FROM servers")
-    query_output = curs.fetchall()
+    with lock:
+        curs.execute(f"SELECT ip FROM {get_table(coin)}")
+        query_output = curs.fetchall()
     return [row[0] for row in query_output]
 
 
-def main() -> None:
-    load_data()
+def get_all_servers(coin: Optional[str] = None) -> List[Tuple[Subid, Ip, Label]]:
+    """Create a list of the identifiers of all servers.
 
+    Args:
+        coin: The coin the servers belong to, None for untagged servers
 
-main()
+    Returns:
+        The subid, IP and label of every server
+
+    """
+    with lock:
+        curs.execute(f"SELECT subid, ip, label FROM {get_table(coin)}")
+        return curs.fetchall()
+
+
+def get_all_labels(coin: Optional[str] = None) -> List[Label]:
+    """Create a list of all server labels.
+
+    Args:
+        coin: The coin the servers belong to, None for untagged servers
+
+    Returns:
+        All server labels
+
+    """
+    with lock:
+        curs.execute(f"SELECT label FROM {get_table(coin)}")
+        query_output = curs.fetchall()
+    return [row[0] for row in query_output]
+
+
+def get_label_index(
+        label_scheme: LabelScheme, coin: Optional[str] = None, extra_labels: Iterable[Label] = ()
+) -> LabelIndex:
+    """Index the labels of a coin's servers that match a label scheme.
+
+    Example:
+        >>> index = get_label_index(LabelScheme("GLT-MN#####"), "GLT", wallet.get_conf_labels())
+        >>> index.allocate(500)
+
+    Args:
+        label_scheme: The label scheme to index
+        coin: The coin the servers belong to, None for untagged servers
+        extra_labels: Labels that are used as well, e.g. the labels in masternode.conf
+
+    Returns:
+        The index of used labels, to find gaps and allocate unused labels
+
+    """
+    return label_scheme.index([*get_all_labels(coin), *extra_labels])
+
+
+def main() -> None:
+    """Create the tables and sync them with Vultr."""
+    create_tables()
+    load_data()
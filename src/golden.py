@@ -0,0 +1,182 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Provision instances from a snapshot of one fully set up golden server.
+
+The golden server runs pre_setup and install_mn and syncs the chain once, then is
+captured with Vultr's snapshot API. Every other server is created from the snapshot
+and only gets its own genkey and IP written into the wallet's config.
+"""
+
+import shlex
+from typing import Any, List, Optional
+
+from src import aio, journal, wallet
+from src.aio import AsyncInstance, AsyncVultr
+from src.coin import Coin
+from src.helpers import Label, async_call_until_returns_true, gather_limited
+
+
+async def customize(instance: AsyncInstance) -> None:
+    """Configure a server created from the golden snapshot as the instance's masternode.
+
+    The genkey is taken from the instance's line in masternode.conf, whose <ip>
+    placeholder is replaced by the instance's IP.
+
+    Args:
+        instance: The instance to configure, its IP has to be set
+
+    """
+    coin: Coin = instance.coin
+    wallet.fill_in_ips({instance.label: str(instance.ip)}, coin)
+    genkey: str = instance.get_host_arg().split()[2]
+    conf: str = shlex.quote(str(coin.path_remote_conf))
+
+    exit_code, _, stderr = await instance.command_send(
+        [
+            f"({coin.path_remote_wallet_cli} stop || true)",
+            f"while pgrep -x {coin.daemon_name}d > /dev/null; do sleep 1; done",
+            f"sed -i '/^masternode=/d;/^masternodeprivkey=/d;/^externalip=/d' {conf}",
+            "printf 'masternode=1\\nmasternodeprivkey=%s\\nexternalip=%s\\n' "
+            f"{shlex.quote(genkey)} {shlex.quote(str(instance.ip))} >> {conf}",
+            f"{coin.path_remote_daemon} -daemon",
+        ]
+    )
+    if exit_code != 0:
+        raise RuntimeError(f"Customizing {instance.label} failed: {stderr.strip()}")
+
+
+async def create_golden_snapshot(
+        instance: AsyncInstance, call_interval_seconds: float = 30.0
+) -> str:
+    """Set up the golden server and capture it as a snapshot.
+
+    The golden server is configured as the instance's masternode, servers created
+    from the snapshot overwrite that configuration with their own.
+    The wallet is stopped while the snapshot is taken, so that its chain data is consistent.
+
+    Args:
+        instance: The golden instance, set up if it was not yet
+        call_interval_seconds: Interval of polling the snapshot's status
+
+    Returns:
+        The id of the completed snapshot
+
+    """
+    await instance.complete_setup(delay_return_until_synced=True)
+    await customize(instance)
+
+    coin: Coin = instance.coin
+    await instance.command_send(
+        [
+            f"({coin.path_remote_wallet_cli} stop || true)",
+            f"while pgrep -x {coin.daemon_name}d > /dev/null; do sleep 1; done",
+            "sync",
+        ]
+    )
+    snapshot_id: str = await instance.vultr.snapshot_create(
+        instance.subid, f"pymasternode golden {coin.name} {instance.label}"
+    )
+
+    async def is_complete() -> bool:
+        return (await instance.vultr.snapshot_list())[snapshot_id]["status"] == "complete"
+
+    await async_call_until_returns_true(is_complete, call_interval_seconds=call_interval_seconds)
+    await instance.command_send([f"{coin.path_remote_daemon} -daemon"])
+
+    return snapshot_id
+
+
+async def setup_from_snapshot(
+        instance: AsyncInstance, snapshot_id: str, delay_return_until_synced: bool = True
+) -> None:
+    """Create a server from the golden snapshot and configure it as the instance's masternode.
+
+    Stages are recorded in the instance's journal like in AsyncInstance.complete_setup,
+    pre_setup and install_mn are recorded as soon as the server is built.
+
+    Args:
+        instance: The instance to set up
+        snapshot_id: The id of the golden snapshot
+        delay_return_until_synced: if True, do not return until the wallet is synced
+
+    """
+    setup_journal: Any = instance.journal
+    await instance.resume_from_journal()
+
+    if instance.subid is None:
+        await instance.create(delay_return_until_built=False, snapshot_id=snapshot_id)
+
+    if not await instance._in_executor(setup_journal.is_completed, instance.label, "built"):
+        await instance.wait_until_built()
+        await instance.journal_stage("built", subid=instance.subid, ip=instance.ip)
+        await instance.journal_stage("pre_setup")
+
+    if not await instance._in_executor(setup_journal.is_completed, instance.label, "installed"):
+        await customize(instance)
+        await instance.journal_stage("installed")
+
+    if await instance.is_synced(delay_return_until_synced):
+        await instance.journal_stage("synced")
+
+
+async def provision_from_golden(
+        labels: List[Label],
+        coin: Optional[Coin] = None,
+        snapshot_id: Optional[str] = None,
+        max_concurrency: int = 100,
+        delay_return_until_synced: bool = True,
+        vultr: Optional[AsyncVultr] = None,
+        setup_journal: Any = journal,
+) -> List[Any]:
+    """Set up a fleet from a golden snapshot.
+
+    If no snapshot is given, the first label's instance is set up in full and captured
+    as the golden snapshot, the others are created from it.
+
+    Args:
+        labels: Labels of the instances to set up
+        coin: The coin of the instances, wallet.DEFAULT_COIN if not provided
+        snapshot_id: An existing golden snapshot to use
+        max_concurrency: Maximum number of instances being set up at the same time
+        delay_return_until_synced: if True, do not return until the wallets are synced
+        vultr: The Vultr client to use, a new one if not provided
+        setup_journal: Where stages are recorded, see aio.AsyncInstance
+
+    Returns:
+        None for every instance set up successfully, the raised exception otherwise
+
+    """
+    own_vultr: bool = vultr is None
+    vultr = vultr if vultr is not None else aio.AsyncVultr()
+    instances: List[AsyncInstance] = [
+        AsyncInstance(label, coin, vultr=vultr, setup_journal=setup_journal) for label in labels
+    ]
+
+    try:
+        results: List[Any] = []
+        if snapshot_id is None:
+            snapshot_id = await create_golden_snapshot(instances[0])
+            instances = instances[1:]
+            results.append(None)
+
+        return results + await gather_limited(
+            [
+                setup_from_snapshot(instance, snapshot_id, delay_return_until_synced)
+                for instance in instances
+            ],
+            max_concurrency,
+        )
+    finally:
+        if own_vultr:
+            await vultr.close()
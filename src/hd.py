@@ -0,0 +1,387 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Derive watch-only receiving addresses from an extended public key (BIP32).
+
+Only public derivation is supported, so the private keys never leave the wallet
+that exported the extended public key. The address of a label's index is derived
+by a path template, e.g. 0/{index} below the exported account:
+
+    >>> xpub = ExtendedPublicKey.parse(coin.collateral_xpub)
+    >>> derive_addresses(xpub, "0/{index}", range(1000), coin.address_version)
+
+"""
+
+import hashlib
+import hmac
+import struct
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.keys import SECP256K1_ORDER, base58check_decode, base58check_encode
+
+# The prime of the field and the generator of secp256k1
+_P: int = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEFFFFFC2F
+_G: Tuple[int, int] = (
+    0x79BE667EF9DCBBAC55A06295CE870B07029BFCDB2DCE28D959F2815B16F81798,
+    0x483ADA7726A3C4655DA4FBFC0E1108A8FD17B448A68554199C47D08FFB10D4B8,
+)
+
+# Indexes from here on are hardened and need the private key
+HARDENED: int = 0x80000000
+
+# A point in Jacobian coordinates (X, Y, Z) of the affine point (X / Z^2, Y / Z^3), None is infinity
+_JacobianPoint = Optional[Tuple[int, int, int]]
+
+# The multiples 2^i * G, so that multiplying G needs additions only
+_g_doublings: List[Tuple[int, int, int]] = []
+
+
+def _double(point: _JacobianPoint) -> _JacobianPoint:
+    if point is None or point[1] == 0:
+        return None
+
+    x, y, z = point
+    y_squared: int = y * y % _P
+    s: int = 4 * x * y_squared % _P
+    m: int = 3 * x * x % _P
+    x_new: int = (m * m - 2 * s) % _P
+
+    return x_new, (m * (s - x_new) - 8 * y_squared * y_squared) % _P, 2 * y * z % _P
+
+
+def _add(point: _JacobianPoint, other: _JacobianPoint) -> _JacobianPoint:
+    if point is None:
+        return other
+    if other is None:
+        return point
+
+    x1, y1, z1 = point
+    x2, y2, z2 = other
+    z1_squared: int = z1 * z1 % _P
+    z2_squared: int = z2 * z2 % _P
+    u1: int = x1 * z2_squared % _P
+    u2: int = x2 * z1_squared % _P
+    s1: int = y1 * z2_squared * z2 % _P
+    s2: int = y2 * z1_squared * z1 % _P
+
+    if u1 == u2:
+        return _double(point) if s1 == s2 else None
+
+    h: int = (u2 - u1) % _P
+    r: int = (s2 - s1) % _P
+    h_squared: int = h * h % _P
+    h_cubed: int = h * h_squared % _P
+    x_new: int = (r * r - h_cubed - 2 * u1 * h_squared) % _P
+
+    return x_new, (r * (u1 * h_squared - x_new) - s1 * h_cubed) % _P, h * z1 * z2 % _P
+
+
+def _to_affine(point: _JacobianPoint) -> Tuple[int, int]:
+    if point is None:
+        raise ValueError("Point at infinity")
+
+    x, y, z = point
+    z_inverse: int = pow(z, -1, _P)
+
+    return x * z_inverse * z_inverse % _P, y * z_inverse * z_inverse * z_inverse % _P
+
+
+def _multiply_g(scalar: int) -> _JacobianPoint:
+    if not _g_doublings:
+        point: _JacobianPoint = (*_G, 1)
+        for _ in range(256):
+            _g_doublings.append(point)
+            point = _double(point)
+
+    result: _JacobianPoint = None
+    for i in range(scalar.bit_length()):
+        if scalar >> i & 1:
+            result = _add(result, _g_doublings[i])
+
+    return result
+
+
+def compress(point: Tuple[int, int]) -> bytes:
+    return bytes([2 + (point[1] & 1)]) + point[0].to_bytes(32, "big")
+
+
+def decompress(public_key: bytes) -> Tuple[int, int]:
+    """Get the affine point of a compressed public key, raises ValueError if it is not on the curve."""
+    if len(public_key) != 33 or public_key[0] not in (2, 3):
+        raise ValueError("Invalid compressed public key")
+
+    x: int = int.from_bytes(public_key[1:], "big")
+    y_squared: int = (pow(x, 3, _P) + 7) % _P
+    # _P % 4 == 3, so this is the square root if there is one
+    y: int = pow(y_squared, (_P + 1) // 4, _P)
+    if x >= _P or y * y % _P != y_squared:
+        raise ValueError("Public key not on the curve")
+
+    return x, y if y & 1 == public_key[0] & 1 else _P - y
+
+
+def get_public_key(secret: bytes) -> bytes:
+    """Get the compressed public key of a private key."""
+    return compress(_to_affine(_multiply_g(int.from_bytes(secret, "big"))))
+
+
+# The constants of RIPEMD-160's left and right lines: the message word, the rotation
+# and the round constant of every step
+_RMD_LEFT_WORDS: Tuple[int, ...] = (
+    0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15,
+    7, 4, 13, 1, 10, 6, 15, 3, 12, 0, 9, 5, 2, 14, 11, 8,
+    3, 10, 14, 4, 9, 15, 8, 1, 2, 7, 0, 6, 13, 11, 5, 12,
+    1, 9, 11, 10, 0, 8, 12, 4, 13, 3, 7, 15, 14, 5, 6, 2,
+    4, 0, 5, 9, 7, 12, 2, 10, 14, 1, 3, 8, 11, 6, 15, 13,
+)
+_RMD_RIGHT_WORDS: Tuple[int, ...] = (
+    5, 14, 7, 0, 9, 2, 11, 4, 13, 6, 15, 8, 1, 10, 3, 12,
+    6, 11, 3, 7, 0, 13, 5, 10, 14, 15, 8, 12, 4, 9, 1, 2,
+    15, 5, 1, 3, 7, 14, 6, 9, 11, 8, 12, 2, 10, 0, 4, 13,
+    8, 6, 4, 1, 3, 11, 15, 0, 5, 12, 2, 13, 9, 7, 10, 14,
+    12, 15, 10, 4, 1, 5, 8, 7, 6, 2, 13, 14, 0, 3, 9, 11,
+)
+_RMD_LEFT_ROTATIONS: Tuple[int, ...] = (
+    11, 14, 15, 12, 5, 8, 7, 9, 11, 13, 14, 15, 6, 7, 9, 8,
+    7, 6, 8, 13, 11, 9, 7, 15, 7, 12, 15, 9, 11, 7, 13, 12,
+    11, 13, 6, 7, 14, 9, 13, 15, 14, 8, 13, 6, 5, 12, 7, 5,
+    11, 12, 14, 15, 14, 15, 9, 8, 9, 14, 5, 6, 8, 6, 5, 12,
+    9, 15, 5, 11, 6, 8, 13, 12, 5, 12, 13, 14, 11, 8, 5, 6,
+)
+_RMD_RIGHT_ROTATIONS: Tuple[int, ...] = (
+    8, 9, 9, 11, 13, 15, 15, 5, 7, 7, 8, 11, 14, 14, 12, 6,
+    9, 13, 15, 7, 12, 8, 9, 11, 7, 7, 12, 7, 6, 15, 13, 11,
+    9, 7, 15, 11, 8, 6, 6, 14, 12, 13, 5, 14, 13, 13, 7, 5,
+    15, 5, 8, 11, 14, 14, 6, 14, 6, 9, 12, 9, 12, 5, 15, 8,
+    8, 5, 12, 9, 12, 5, 14, 6, 8, 13, 6, 5, 15, 13, 11, 11,
+)
+_RMD_LEFT_CONSTANTS: Tuple[int, ...] = (0x00000000, 0x5A827999, 0x6ED9EBA1, 0x8F1BBCDC, 0xA953FD4E)
+_RMD_RIGHT_CONSTANTS: Tuple[int, ...] = (0x50A28BE6, 0x5C4DD124, 0x6D703EF3, 0x7A6D76E9, 0x00000000)
+
+
+def _rotate_left(x: int, n: int) -> int:
+    return (x << n | x >> (32 - n)) & 0xFFFFFFFF
+
+
+def _rmd_function(round_index: int, x: int, y: int, z: int) -> int:
+    if round_index == 0:
+        return x ^ y ^ z
+    if round_index == 1:
+        return x & y | ~x & z
+    if round_index == 2:
+        return (x | ~y) ^ z
+    if round_index == 3:
+        return x & z | y & ~z
+    return x ^ (y | ~z)
+
+
+def ripemd160(data: bytes) -> bytes:
+    """Compute the RIPEMD-160 digest in pure Python.
+
+    OpenSSL 3 only provides RIPEMD-160 with its legacy provider, so hashlib cannot
+    be relied on for it.
+    """
+    padded: bytes = (
+        data
+        + b"\x80"
+        + b"\x00" * ((55 - len(data)) % 64)
+        + struct.pack("<Q", len(data) * 8 % 2 ** 64)
+    )
+    state: List[int] = [0x67452301, 0xEFCDAB89, 0x98BADCFE, 0x10325476, 0xC3D2E1F0]
+
+    for block_start in range(0, len(padded), 64):
+        words: Tuple[int, ...] = struct.unpack("<16I", padded[block_start:block_start + 64])
+        a_left, b_left, c_left, d_left, e_left = state
+        a_right, b_right, c_right, d_right, e_right = state
+
+        for step in range(80):
+            round_index: int = step // 16
+            t: int = _rotate_left(
+                (
+                    a_left
+                    + _rmd_function(round_index, b_left, c_left, d_left)
+                    + words[_RMD_LEFT_WORDS[step]]
+                    + _RMD_LEFT_CONSTANTS[round_index]
+                ) & 0xFFFFFFFF,
+                _RMD_LEFT_ROTATIONS[step],
+            ) + e_left & 0xFFFFFFFF
+            a_left, b_left, c_left, d_left, e_left = (
+                e_left, t, b_left, _rotate_left(c_left, 10), d_left
+            )
+
+            t = _rotate_left(
+                (
+                    a_right
+                    + _rmd_function(4 - round_index, b_right, c_right, d_right)
+                    + words[_RMD_RIGHT_WORDS[step]]
+                    + _RMD_RIGHT_CONSTANTS[round_index]
+                ) & 0xFFFFFFFF,
+                _RMD_RIGHT_ROTATIONS[step],
+            ) + e_right & 0xFFFFFFFF
+            a_right, b_right, c_right, d_right, e_right = (
+                e_right, t, b_right, _rotate_left(c_right, 10), d_right
+            )
+
+        state = [
+            state[1] + c_left + d_right & 0xFFFFFFFF,
+            state[2] + d_left + e_right & 0xFFFFFFFF,
+            state[3] + e_left + a_right & 0xFFFFFFFF,
+            state[4] + a_left + b_right & 0xFFFFFFFF,
+            state[0] + b_left + c_right & 0xFFFFFFFF,
+        ]
+
+    return struct.pack("<5I", *state)
+
+
+def hash160(data: bytes) -> bytes:
+    digest: bytes = hashlib.sha256(data).digest()
+    try:
+        return hashlib.new("ripemd160", digest).digest()
+    except ValueError:
+        # Unsupported by OpenSSL 3 without the legacy provider
+        return ripemd160(digest)
+
+
+def p2pkh_address(public_key: bytes, version: bytes) -> str:
+    """Get the pay-to-public-key-hash address of a public key, by the coin's address version bytes."""
+    return base58check_encode(version + hash160(public_key))
+
+
+class ExtendedPublicKey:
+    """An extended public key, as exported by the wallet's HD account.
+
+    Args:
+        version: The 4 version bytes of the serialization, e.g. 0488b21e for xpub
+        depth: The depth of the key in the tree
+        fingerprint: The first 4 bytes of the parent's hash160
+        child_number: The index of the key below its parent
+        chain_code: The 32 bytes of the chain code
+        public_key: The 33 bytes of the compressed public key
+
+    """
+
+    def __init__(
+            self,
+            version: bytes,
+            depth: int,
+            fingerprint: bytes,
+            child_number: int,
+            chain_code: bytes,
+            public_key: bytes,
+    ) -> None:
+        self.version: bytes = version
+        self.depth: int = depth
+        self.fingerprint: bytes = fingerprint
+        self.child_number: int = child_number
+        self.chain_code: bytes = chain_code
+        self.public_key: bytes = public_key
+        self._point: Tuple[int, int] = decompress(public_key)
+
+    @classmethod
+    def parse(cls, serialized: str) -> "ExtendedPublicKey":
+        """Parse the base58check serialization of an extended public key, raises ValueError if invalid."""
+        data: bytes = base58check_decode(serialized)
+        if len(data) != 78:
+            raise ValueError("Invalid extended public key length")
+
+        return cls(
+            data[:4],
+            data[4],
+            data[5:9],
+            struct.unpack(">I", data[9:13])[0],
+            data[13:45],
+            data[45:],
+        )
+
+    def serialize(self) -> str:
+        return base58check_encode(
+            self.version
+            + bytes([self.depth])
+            + self.fingerprint
+            + struct.pack(">I", self.child_number)
+            + self.chain_code
+            + self.public_key
+        )
+
+    def derive_child(self, index: int) -> "ExtendedPublicKey":
+        """Derive the public child key of a non-hardened index.
+
+        Raises:
+            ValueError: If the index is hardened, or in the about 2^-127 of indexes
+            without a valid child, the next index should be used then
+
+        """
+        if not 0 <= index < HARDENED:
+            raise ValueError(f"Cannot derive hardened or invalid index {index} from a public key")
+
+        digest: bytes = hmac.new(
+            self.chain_code, self.public_key + struct.pack(">I", index), hashlib.sha512
+        ).digest()
+        tweak: int = int.from_bytes(digest[:32], "big")
+        if tweak >= SECP256K1_ORDER:
+            raise ValueError(f"Index {index} has no valid child")
+
+        point: _JacobianPoint = _add(_multiply_g(tweak), (*self._point, 1))
+        if point is None:
+            raise ValueError(f"Index {index} has no valid child")
+
+        return ExtendedPublicKey(
+            self.version,
+            self.depth + 1,
+            hash160(self.public_key)[:4],
+            index,
+            digest[32:],
+            compress(_to_affine(point)),
+        )
+
+    def derive_path(self, path: str) -> "ExtendedPublicKey":
+        """Derive the key of a relative path of non-hardened indexes, e.g. 0/5."""
+        key: ExtendedPublicKey = self
+        for index in filter(None, path.strip("/").split("/")):
+            key = key.derive_child(int(index))
+
+        return key
+
+
+def derive_addresses(
+        xpub: ExtendedPublicKey, path_template: str, indexes: Iterable[int], address_version: bytes
+) -> Dict[int, str]:
+    """Derive the receiving addresses of many indexes.
+
+    Keys of the path above the last {index} are derived once for all indexes.
+
+    Args:
+        xpub: The extended public key the paths are relative to
+        path_template: The path of an index, where {index} is replaced by the index, e.g. 0/{index}
+        indexes: The indexes to derive
+        address_version: The P2PKH address version bytes of the coin
+
+    Returns:
+        The addresses keyed by index
+
+    """
+    prefix, separator, suffix = path_template.rpartition("{index}")
+    if not separator:
+        raise ValueError("The path template has to contain {index}")
+
+    parents: Dict[str, ExtendedPublicKey] = {}
+    addresses: Dict[int, str] = {}
+    for index in indexes:
+        parent_path: str = prefix.format(index=index)
+        if parent_path not in parents:
+            parents[parent_path] = xpub.derive_path(parent_path)
+
+        key: ExtendedPublicKey = parents[parent_path].derive_path(f"{index}{suffix}")
+        addresses[index] = p2pkh_address(key.public_key, address_version)
+
+    return addresses
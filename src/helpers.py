@@ -11,11 +11,27 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+import asyncio
+import bisect
 import re
 import time
 from collections import namedtuple, defaultdict
 from pathlib import PosixPath
-from typing import Pattern, Union, Callable, Any, List, Iterable, Type, Dict, NewType
+from typing import (
+    Pattern,
+    Union,
+    Callable,
+    Any,
+    Awaitable,
+    List,
+    Iterable,
+    Iterator,
+    Optional,
+    Tuple,
+    Type,
+    Dict,
+    NewType,
+)
 
 Path = PosixPath
 Label = str
@@ -116,10 +132,159 @@ def call_until_returns_true(
         function_parameters: List[Any] = None,
         call_interval_seconds: float = 10.0,
 ) -> None:
-    while not function_name(*function_parameters):
+    while not function_name(*(function_parameters or [])):
         time.sleep(call_interval_seconds)
 
 
+async def async_call_until_returns_true(
+        function_name: Callable[..., Awaitable[Any]],
+        function_parameters: List[Any] = None,
+        call_interval_seconds: float = 10.0,
+) -> None:
+    while not await function_name(*(function_parameters or [])):
+        await asyncio.sleep(call_interval_seconds)
+
+
+async def gather_limited(awaitables: Iterable[Awaitable[Any]], limit: int) -> List[Any]:
+    """Await all awaitables with at most 'limit' of them running at the same time.
+
+    Args:
+        awaitables: The awaitables to run
+        limit: Maximum number of awaitables running at the same time
+
+    Returns:
+        The results in the order of 'awaitables', exceptions are returned instead of raised
+
+    """
+    semaphore: asyncio.Semaphore = asyncio.Semaphore(limit)
+
+    async def run(awaitable: Awaitable[Any]) -> Any:
+        async with semaphore:
+            return await awaitable
+
+    return await asyncio.gather(*[run(awaitable) for awaitable in awaitables], return_exceptions=True)
+
+
+class LabelScheme:
+    """A compiled label scheme, which maps iterators to labels and back.
+
+    Runs of #'s in the scheme are placeholders for the iterator's digits, filled from
+    the last run to the first. The first run grows if the iterator has more digits than
+    all runs together.
+
+    Example:
+        >>> scheme = LabelScheme("Coin-W##-MN###")
+        >>> scheme.format(1234)
+            'Coin-W01-MN234'
+        >>> scheme.parse("Coin-W01-MN234")
+            1234
+        >>> list(scheme.labels(9, 10))
+            ['Coin-W00-MN009', 'Coin-W00-MN010']
+
+    """
+
+    def __init__(self, scheme: str) -> None:
+        self.scheme: str = scheme
+        parts: List[str] = re.split(r"(#+)", scheme)
+        self._literals: List[str] = parts[0::2]
+        self._widths: List[int] = [len(run) for run in parts[1::2]]
+
+        if not self._widths:
+            raise ValueError(f"Label scheme has no # placeholder: {scheme}")
+
+        self._width: int = sum(self._widths)
+        self._pattern: Pattern[str] = re.compile(
+            re.escape(self._literals[0])
+            + "".join(
+                (rf"(\d{{{width},}})" if i == 0 else rf"(\d{{{width}}})") + re.escape(literal)
+                for i, (width, literal) in enumerate(zip(self._widths, self._literals[1:]))
+            )
+        )
+
+    def format(self, iterator: int) -> Label:
+        """Get the label of an iterator."""
+        digits: str = str(iterator).zfill(self._width)
+        overflow: int = len(digits) - self._width
+        label: str = self._literals[0]
+        position: int = 0
+
+        for i, (width, literal) in enumerate(zip(self._widths, self._literals[1:])):
+            width += overflow if i == 0 else 0
+            label += digits[position:position + width] + literal
+            position += width
+
+        return label
+
+    def parse(self, label: Label) -> Optional[int]:
+        """Get the iterator of a label, None if the label does not match the scheme."""
+        match = self._pattern.fullmatch(label)
+
+        return int("".join(match.groups())) if match else None
+
+    def labels(self, iterator_start: int, iterator_end: int) -> Iterator[Label]:
+        """Lazily generate the labels of a range of iterators, the end is inclusive."""
+        return (self.format(iterator) for iterator in range(iterator_start, iterator_end + 1))
+
+    def index(self, labels: Iterable[Label]) -> "LabelIndex":
+        """Index the iterators of the labels matching the scheme, other labels are ignored."""
+        return LabelIndex(self, (self.parse(label) for label in labels))
+
+
+class LabelIndex:
+    """The used iterators of a label scheme, sorted to find free iterators in O(log n)."""
+
+    def __init__(self, scheme: LabelScheme, iterators: Iterable[Optional[int]]) -> None:
+        self.scheme: LabelScheme = scheme
+        self._used: List[int] = sorted({iterator for iterator in iterators if iterator is not None})
+
+    def __contains__(self, iterator: int) -> bool:
+        position: int = bisect.bisect_left(self._used, iterator)
+        return position < len(self._used) and self._used[position] == iterator
+
+    def __len__(self) -> int:
+        return len(self._used)
+
+    def next_free(self, iterator_start: int = 0) -> int:
+        """Get the smallest unused iterator greater than or equal to iterator_start."""
+        first: int = bisect.bisect_left(self._used, iterator_start)
+        if first == len(self._used) or self._used[first] != iterator_start:
+            return iterator_start
+
+        # _used[k] - k does not decrease, and stays equal to iterator_start - first
+        # as long as the iterators from iterator_start on are contiguous
+        low: int = first
+        high: int = len(self._used)
+        while low < high:
+            middle: int = (low + high) // 2
+            if self._used[middle] - middle == iterator_start - first:
+                low = middle + 1
+            else:
+                high = middle
+
+        return iterator_start + low - first
+
+    def gaps(self, iterator_start: int = 0) -> Iterator[Tuple[int, int]]:
+        """Lazily generate the ranges of unused iterators between used ones, the ends are inclusive."""
+        previous: int = iterator_start - 1
+
+        for iterator in self._used[bisect.bisect_left(self._used, iterator_start):]:
+            if iterator > previous + 1:
+                yield previous + 1, iterator - 1
+            previous = iterator
+
+    def allocate(self, count: int, iterator_start: int = 0) -> List[Label]:
+        """Reserve the labels of the next count unused iterators, filling gaps first."""
+        labels: List[Label] = []
+        iterator: int = iterator_start
+
+        for _ in range(count):
+            iterator = self.next_free(iterator)
+            bisect.insort(self._used, iterator)
+            labels.append(self.scheme.format(iterator))
+
+        return labels
+
+
 class Ip:
     """A string wrapped to represent an IPv4 address.
 
@@ -188,7 +353,8 @@ class Genkey:
     """
 
     def __init__(self, genkey: str) -> None:
-        if genkey.isalnum() and len(genkey) == 50:
+        # 51 characters for the uncompressed WIF of most coins, shorter or longer by the version bytes
+        if genkey.isalnum() and 50 <= len(genkey) <= 52:
             self.genkey: str = genkey
         else:
             raise ValueError("Invalid genkey.")
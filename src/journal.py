@@ -0,0 +1,261 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Journal the setup stages of instances, so that interrupted setups can be resumed."""
+
+import sqlite3
+import threading
+import time
+from sqlite3.dbapi2 import Connection, Cursor
+from typing import Dict, List, Optional, Set, Tuple
+
+from src import pymasternode
+from src.helpers import Label, Path
+
+# Stages in the order they are completed by vps.Instance.complete_setup.
+# "create_requested" is recorded before the Vultr API call, so that a crash between
+# the call and its answer can be detected and the created server can be adopted.
+STAGES: Tuple[str, ...] = (
+    "create_requested",
+    "created",
+    "built",
+    "pre_setup",
+    "installed",
+    "synced",
+)
+
+
+def connect(path: Path) -> Connection:
+    """Open a journal database, creating or migrating its table.
+
+    Args:
+        path: The path of the database
+
+    Returns:
+        The connection, which can be shared between threads
+
+    """
+    db: Connection = sqlite3.connect(path, check_same_thread=False)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=FULL")
+    db.execute(
+        "CREATE TABLE IF NOT EXISTS journal("
+        "label TEXT NOT NULL, stage TEXT NOT NULL, subid TEXT, ip TEXT, timestamp REAL NOT NULL)"
+    )
+    db.execute("CREATE INDEX IF NOT EXISTS journal_label ON journal(label)")
+    # Columns added after the first release, added to existing journals. Spares of a warm
+    # pool are journaled like instances, but are no setups to resume.
+    for column, definition in [("spare", "INTEGER NOT NULL DEFAULT 0"), ("coin", "TEXT")]:
+        if column not in [info[1] for info in db.execute("PRAGMA table_info(journal)")]:
+            db.execute(f"ALTER TABLE journal ADD COLUMN {column} {definition}")
+    db.commit()
+
+    return db
+
+
+DB: Connection = connect(pymasternode.PATH_DATA / "setup_journal.db")
+curs: Cursor = DB.cursor()
+lock: threading.Lock = threading.Lock()
+
+
+def record_stage(
+        label: Label,
+        stage: str,
+        subid: Optional[str] = None,
+        ip: Optional[str] = None,
+        coin_name: Optional[str] = None,
+        spare: bool = False,
+) -> None:
+    """Durably record that an instance completed a stage.
+
+    Args:
+        label: The label of the instance
+        stage: The completed stage, one of STAGES
+        subid: The subid of the instance, if known
+        ip: The IP of the instance, if known
+        coin_name: The name of the instance's coin, see get_unfinished
+        spare: Whether the instance is a spare of a warm pool, see get_unfinished
+
+    """
+    if stage not in STAGES:
+        raise ValueError(f"Unknown stage: {stage}")
+
+    with lock:
+        curs.execute(
+            "INSERT INTO journal(label, stage, subid, ip, timestamp, spare, coin)"
+            " VALUES(?, ?, ?, ?, ?, ?, ?)",
+            (
+                str(label),
+                stage,
+                subid and str(subid),
+                ip and str(ip),
+                time.time(),
+                int(spare),
+                coin_name,
+            ),
+        )
+        DB.commit()
+
+
+def get_last_stage(label: Label) -> Optional[str]:
+    """Get the last stage an instance completed.
+
+    Args:
+        label: The label of the instance
+
+    Returns:
+        The last completed stage, None if the instance is not journaled
+
+    """
+    with lock:
+        curs.execute(
+            "SELECT stage FROM journal WHERE label = ? ORDER BY rowid DESC LIMIT 1",
+            (str(label),),
+        )
+        row = curs.fetchone()
+
+    return row[0] if row else None
+
+
+def is_completed(label: Label, stage: str) -> bool:
+    """Check if an instance has completed a stage, or any later stage.
+
+    Args:
+        label: The label of the instance
+        stage: The stage to check, one of STAGES
+
+    Returns:
+        True if the stage is completed, False otherwise
+
+    """
+    last_stage: Optional[str] = get_last_stage(label)
+
+    return last_stage is not None and STAGES.index(last_stage) >= STAGES.index(stage)
+
+
+def get_server_info(label: Label) -> Tuple[Optional[str], Optional[str]]:
+    """Get the most recently journaled subid and IP of an instance.
+
+    Args:
+        label: The label of the instance
+
+    Returns:
+        A tuple of subid and IP, either of which is None if not yet known
+
+    """
+    with lock:
+        curs.execute(
+            "SELECT"
+            " (SELECT subid FROM journal WHERE label = ? AND subid IS NOT NULL ORDER BY rowid DESC LIMIT 1),"
+            " (SELECT ip FROM journal WHERE label = ? AND ip IS NOT NULL ORDER BY rowid DESC LIMIT 1)",
+            (str(label), str(label)),
+        )
+        return curs.fetchone()
+
+
+def get_unfinished(coin_name: Optional[str] = None) -> List[Label]:
+    """Get the labels of all instances that did not complete the last stage.
+
+    Spares of a warm pool are never unfinished, the pool prepares them itself.
+
+    Args:
+        coin_name: Only get instances journaled with this coin, instances journaled
+        without a coin are only listed if not provided
+
+    Returns:
+        Labels of unfinished instances, in the order they were first journaled
+
+    """
+    with lock:
+        curs.execute(
+            "SELECT label FROM journal GROUP BY label"
+            " HAVING MAX(CASE WHEN stage = ? THEN 1 ELSE 0 END) = 0 AND MAX(spare) = 0"
+            " AND (? IS NULL OR MAX(coin = ?) = 1)"
+            " ORDER BY MIN(rowid)",
+            (STAGES[-1], coin_name, coin_name),
+        )
+        return [row[0] for row in curs.fetchall()]
+
+
+def forget(label: Label) -> None:
+    """Remove all journal entries of an instance, e.g. after it was destroyed.
+
+    Args:
+        label: The label of the instance
+
+    """
+    with lock:
+        curs.execute("DELETE FROM journal WHERE label = ?", (str(label),))
+        DB.commit()
+
+
+class MemoryJournal:
+    """A journal with the same functions as this module, kept in memory.
+
+    Used where setup stages must not be recorded durably, e.g. in simulations.
+
+    """
+
+    def __init__(self) -> None:
+        self._entries: Dict[Label, List[Tuple[str, Optional[str], Optional[str]]]] = {}
+        self._spares: Set[Label] = set()
+        self._coin_names: Dict[Label, str] = {}
+
+    def record_stage(
+            self,
+            label: Label,
+            stage: str,
+            subid: Optional[str] = None,
+            ip: Optional[str] = None,
+            coin_name: Optional[str] = None,
+            spare: bool = False,
+    ) -> None:
+        if stage not in STAGES:
+            raise ValueError(f"Unknown stage: {stage}")
+
+        self._entries.setdefault(str(label), []).append(
+            (stage, subid and str(subid), ip and str(ip))
+        )
+        if coin_name is not None:
+            self._coin_names[str(label)] = coin_name
+        if spare:
+            self._spares.add(str(label))
+
+    def get_last_stage(self, label: Label) -> Optional[str]:
+        entries = self._entries.get(str(label))
+        return entries[-1][0] if entries else None
+
+    def is_completed(self, label: Label, stage: str) -> bool:
+        last_stage: Optional[str] = self.get_last_stage(label)
+        return last_stage is not None and STAGES.index(last_stage) >= STAGES.index(stage)
+
+    def get_server_info(self, label: Label) -> Tuple[Optional[str], Optional[str]]:
+        entries = self._entries.get(str(label), [])
+        return (
+            next((subid for _, subid, _ in reversed(entries) if subid is not None), None),
+            next((ip for _, _, ip in reversed(entries) if ip is not None), None),
+        )
+
+    def get_unfinished(self, coin_name: Optional[str] = None) -> List[Label]:
+        return [
+            label
+            for label, entries in self._entries.items()
+            if STAGES[-1] not in (stage for stage, _, _ in entries)
+            and label not in self._spares
+            and (coin_name is None or self._coin_names.get(label) == coin_name)
+        ]
+
+    def forget(self, label: Label) -> None:
+        self._entries.pop(str(label), None)
+        self._spares.discard(str(label))
+        self._coin_names.pop(str(label), None)
@@ -0,0 +1,174 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Generate masternode genkeys in-process, without the wallet's daemon.
+
+A genkey is a secp256k1 private key in the wallet import format (WIF) of the coin:
+base58check of the coin's secret key version bytes followed by the 32 bytes of the key.
+Like the daemon's "masternode genkey", keys are uncompressed unless asked otherwise:
+
+    >>> genkeys = generate_genkeys(1000, get_coin("GLT"))
+
+"""
+
+import hashlib
+import secrets
+from typing import List, Tuple
+
+from src.coin import Coin
+from src.helpers import Genkey
+
+BASE58_ALPHABET: str = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+
+# The order of the secp256k1 group, private keys are in [1, SECP256K1_ORDER)
+SECP256K1_ORDER: int = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEBAAEDCE6AF48A03BBFD25E8CD0364141
+
+# Appended to the key of a WIF whose public key is compressed
+_COMPRESSED_FLAG: bytes = b"\x01"
+
+
+def _checksum(payload: bytes) -> bytes:
+    return hashlib.sha256(hashlib.sha256(payload).digest()).digest()[:4]
+
+
+def base58_encode(data: bytes) -> str:
+    number: int = int.from_bytes(data, "big")
+    encoded: List[str] = []
+    while number:
+        number, remainder = divmod(number, 58)
+        encoded.append(BASE58_ALPHABET[remainder])
+
+    # Every leading zero byte is encoded as a leading 1
+    leading_zeros: int = len(data) - len(data.lstrip(b"\x00"))
+
+    return "1" * leading_zeros + "".join(reversed(encoded))
+
+
+def base58_decode(encoded: str) -> bytes:
+    number: int = 0
+    for char in encoded:
+        digit: int = BASE58_ALPHABET.find(char)
+        if digit < 0:
+            raise ValueError(f"Invalid base58 character: {char!r}")
+        number = number * 58 + digit
+
+    leading_ones: int = len(encoded) - len(encoded.lstrip("1"))
+
+    return b"\x00" * leading_ones + number.to_bytes((number.bit_length() + 7) // 8, "big")
+
+
+def base58check_encode(payload: bytes) -> str:
+    return base58_encode(payload + _checksum(payload))
+
+
+def base58check_decode(encoded: str) -> bytes:
+    """Decode base58check, raises ValueError if the checksum does not match."""
+    data: bytes = base58_decode(encoded)
+    payload, checksum = data[:-4], data[-4:]
+    if len(data) < 4 or _checksum(payload) != checksum:
+        raise ValueError("Invalid base58check checksum")
+
+    return payload
+
+
+def encode_wif(secret: bytes, version: bytes, compressed: bool = False) -> str:
+    """Encode a private key in the wallet import format.
+
+    Args:
+        secret: The 32 bytes of the private key
+        version: The secret key version bytes of the coin
+        compressed: Whether the key's public key is compressed
+
+    Returns:
+        The private key as WIF
+
+    """
+    return base58check_encode(version + secret + (_COMPRESSED_FLAG if compressed else b""))
+
+
+def decode_wif(wif: str, version: bytes) -> Tuple[bytes, bool]:
+    """Decode a private key in the wallet import format.
+
+    Args:
+        wif: The private key as WIF
+        version: The secret key version bytes of the coin
+
+    Returns:
+        The 32 bytes of the private key and whether its public key is compressed
+
+    Raises:
+        ValueError: If the WIF is malformed, of another coin or not a valid secp256k1 key
+
+    """
+    payload: bytes = base58check_decode(wif)
+    if not payload.startswith(version):
+        raise ValueError("WIF of another coin")
+
+    key: bytes = payload[len(version):]
+    compressed: bool = len(key) == 33 and key.endswith(_COMPRESSED_FLAG)
+    secret: bytes = key[:32] if compressed else key
+    if len(secret) != 32 or not 0 < int.from_bytes(secret, "big") < SECP256K1_ORDER:
+        raise ValueError("Invalid private key")
+
+    return secret, compressed
+
+
+def generate_secret() -> bytes:
+    """Generate a secp256k1 private key from the OS's CSPRNG."""
+    while True:
+        secret: bytes = secrets.token_bytes(32)
+        # Rejects the about 2^-128 of random numbers which are no valid keys
+        if 0 < int.from_bytes(secret, "big") < SECP256K1_ORDER:
+            return secret
+
+
+def _get_version(coin: Coin) -> bytes:
+    if coin.secret_key_version is None:
+        raise ValueError(f"secret_key_version of {coin.name} is not configured")
+
+    return coin.secret_key_version
+
+
+def generate_genkey(coin: Coin, compressed: bool = False) -> Genkey:
+    """Generate a masternode genkey of a coin, see generate_genkeys."""
+    return Genkey(encode_wif(generate_secret(), _get_version(coin), compressed))
+
+
+def generate_genkeys(count: int, coin: Coin, compressed: bool = False) -> List[Genkey]:
+    """Generate masternode genkeys of a coin.
+
+    Args:
+        count: The number of genkeys
+        coin: The coin, its secret_key_version has to be configured
+        compressed: Whether the genkeys' public keys are compressed, the daemon's genkeys are not
+
+    Returns:
+        The generated genkeys
+
+    Raises:
+        ValueError: If the coin's secret_key_version is not configured
+
+    """
+    version: bytes = _get_version(coin)
+
+    return [Genkey(encode_wif(generate_secret(), version, compressed)) for _ in range(count)]
+
+
+def is_valid_genkey(genkey: str, coin: Coin) -> bool:
+    """Check whether a genkey is a valid WIF of a coin."""
+    try:
+        decode_wif(genkey, _get_version(coin))
+    except ValueError:
+        return False
+
+    return True
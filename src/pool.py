@@ -0,0 +1,283 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Keep a warm pool of spare servers that are built and pre-setup.
+
+A new or replacement masternode claims a spare, which is relabelled through the
+Vultr API and journaled as pre-setup, so its setup continues with install_mn:
+
+    >>> async with AsyncVultr() as vultr:
+    ...     pool = WarmPool(size=10, vultr=vultr)
+    ...     await pool.refill()
+    ...     instance = await pool.claim("GLT-MN00042")
+    ...     await instance.complete_setup()
+
+Spares are Vultr servers tagged with the coin whose labels match the pool's label
+scheme. Their setup stages are journaled under their spare label like any other instance,
+marked as spares, so that journal.get_unfinished does not list them.
+Servers of retired masternodes are reinstalled and returned to the pool instead of
+being destroyed, as long as the pool is not full.
+"""
+
+import asyncio
+from typing import Any, Dict, List, Optional, Set
+
+from src import aio, journal, wallet
+from src.aio import AsyncInstance, AsyncVultr
+from src.coin import Coin
+from src.helpers import Label, LabelScheme, async_call_until_returns_true
+
+
+class SpareJournal:
+    """A journal recording the stages of spares in another journal, marked as spares.
+
+    Args:
+        setup_journal: The journal to record in, the journal module or a journal.MemoryJournal
+
+    """
+
+    def __init__(self, setup_journal: Any) -> None:
+        self.journal: Any = setup_journal
+
+    def record_stage(
+            self,
+            label: Label,
+            stage: str,
+            subid: Optional[str] = None,
+            ip: Optional[str] = None,
+            coin_name: Optional[str] = None,
+    ) -> None:
+        self.journal.record_stage(label, stage, subid=subid, ip=ip, coin_name=coin_name, spare=True)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.journal, name)
+
+
+class WarmPool:
+    """A pool of spare servers of a coin.
+
+    Args:
+        coin: The coin of the spares, wallet.DEFAULT_COIN if not provided
+        size: The number of spares to keep
+        vultr: The Vultr client to use, a new one if not provided
+        setup_journal: Where stages are recorded, see aio.AsyncInstance
+        label_scheme: The label scheme of spares (default: <coin>-SPARE-####)
+        max_concurrency: Maximum number of spares being prepared at the same time
+        reinstall_settle_seconds: Time Vultr needs to start a reinstall, before the
+        server is polled for being built again
+
+    """
+
+    def __init__(
+            self,
+            coin: Optional[Coin] = None,
+            size: int = 5,
+            vultr: Optional[AsyncVultr] = None,
+            setup_journal: Any = journal,
+            label_scheme: Optional[str] = None,
+            max_concurrency: int = 10,
+            reinstall_settle_seconds: float = 60.0,
+    ) -> None:
+        self.coin: Coin = coin if coin is not None else wallet.DEFAULT_COIN
+        self.size: int = size
+        self.vultr: AsyncVultr = vultr if vultr is not None else aio.AsyncVultr()
+        self.journal: Any = setup_journal
+        self.spare_journal: SpareJournal = SpareJournal(setup_journal)
+        self.label_scheme: LabelScheme = LabelScheme(
+            label_scheme if label_scheme is not None else f"{self.coin.name}-SPARE-####"
+        )
+        self.max_concurrency: int = max_concurrency
+        self.reinstall_settle_seconds: float = reinstall_settle_seconds
+
+        # Serializes picking spares and spare labels
+        self._lock: asyncio.Lock = asyncio.Lock()
+        # Subids of spares that were claimed, but might not be relabelled yet
+        self._claimed: Set[str] = set()
+        self._preparing: Dict[Label, asyncio.Task] = {}
+        self._refill_task: Optional[asyncio.Task] = None
+        self._semaphore: asyncio.Semaphore = asyncio.Semaphore(max_concurrency)
+
+    def _get_instance(self, label: Label, spare: bool = False) -> AsyncInstance:
+        return AsyncInstance(
+            label,
+            self.coin,
+            vultr=self.vultr,
+            setup_journal=self.spare_journal if spare else self.journal,
+        )
+
+    async def get_spares(self) -> Dict[Label, Dict[str, Any]]:
+        """Get the server info of all spares, keyed by label."""
+        return {
+            server_info["label"]: server_info
+            for server_info in (await self.vultr.server_list()).values()
+            if server_info.get("tag") == self.coin.name
+            and self.label_scheme.parse(server_info["label"]) is not None
+            and server_info["SUBID"] not in self._claimed
+        }
+
+    async def get_ready(self) -> List[Label]:
+        """Get the labels of all spares that are built and pre-setup."""
+        return [
+            label
+            for label in await self.get_spares()
+            if self.journal.is_completed(label, "pre_setup")
+        ]
+
+    async def _prepare(self, instance: AsyncInstance) -> None:
+        if instance.subid is None:
+            await instance.create(delay_return_until_built=False)
+
+        if not self.spare_journal.is_completed(instance.label, "built"):
+            await async_call_until_returns_true(instance.is_built, call_interval_seconds=5.0)
+            await instance.journal_stage("built", subid=instance.subid, ip=instance.ip)
+
+        if not self.spare_journal.is_completed(instance.label, "pre_setup"):
+            await instance.pre_setup()
+            await instance.journal_stage("pre_setup")
+
+    def _start_preparing(self, instance: AsyncInstance, delay_seconds: float = 0.0) -> asyncio.Task:
+        async def prepare() -> None:
+            try:
+                await asyncio.sleep(delay_seconds)
+                async with self._semaphore:
+                    await self._prepare(instance)
+            finally:
+                self._preparing.pop(instance.label, None)
+
+        self._preparing[instance.label] = asyncio.ensure_future(prepare())
+        return self._preparing[instance.label]
+
+    async def refill(self) -> List[Any]:
+        """Create spares until the pool is full and prepare the spares that are not ready.
+
+        Returns:
+            None for every spare prepared successfully, the raised exception otherwise
+
+        """
+        async with self._lock:
+            spares: Dict[Label, Dict[str, Any]] = await self.get_spares()
+            existing: Set[Label] = {*spares, *self._preparing}
+            labels: List[Label] = [
+                label
+                for label in spares
+                if not self.journal.is_completed(label, "pre_setup") and label not in self._preparing
+            ]
+            labels += self.label_scheme.index(existing).allocate(max(self.size - len(existing), 0))
+
+            tasks: List[asyncio.Task] = []
+            for label in labels:
+                instance: AsyncInstance = self._get_instance(label, spare=True)
+                if label in spares:
+                    instance.subid = spares[label]["SUBID"]
+                tasks.append(self._start_preparing(instance))
+
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    def schedule_refill(self) -> None:
+        """Refill the pool in the background, unless a refill is running already."""
+        if self._refill_task is None or self._refill_task.done():
+            self._refill_task = asyncio.ensure_future(self.refill())
+
+    async def claim(self, label: Label) -> AsyncInstance:
+        """Turn a ready spare into the instance of a masternode and refill the pool in the background.
+
+        The spare is relabelled and journaled as pre-setup under the new label, so
+        AsyncInstance.complete_setup continues with install_mn.
+
+        Args:
+            label: The label of the masternode
+
+        Returns:
+            The instance of the masternode, without a server if no spare is ready,
+            in which case complete_setup creates one
+
+        """
+        instance: AsyncInstance = self._get_instance(label)
+
+        async with self._lock:
+            spares: Dict[Label, Dict[str, Any]] = await self.get_spares()
+            ready: List[Label] = [
+                spare for spare in spares if self.journal.is_completed(spare, "pre_setup")
+            ]
+            if not ready:
+                self.schedule_refill()
+                return instance
+
+            spare: Dict[str, Any] = spares[min(ready)]
+            self._claimed.add(spare["SUBID"])
+
+        try:
+            await self.vultr.server_label_set(spare["SUBID"], label)
+            instance.subid = spare["SUBID"]
+            instance.ip = spare["main_ip"]
+            await instance.journal_stage("created", subid=instance.subid)
+            await instance.journal_stage("built", subid=instance.subid, ip=instance.ip)
+            await instance.journal_stage("pre_setup")
+            self.journal.forget(spare["label"])
+        finally:
+            # A spare that failed to be relabelled can be claimed again
+            self._claimed.discard(spare["SUBID"])
+
+        self.schedule_refill()
+        return instance
+
+    async def _forget_host_key(self, ip: str) -> None:
+        # A reinstalled server has a new host key, which ssh would reject
+        process: asyncio.subprocess.Process = await asyncio.create_subprocess_exec(
+            "ssh-keygen", "-R", ip,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        await process.wait()
+
+    async def recycle(self, instance: AsyncInstance) -> bool:
+        """Return the server of a retired masternode to the pool, or destroy it if the pool is full.
+
+        The server is reinstalled and relabelled as a spare, and prepared in the background.
+
+        Args:
+            instance: The instance of the retired masternode, its subid and IP have to be set
+
+        Returns:
+            True if the server was recycled, False if it was destroyed
+
+        """
+        self.journal.forget(instance.label)
+
+        async with self._lock:
+            spares: Dict[Label, Dict[str, Any]] = await self.get_spares()
+            if len({*spares, *self._preparing}) >= self.size:
+                await instance.destroy()
+                return False
+
+            spare_label: Label = self.label_scheme.index({*spares, *self._preparing}).allocate(1)[0]
+            await instance.reinstall()
+            await self.vultr.server_label_set(instance.subid, spare_label)
+
+            spare: AsyncInstance = self._get_instance(spare_label, spare=True)
+            spare.subid = str(instance.subid)
+            await spare.journal_stage("created", subid=spare.subid)
+            self._start_preparing(spare, self.reinstall_settle_seconds)
+
+        await self._forget_host_key(str(instance.ip))
+
+        return True
+
+    async def close(self) -> None:
+        """Cancel refilling and preparing spares, they are resumed by the next refill."""
+        tasks: List[asyncio.Task] = [
+            task for task in [self._refill_task, *self._preparing.values()] if task is not None
+        ]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
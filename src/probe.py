@@ -0,0 +1,277 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Probe the liveness of nodes by connecting to their P2P port, without SSH.
+
+A probe opens a TCP connection to the node and, if the coin's network magic is
+configured, exchanges version messages of the Bitcoin P2P protocol the coins are
+forked from. Thousands of nodes are probed concurrently from one event loop:
+
+    >>> results = probe_fleet(handshake=True)
+    >>> print([label for label, result in results.items() if not result.reachable])
+
+"""
+
+import asyncio
+import hashlib
+import ipaddress
+import os
+import struct
+import time
+from collections import namedtuple
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from src import wallet
+from src.coin import Coin
+from src.helpers import Label, gather_limited
+
+ProbeResult = namedtuple(
+    "ProbeResult", ["label", "ip", "port", "reachable", "rtt_seconds", "version", "error"]
+)
+
+# magic, command, payload length, checksum
+_HEADER: struct.Struct = struct.Struct("<4s12sI4s")
+# Larger version payloads are not sent by honest nodes
+_MAX_VERSION_PAYLOAD: int = 1024
+
+
+def _checksum(payload: bytes) -> bytes:
+    return hashlib.sha256(hashlib.sha256(payload).digest()).digest()[:4]
+
+
+def _net_addr(ip: str, port: int) -> bytes:
+    address = ipaddress.ip_address(ip)
+    if address.version == 4:
+        address = ipaddress.IPv6Address(b"\0" * 10 + b"\xff" * 2 + address.packed)
+
+    return struct.pack("<Q", 0) + address.packed + struct.pack(">H", port)
+
+
+def build_message(magic: bytes, command: str, payload: bytes) -> bytes:
+    """Build a P2P message.
+
+    Args:
+        magic: The network magic of the coin
+        command: The command of the message, e.g. version
+        payload: The payload of the message
+
+    Returns:
+        The message, ready to be sent
+
+    """
+    return (
+        _HEADER.pack(magic, command.encode(), len(payload), _checksum(payload)) + payload
+    )
+
+
+def build_version_message(
+        magic: bytes, protocol_version: int, ip: str, port: int, user_agent: str = "/pymasternode/"
+) -> bytes:
+    """Build the version message that opens a P2P connection.
+
+    Args:
+        magic: The network magic of the coin
+        protocol_version: The protocol version to announce
+        ip: The IP of the node the message is sent to
+        port: The port of the node the message is sent to
+        user_agent: The user agent to announce
+
+    Returns:
+        The version message, ready to be sent
+
+    """
+    payload: bytes = (
+        struct.pack("<iQq", protocol_version, 0, int(time.time()))
+        + _net_addr(ip, port)
+        + _net_addr("0.0.0.0", 0)
+        + os.urandom(8)
+        + bytes([len(user_agent)])
+        + user_agent.encode()
+        # start height and relay
+        + struct.pack("<i?", 0, False)
+    )
+
+    return build_message(magic, "version", payload)
+
+
+async def read_message(reader: asyncio.StreamReader, magic: bytes) -> Tuple[str, bytes]:
+    """Read a P2P message.
+
+    Args:
+        reader: The stream to read from
+        magic: The expected network magic
+
+    Returns:
+        A tuple of the command and the payload of the message
+
+    Raises:
+        ValueError: If the message does not have the magic or a valid checksum
+
+    """
+    message_magic, command, length, checksum = _HEADER.unpack(
+        await reader.readexactly(_HEADER.size)
+    )
+    if message_magic != magic:
+        raise ValueError(f"Wrong network magic: {message_magic.hex()}")
+    if length > _MAX_VERSION_PAYLOAD:
+        raise ValueError(f"Message too long: {length} bytes")
+
+    payload: bytes = await reader.readexactly(length)
+    if _checksum(payload) != checksum:
+        raise ValueError("Wrong checksum")
+
+    return command.rstrip(b"\0").decode(errors="replace"), payload
+
+
+async def probe(
+        ip: str,
+        port: int,
+        label: Optional[Label] = None,
+        magic: Optional[bytes] = None,
+        protocol_version: int = 70208,
+        timeout_seconds: float = 5.0,
+) -> ProbeResult:
+    """Probe a node by connecting to its P2P port.
+
+    Args:
+        ip: The IP of the node
+        port: The P2P port of the node
+        label: The label of the node, only passed through to the result
+        magic: The network magic of the coin, the version handshake is skipped if None
+        protocol_version: The protocol version to announce in the handshake
+        timeout_seconds: Timeout of connecting and of the handshake each
+
+    Returns:
+        If the node accepted the connection (and answered the handshake), the round trip time
+        of connecting, the protocol version the node announced (None without handshake)
+        and the error if the node is unreachable
+
+    """
+    start: float = time.perf_counter()
+    try:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(ip, port), timeout_seconds
+        )
+    except (OSError, asyncio.TimeoutError) as error:
+        return ProbeResult(label, ip, port, False, None, None, repr(error))
+
+    rtt_seconds: float = time.perf_counter() - start
+    try:
+        if magic is None:
+            return ProbeResult(label, ip, port, True, rtt_seconds, None, None)
+
+        writer.write(build_version_message(magic, protocol_version, ip, port))
+        await writer.drain()
+        command, payload = await asyncio.wait_for(read_message(reader, magic), timeout_seconds)
+        if command != "version" or len(payload) < 4:
+            raise ValueError(f"Expected a version message, got {command}")
+
+        version: int = struct.unpack_from("<i", payload)[0]
+
+        return ProbeResult(label, ip, port, True, rtt_seconds, version, None)
+    except (OSError, ValueError, asyncio.TimeoutError, asyncio.IncompleteReadError) as error:
+        return ProbeResult(label, ip, port, False, rtt_seconds, None, repr(error))
+    finally:
+        writer.close()
+
+
+async def probe_all(
+        nodes: Iterable[Tuple[Label, str, int]],
+        magic: Optional[bytes] = None,
+        protocol_version: int = 70208,
+        max_concurrency: int = 1000,
+        timeout_seconds: float = 5.0,
+) -> Dict[Label, ProbeResult]:
+    """Probe nodes concurrently.
+
+    Args:
+        nodes: Tuples of label, IP and P2P port of the nodes
+        magic: The network magic of the coin, the version handshake is skipped if None
+        protocol_version: The protocol version to announce in the handshake
+        max_concurrency: Maximum number of connections open at the same time,
+        keep it below the limit of open files
+        timeout_seconds: Timeout of connecting and of the handshake each
+
+    Returns:
+        The result of each node by label
+
+    """
+    results: List[Any] = await gather_limited(
+        [
+            probe(ip, port, label, magic, protocol_version, timeout_seconds)
+            for label, ip, port in nodes
+        ],
+        max_concurrency,
+    )
+
+    return {result.label: result for result in results}
+
+
+async def async_probe_fleet(
+        coin: Optional[Coin] = None,
+        handshake: bool = False,
+        max_concurrency: int = 1000,
+        timeout_seconds: float = 5.0,
+) -> Dict[Label, ProbeResult]:
+    """Probe the port of every masternode in masternode.conf that has an IP, see probe_fleet."""
+    coin = coin if coin is not None else wallet.DEFAULT_COIN
+    if handshake and coin.network_magic is None:
+        raise ValueError(f"network_magic of {coin.name} is not configured")
+
+    nodes: List[Tuple[Label, str, int]] = []
+    invalid: Dict[Label, ProbeResult] = {}
+    for entry in wallet.read_mn_conf(coin):
+        if entry.address is None or entry.address.startswith("<ip>"):
+            continue
+        ip, _, port = entry.address.rpartition(":")
+        if not ip or "<" in ip or not port.isdigit():
+            invalid[entry.label] = ProbeResult(
+                entry.label, ip or None, None, False, None, None, f"Invalid address: {entry.address}"
+            )
+            continue
+        nodes.append((entry.label, ip.strip("[]"), int(port)))
+
+    return {
+        **await probe_all(
+            nodes,
+            coin.network_magic if handshake else None,
+            coin.protocol_version,
+            max_concurrency,
+            timeout_seconds,
+        ),
+        **invalid,
+    }
+
+
+def probe_fleet(
+        coin: Optional[Coin] = None,
+        handshake: bool = False,
+        max_concurrency: int = 1000,
+        timeout_seconds: float = 5.0,
+) -> Dict[Label, ProbeResult]:
+    """Probe the port in masternode.conf of every masternode that has an IP.
+
+    A masternode whose address is malformed is reported as unreachable, with the error
+    "Invalid address: <address>".
+
+    Args:
+        coin: The coin to use, wallet.DEFAULT_COIN if not provided
+        handshake: If True, do the version handshake, needs the coin's network_magic
+        max_concurrency: Maximum number of connections open at the same time
+        timeout_seconds: Timeout of connecting and of the handshake each
+
+    Returns:
+        The result of each masternode by label
+
+    """
+    return asyncio.run(async_probe_fleet(coin, handshake, max_concurrency, timeout_seconds))
@@ -14,6 +14,7 @@
 """Main module."""
 
 import json
+import os
 from pathlib import PosixPath
 from typing import Dict, Union
 
@@ -22,8 +23,11 @@ from vultr import Vultr
 
 PATH_PROJECT_ROOT: object = PosixPath(__file__).parents[1]
 
-with open(PATH_PROJECT_ROOT / "data" / "Settings.json") as f:
+# The directory of the local config and databases, PYMASTERNODE_DATA if set, e.g. by the tests
+PATH_DATA: object = PosixPath(os.environ.get("PYMASTERNODE_DATA", PATH_PROJECT_ROOT / "data"))
+
+with open(PATH_DATA / "Settings.json") as f:
     CONFIG: Dict[str, Union[str, int]] = json.load(f)
 
-with open(PATH_PROJECT_ROOT / "data" / "api_key_vultr.txt") as file:
+with open(PATH_DATA / "api_key_vultr.txt") as file:
     VULTR: Vultr = vultr.Vultr(file.read().strip())
@@ -0,0 +1,279 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Run fleet-wide commands on all cores, by sharding the fleet across worker processes.
+
+ParallelSSHClient runs in one thread, so the SSH crypto and output parsing of a large
+fleet are bound to one core. The ShardedExecutor assigns every label to one of its
+worker processes by consistent hashing, so a host is always handled by the same worker,
+which keeps the SSH clients of its hosts connected between calls. The results of all
+workers are merged into one stream as they arrive:
+
+    >>> with ShardedExecutor() as executor:
+    ...     for label, result in executor.run_command(targets, "uptime"):
+    ...         print(label, result.exit_code, result.stdout)
+
+"""
+
+import bisect
+import hashlib
+import itertools
+import multiprocessing
+import os
+import queue
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+from src import vps
+from src.capture import OutputCapture
+from src.helpers import Command, Label, Path
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """Assigns labels to shards by consistent hashing.
+
+    Every shard owns many points on the ring, a label belongs to the shard owning the
+    next point after the label's hash. Adding a shard only moves about 1/shards of the labels.
+
+    Args:
+        shards: The number of shards
+        replicas: The number of points of every shard, more points spread labels more evenly
+
+    """
+
+    def __init__(self, shards: int, replicas: int = 100) -> None:
+        points: List[Tuple[int, int]] = sorted(
+            (_hash(f"{shard}-{replica}"), shard)
+            for shard in range(shards)
+            for replica in range(replicas)
+        )
+        self.shards: int = shards
+        self._hashes: List[int] = [point for point, _ in points]
+        self._shards: List[int] = [shard for _, shard in points]
+
+    def get_shard(self, label: Label) -> int:
+        position: int = bisect.bisect(self._hashes, _hash(str(label))) % len(self._hashes)
+        return self._shards[position]
+
+    def split(self, targets: Dict[Label, str]) -> List[Dict[Label, str]]:
+        """Split targets keyed by label into one dict per shard."""
+        shards: List[Dict[Label, str]] = [{} for _ in range(self.shards)]
+        for label, target in targets.items():
+            shards[self.get_shard(label)][label] = target
+
+        return shards
+
+
+# The SSH clients of a worker process, keyed by their hosts
+_clients: "OrderedDict[Tuple[str, ...], Any]" = OrderedDict()
+_MAX_CLIENTS: int = 32
+
+
+def _get_client(hosts: List[str]) -> Any:
+    key: Tuple[str, ...] = tuple(hosts)
+    if key in _clients:
+        _clients.move_to_end(key)
+    else:
+        _clients[key] = vps.get_client(hosts)
+        if len(_clients) > _MAX_CLIENTS:
+            _clients.popitem(last=False)
+
+    return _clients[key]
+
+
+def _run_command(
+        targets: Dict[Label, str], command: Command, capture: Optional[OutputCapture]
+) -> Dict[Label, Any]:
+    hosts: List[str] = sorted(targets.values())
+    results: Dict[str, Any] = vps.run_command(hosts, command, _get_client(hosts), capture)
+
+    return {label: results.get(ip) for label, ip in targets.items()}
+
+
+def _run_script(
+        targets: Dict[Label, str],
+        path_script: Path,
+        host_args: Optional[Dict[Label, Sequence[str]]],
+        then: Optional[Union[Command, Dict[Label, Command]]],
+        capture: Optional[OutputCapture],
+) -> Dict[Label, Any]:
+    labels: List[Label] = sorted(targets, key=lambda label: targets[label])
+    hosts: List[str] = [targets[label] for label in labels]
+    results: Dict[str, Any] = vps.run_script(
+        hosts,
+        path_script,
+        [host_args.get(label, ()) for label in labels] if host_args is not None else None,
+        then=[then.get(label) for label in labels] if isinstance(then, dict) else then,
+        client=_get_client(hosts),
+        capture=capture,
+    )
+
+    return {label: results.get(ip) for label, ip in targets.items()}
+
+
+def _work(tasks: multiprocessing.Queue, results: multiprocessing.Queue) -> None:
+    """The loop of a worker process, until it gets None."""
+    for task_id, function, targets, args in iter(tasks.get, None):
+        try:
+            results.put((task_id, list(function(targets, *args).items())))
+        except Exception as error:
+            results.put((task_id, [(label, error) for label in targets]))
+
+
+class ShardedExecutor:
+    """Runs functions on shards of the fleet in worker processes.
+
+    Use as a context manager, or call close when done.
+
+    Args:
+        workers: The number of worker processes, the number of cores if not provided
+        replicas: The number of points of every worker on the hash ring
+
+    """
+
+    def __init__(self, workers: Optional[int] = None, replicas: int = 100) -> None:
+        self.ring: HashRing = HashRing(workers or os.cpu_count() or 1, replicas)
+        context = multiprocessing.get_context("spawn")
+        self._results: multiprocessing.Queue = context.Queue()
+        self._tasks: List[multiprocessing.Queue] = [
+            context.Queue() for _ in range(self.ring.shards)
+        ]
+        self._workers: List[Any] = [
+            context.Process(target=_work, args=(tasks, self._results), daemon=True)
+            for tasks in self._tasks
+        ]
+        for worker in self._workers:
+            worker.start()
+
+        self._task_ids: Iterator[int] = itertools.count()
+        self._lock: threading.Lock = threading.Lock()
+        # Results of other calls, read while waiting for a call's own results
+        self._buffers: Dict[int, List[Tuple[Label, Any]]] = {}
+
+    def __enter__(self) -> "ShardedExecutor":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        for tasks in self._tasks:
+            tasks.put(None)
+        for worker in self._workers:
+            worker.join(timeout=10)
+            if worker.is_alive():
+                worker.terminate()
+
+    def map_shards(
+            self,
+            function: Callable[..., Dict[Label, Any]],
+            targets: Dict[Label, str],
+            *args: Any,
+    ) -> Iterator[Tuple[Label, Any]]:
+        """Run a function on every shard of the targets and stream the results.
+
+        Args:
+            function: A module-level function taking the targets of a shard and args,
+            returning a result per label. Exceptions it raises are the result of every label
+            targets: The targets, e.g. IP's, keyed by label
+            args: Further arguments of the function, they have to be picklable
+
+        Returns:
+            An iterator of (label, result), in the order results arrive
+
+        Raises:
+            RuntimeError: If a worker process died
+
+        """
+        with self._lock:
+            task_id: int = next(self._task_ids)
+            self._buffers[task_id] = []
+
+        for tasks, shard_targets in zip(self._tasks, self.ring.split(targets)):
+            if shard_targets:
+                tasks.put((task_id, function, shard_targets, args))
+
+        return self._stream(task_id, len(targets))
+
+    def _stream(self, task_id: int, remaining: int) -> Iterator[Tuple[Label, Any]]:
+        try:
+            while remaining:
+                with self._lock:
+                    if not self._buffers[task_id]:
+                        self._receive()
+                    received: List[Tuple[Label, Any]] = self._buffers[task_id]
+                    self._buffers[task_id] = []
+
+                remaining -= len(received)
+                yield from received
+        finally:
+            with self._lock:
+                self._buffers.pop(task_id)
+
+    def _receive(self) -> None:
+        try:
+            task_id, results = self._results.get(timeout=1.0)
+        except queue.Empty:
+            if not all(worker.is_alive() for worker in self._workers):
+                raise RuntimeError("A worker process died")
+            return
+
+        if task_id in self._buffers:
+            self._buffers[task_id].extend(results)
+
+    def run_command(
+            self,
+            targets: Dict[Label, str],
+            command: Command,
+            capture: Optional[OutputCapture] = None,
+    ) -> Iterator[Tuple[Label, Any]]:
+        """Run a command on many hosts, see vps.run_command.
+
+        Args:
+            targets: The IP's of the hosts keyed by label
+            command: The command to run
+            capture: How output is captured in the workers, see capture.OutputCapture
+
+        Returns:
+            An iterator of (label, vps.ScriptResult), in the order results arrive
+
+        """
+        return self.map_shards(_run_command, targets, command, capture)
+
+    def run_script(
+            self,
+            targets: Dict[Label, str],
+            path_script: Path,
+            host_args: Optional[Dict[Label, Sequence[str]]] = None,
+            then: Optional[Union[Command, Dict[Label, Command]]] = None,
+            capture: Optional[OutputCapture] = None,
+    ) -> Iterator[Tuple[Label, Any]]:
+        """Run a local script on many hosts, see vps.run_script.
+
+        Args:
+            targets: The IP's of the hosts keyed by label
+            path_script: The script to run
+            host_args: The arguments of the script keyed by label
+            then: A command run after the script succeeded, or one keyed by label
+            capture: How output is captured in the workers, see capture.OutputCapture
+
+        Returns:
+            An iterator of (label, vps.ScriptResult), in the order results arrive
+
+        """
+        return self.map_shards(_run_script, targets, path_script, host_args, then, capture)
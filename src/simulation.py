@@ -0,0 +1,333 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Simulate the setup of instances on a virtual clock to plan the capacity of a rollout.
+
+The lifecycle of aio.AsyncInstance (create, is_built, pre_setup, install_mn, is_synced)
+runs unchanged, only the Vultr API, SSH and the sync source are replaced by models with
+configurable latency and failure rate. Sleeping advances the virtual clock instead of
+waiting, so a rollout taking hours is simulated in seconds.
+
+Example:
+    >>> report = simulate(1000, max_concurrency=200)
+    >>> print(report.wall_time_seconds / 3600, report.api_calls)
+
+"""
+
+import asyncio
+import random
+import selectors
+import time
+from collections import Counter, namedtuple
+from pathlib import PosixPath
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src import aio
+from src.coin import Coin
+from src.helpers import Label, gather_limited
+from src.journal import MemoryJournal
+
+SimulationReport = namedtuple(
+    "SimulationReport",
+    [
+        "wall_time_seconds",
+        "real_time_seconds",
+        "api_calls",
+        "peak_concurrency",
+        "peak_ssh_sessions",
+        "succeeded",
+        "failed",
+    ],
+)
+
+
+class DependencyModel:
+    """The latency and failure rate of an external dependency.
+
+    Args:
+        latency_seconds: Returns the latency of one call, given a random number generator
+        failure_rate: The probability of a call failing
+
+    """
+
+    def __init__(
+            self, latency_seconds: Callable[[random.Random], float], failure_rate: float = 0.0
+    ) -> None:
+        self.latency_seconds: Callable[[random.Random], float] = latency_seconds
+        self.failure_rate: float = failure_rate
+
+    @classmethod
+    def uniform(cls, low: float, high: float, failure_rate: float = 0.0) -> "DependencyModel":
+        return cls(lambda rng: rng.uniform(low, high), failure_rate)
+
+    @classmethod
+    def lognormal(cls, median: float, sigma: float, failure_rate: float = 0.0) -> "DependencyModel":
+        return cls(lambda rng: median * rng.lognormvariate(0.0, sigma), failure_rate)
+
+
+# Rough defaults, override them with measurements of the real dependencies
+DEFAULT_MODELS: Dict[str, DependencyModel] = {
+    "vultr_api": DependencyModel.lognormal(0.3, 0.3),
+    "server_build": DependencyModel.lognormal(90.0, 0.3),
+    "ssh": DependencyModel.lognormal(0.5, 0.3),
+    "scp": DependencyModel.lognormal(1.0, 0.3, 0.002),
+    "pre_setup.sh": DependencyModel.lognormal(240.0, 0.3, 0.005),
+    "mn_setup.sh": DependencyModel.lognormal(600.0, 0.3, 0.01),
+    "sync_source": DependencyModel.lognormal(0.5, 0.3),
+    "chain_sync": DependencyModel.lognormal(1800.0, 0.5),
+}
+
+
+class _VirtualSelector:
+    """A selector that advances the virtual clock instead of blocking."""
+
+    def __init__(self, loop: "VirtualClockEventLoop") -> None:
+        self._loop: VirtualClockEventLoop = loop
+        self._selector: selectors.BaseSelector = selectors.DefaultSelector()
+
+    def select(self, timeout: Optional[float] = None) -> List[Tuple[Any, int]]:
+        events: List[Tuple[Any, int]] = self._selector.select(0)
+        if not events and timeout:
+            self._loop.advance(timeout)
+        return events
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._selector, name)
+
+
+class VirtualClockEventLoop(asyncio.SelectorEventLoop):
+    """An event loop on a virtual clock, that jumps to the next scheduled callback when idle."""
+
+    def __init__(self) -> None:
+        self._virtual_time: float = 0.0
+        super().__init__(selector=_VirtualSelector(self))
+
+    def time(self) -> float:
+        return self._virtual_time
+
+    def advance(self, seconds: float) -> None:
+        self._virtual_time += seconds
+
+
+class SimulationError(RuntimeError):
+    """A failure injected by a DependencyModel."""
+
+
+class _Simulation:
+    """The state shared by all simulated dependencies of one simulation."""
+
+    def __init__(self, models: Dict[str, DependencyModel], seed: int) -> None:
+        self.models: Dict[str, DependencyModel] = models
+        self.rng: random.Random = random.Random(seed)
+        self.api_calls: Counter = Counter()
+        self.concurrency: int = 0
+        self.peak_concurrency: int = 0
+        self.ssh_sessions: int = 0
+        self.peak_ssh_sessions: int = 0
+
+    async def call(self, dependency: str) -> None:
+        """Wait for the latency of a call and fail it at the model's failure rate."""
+        self.api_calls[dependency] += 1
+        model: DependencyModel = self.models[dependency]
+
+        await asyncio.sleep(max(model.latency_seconds(self.rng), 0.0))
+        if self.rng.random() < model.failure_rate:
+            raise SimulationError(f"Simulated failure of {dependency}")
+
+    def sample(self, dependency: str) -> float:
+        return max(self.models[dependency].latency_seconds(self.rng), 0.0)
+
+
+class SimulatedVultr(aio.AsyncVultr):
+    """The Vultr API, with servers that are built after a sampled build time."""
+
+    def __init__(self, simulation: _Simulation, requests_per_second: float = 2.0) -> None:
+        super().__init__("simulated", requests_per_second, endpoint="")
+        self._simulation: _Simulation = simulation
+        self._servers: Dict[str, Dict[str, Any]] = {}
+        self._created: int = 0
+
+    def _get_server_info(self, subid: str, now: float) -> Dict[str, Any]:
+        server: Dict[str, Any] = self._servers[subid]
+        return {
+            **server,
+            "status": "active" if now >= server["built_at"] else "pending",
+            "server_state": "ok" if now >= server["built_at"] else "installingbooting",
+        }
+
+    async def request(
+            self, path: str, params: Optional[Dict[str, Any]] = None, method: str = "GET"
+    ) -> Any:
+        await self._wait_for_slot()
+        self.request_count += 1
+        self._simulation.api_calls[f"vultr:{path}"] += 1
+        await self._simulation.call("vultr_api")
+        params = {key: str(value) for key, value in (params or {}).items()}
+        now: float = asyncio.get_running_loop().time()
+
+        if path == "/v1/server/create":
+            self._created += 1
+            subid: str = str(10000000 + self._created)
+            self._servers[subid] = {
+                "SUBID": subid,
+                "label": params.get("label", ""),
+                "tag": params.get("tag", ""),
+                "main_ip": f"10.{self._created // 65536 % 256}."
+                           f"{self._created // 256 % 256}.{self._created % 256}",
+                "built_at": now + self._simulation.sample("server_build"),
+            }
+            return {"SUBID": subid}
+
+        if path == "/v1/server/list":
+            if "SUBID" in params:
+                return self._get_server_info(params["SUBID"], now)
+            return {subid: self._get_server_info(subid, now) for subid in self._servers}
+
+        if path == "/v1/server/destroy":
+            self._servers.pop(params["SUBID"], None)
+
+        return {}
+
+
+class SimulatedInstance(aio.AsyncInstance):
+    """An AsyncInstance whose SSH sessions, scripts and sync source are simulated."""
+
+    def __init__(
+            self,
+            label: Label,
+            coin: Coin,
+            simulation: _Simulation,
+            vultr: SimulatedVultr,
+            setup_journal: MemoryJournal,
+    ) -> None:
+        super().__init__(label, coin, vultr=vultr, setup_journal=setup_journal)
+        self._simulation: _Simulation = simulation
+        self._synced_at: Optional[float] = None
+
+    def get_host_arg(self) -> str:
+        return f"{self.label} {self.ip}:{self.coin.node_port} genkey txhash 0"
+
+    async def _in_executor(self, function: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        # The journal is in memory. In an executor thread, the virtual clock would advance
+        # while waiting for it, by however long the thread takes to be scheduled.
+        return function(*args, **kwargs)
+
+    async def _ssh_session(self, dependency: str, script: Optional[str] = None) -> None:
+        self._simulation.ssh_sessions += 1
+        self._simulation.peak_ssh_sessions = max(
+            self._simulation.peak_ssh_sessions, self._simulation.ssh_sessions
+        )
+        try:
+            await self._simulation.call(dependency)
+            if script is not None:
+                await self._simulation.call(script)
+        finally:
+            self._simulation.ssh_sessions -= 1
+
+    async def command_send(
+            self, commands: List[str], stdin: Optional[bytes] = None
+    ) -> Tuple[int, str, str]:
+        await self._ssh_session("ssh")
+
+        return 0, "", ""
+
+    async def _run_script(self, name: str, *args: str, then: Optional[str] = None) -> None:
+        await self._ssh_session("ssh", name)
+
+        if name == "mn_setup.sh":
+            self._synced_at = (
+                asyncio.get_running_loop().time() + self._simulation.sample("chain_sync")
+            )
+
+    async def send_files(self, path_from: PosixPath, path_to: PosixPath, is_dir: bool = False) -> None:
+        await self._ssh_session("scp")
+
+    async def is_synced(self, delay_return_until_synced: bool = True) -> bool:
+        if delay_return_until_synced:
+            return await super().is_synced(True)
+
+        await self._simulation.call("sync_source")
+        await self._ssh_session("ssh")
+
+        return (
+            self._synced_at is not None
+            and asyncio.get_running_loop().time() >= self._synced_at
+        )
+
+    async def complete_setup(self, delay_return_until_synced: bool = True) -> None:
+        self._simulation.concurrency += 1
+        self._simulation.peak_concurrency = max(
+            self._simulation.peak_concurrency, self._simulation.concurrency
+        )
+        try:
+            await super().complete_setup(delay_return_until_synced)
+        finally:
+            self._simulation.concurrency -= 1
+
+
+def simulate(
+        count: int,
+        coin: Optional[Coin] = None,
+        max_concurrency: int = 100,
+        models: Optional[Dict[str, DependencyModel]] = None,
+        vultr_requests_per_second: float = 2.0,
+        seed: int = 0,
+) -> SimulationReport:
+    """Simulate setting up instances with aio.complete_setups.
+
+    Args:
+        count: Number of instances to set up
+        coin: The coin of the instances, wallet.DEFAULT_COIN if not provided
+        max_concurrency: Maximum number of instances being set up at the same time
+        models: Models replacing the defaults in DEFAULT_MODELS, keyed by dependency
+        vultr_requests_per_second: The rate limit of the Vultr API
+        seed: Seed of the random number generator, the same seed gives the same report
+
+    Returns:
+        The projected wall time, the number of calls per dependency and Vultr API path,
+        the peak number of instances set up and SSH sessions open at the same time,
+        and the number of instances that were set up or failed
+
+    """
+    simulation: _Simulation = _Simulation({**DEFAULT_MODELS, **(models or {})}, seed)
+    setup_journal: MemoryJournal = MemoryJournal()
+    loop: VirtualClockEventLoop = VirtualClockEventLoop()
+    real_start: float = time.perf_counter()
+
+    async def run() -> List[Any]:
+        vultr: SimulatedVultr = SimulatedVultr(simulation, vultr_requests_per_second)
+        instances: List[SimulatedInstance] = [
+            SimulatedInstance(f"SIM{i:06}", coin, simulation, vultr, setup_journal)
+            for i in range(count)
+        ]
+        return await gather_limited(
+            [instance.complete_setup() for instance in instances], max_concurrency
+        )
+
+    try:
+        results: List[Any] = loop.run_until_complete(run())
+        wall_time: float = loop.time()
+    finally:
+        loop.close()
+
+    failed: int = sum(isinstance(result, BaseException) for result in results)
+
+    return SimulationReport(
+        wall_time,
+        time.perf_counter() - real_start,
+        dict(simulation.api_calls),
+        simulation.peak_concurrency,
+        simulation.peak_ssh_sessions,
+        count - failed,
+        failed,
+    )
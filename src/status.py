@@ -0,0 +1,247 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Index the status of masternodes from the network's masternode list."""
+
+import bisect
+import threading
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from src import wallet
+from src.coin import Coin
+from src.helpers import Label
+from src.wallet import ConfEntry, MasternodeListEntry
+
+# Status of masternodes in masternode.conf that are not in the network's masternode list
+MISSING: str = "MISSING"
+
+
+class StatusIndex:
+    """The status of all masternodes, keyed by collateral outpoint, IP and label.
+
+    Every refresh fetches the masternode list with one wallet call and only updates
+    the entries that changed since the last refresh. masternode.conf is only
+    re-read if it was modified.
+
+    Outpoints are formatted as <txhash>-<txindex>.
+
+    """
+
+    def __init__(
+            self,
+            coin: Optional[Coin] = None,
+            fetch: Optional[Callable[[], Dict[str, MasternodeListEntry]]] = None,
+    ) -> None:
+        self.coin: Coin = coin if coin is not None else wallet.DEFAULT_COIN
+        self._fetch: Callable[[], Dict[str, MasternodeListEntry]] = (
+            fetch if fetch is not None else lambda: wallet.get_masternode_list(self.coin)
+        )
+        self._lock: threading.RLock = threading.RLock()
+        self._conf_mtime: Optional[float] = None
+
+        self._entries: Dict[str, MasternodeListEntry] = {}
+        self._status: Dict[str, str] = {}
+        self._by_status: Dict[str, Set[str]] = defaultdict(set)
+        self._by_ip: Dict[str, str] = {}
+        self._by_label: Dict[Label, str] = {}
+        self._label_by_outpoint: Dict[str, Label] = {}
+        self._last_changed: Dict[str, float] = {}
+        # (timestamp, outpoint) in the order of the changes, searched with bisect
+        self._changes: List[Tuple[float, str]] = []
+
+    def refresh(self) -> List[str]:
+        """Fetch the masternode list and update the index.
+
+        Returns:
+            The outpoints whose status changed
+
+        """
+        masternode_list: Dict[str, MasternodeListEntry] = self._fetch()
+        now: float = time.time()
+
+        with self._lock:
+            self._refresh_conf()
+            changed: List[str] = []
+
+            for outpoint, entry in masternode_list.items():
+                if self._entries.get(outpoint) != entry:
+                    old_entry: Optional[MasternodeListEntry] = self._entries.get(outpoint)
+                    if old_entry is not None and old_entry.address is not None:
+                        self._by_ip.pop(_get_ip(old_entry.address), None)
+                    if entry.address is not None:
+                        self._by_ip[_get_ip(entry.address)] = outpoint
+
+                    self._entries[outpoint] = entry
+                    if self._set_status(outpoint, entry.status, now):
+                        changed.append(outpoint)
+
+            for outpoint in [
+                outpoint for outpoint in self._entries if outpoint not in masternode_list
+            ]:
+                entry = self._entries.pop(outpoint)
+                if entry.address is not None:
+                    self._by_ip.pop(_get_ip(entry.address), None)
+                if self._set_status(outpoint, MISSING, now):
+                    changed.append(outpoint)
+
+            for outpoint in self._by_label.values():
+                if outpoint not in self._status and self._set_status(outpoint, MISSING, now):
+                    changed.append(outpoint)
+
+        return changed
+
+    def _refresh_conf(self) -> None:
+        try:
+            mtime: Optional[float] = self.coin.path_mn_conf.stat().st_mtime
+        except FileNotFoundError:
+            mtime = None
+
+        if mtime is not None and mtime == self._conf_mtime:
+            return
+
+        self._conf_mtime = mtime
+        conf_entries: List[ConfEntry] = (
+            wallet.read_mn_conf(self.coin) if mtime is not None else []
+        )
+        self._by_label = {
+            entry.label: f"{entry.txhash}-{entry.txindex}" for entry in conf_entries
+        }
+        self._label_by_outpoint = {
+            outpoint: label for label, outpoint in self._by_label.items()
+        }
+
+        for outpoint in list(self._status):
+            if outpoint not in self._entries and outpoint not in self._label_by_outpoint:
+                self._by_status[self._status.pop(outpoint)].discard(outpoint)
+                self._last_changed.pop(outpoint, None)
+
+    def _set_status(self, outpoint: str, status: str, timestamp: float) -> bool:
+        old_status: Optional[str] = self._status.get(outpoint)
+        if old_status == status:
+            return False
+
+        if old_status is not None:
+            self._by_status[old_status].discard(outpoint)
+        self._by_status[status].add(outpoint)
+        self._status[outpoint] = status
+        self._last_changed[outpoint] = timestamp
+        self._changes.append((timestamp, outpoint))
+
+        # Only keep the last change of every outpoint once older changes dominate
+        if len(self._changes) > 2 * len(self._last_changed) + 1024:
+            self._changes = sorted(
+                (changed, outpoint) for outpoint, changed in self._last_changed.items()
+            )
+
+        return True
+
+    def get_outpoint(self, key: str) -> Optional[str]:
+        """Get the outpoint of a masternode.
+
+        Args:
+            key: The outpoint, IP or label of the masternode
+
+        Returns:
+            The outpoint, None if the masternode is unknown
+
+        """
+        with self._lock:
+            if key in self._status:
+                return key
+            return self._by_label.get(key) or self._by_ip.get(key)
+
+    def get_status(self, key: str) -> Optional[str]:
+        """Get the status of a masternode.
+
+        Args:
+            key: The outpoint, IP or label of the masternode
+
+        Returns:
+            The status, None if the masternode is unknown
+
+        """
+        with self._lock:
+            return self._status.get(self.get_outpoint(key))
+
+    def get_label(self, outpoint: str) -> Optional[Label]:
+        """Get the label of a masternode in masternode.conf, None if it is not in masternode.conf."""
+        with self._lock:
+            return self._label_by_outpoint.get(outpoint)
+
+    def get_all(self) -> Dict[Label, Optional[str]]:
+        """Get the status of every masternode in masternode.conf, None if it was not refreshed yet."""
+        with self._lock:
+            return {
+                label: self._status.get(outpoint) for label, outpoint in self._by_label.items()
+            }
+
+    def with_status(self, status: str, own_only: bool = True) -> List[str]:
+        """Get all masternodes with a status.
+
+        Args:
+            status: The status, e.g. ENABLED
+            own_only: If True, only return masternodes in masternode.conf
+
+        Returns:
+            The labels of the masternodes, or the outpoints if own_only is False
+
+        """
+        with self._lock:
+            if own_only:
+                return [
+                    self._label_by_outpoint[outpoint]
+                    for outpoint in self._by_status.get(status, ())
+                    if outpoint in self._label_by_outpoint
+                ]
+            return list(self._by_status.get(status, ()))
+
+    def enabled(self) -> List[Label]:
+        """Get the labels of all masternodes in masternode.conf with the status ENABLED."""
+        return self.with_status("ENABLED")
+
+    def missing(self) -> List[Label]:
+        """Get the labels of all masternodes in masternode.conf that are not in the masternode list."""
+        return self.with_status(MISSING)
+
+    def changed_since(self, timestamp: float, own_only: bool = True) -> List[str]:
+        """Get all masternodes whose status changed since a point in time.
+
+        Args:
+            timestamp: The point in time, as returned by time.time()
+            own_only: If True, only return masternodes in masternode.conf
+
+        Returns:
+            The labels of the masternodes, or the outpoints if own_only is False
+
+        """
+        with self._lock:
+            start: int = bisect.bisect_left(self._changes, (timestamp, ""))
+            outpoints: Set[str] = {
+                outpoint
+                for _, outpoint in self._changes[start:]
+                if outpoint in self._status
+            }
+
+            if own_only:
+                return [
+                    self._label_by_outpoint[outpoint]
+                    for outpoint in outpoints
+                    if outpoint in self._label_by_outpoint
+                ]
+            return list(outpoints)
+
+
+def _get_ip(address: str) -> str:
+    return address.rsplit(":", 1)[0]
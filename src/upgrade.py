@@ -0,0 +1,269 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Upgrade the wallet binaries of the fleet in health-gated waves.
+
+Only one wave of masternodes is offline at any moment: the next wave starts when
+every node of the current one runs the new binaries and is synced, or was rolled back.
+The previous binaries are kept next to the new ones, so that a node is rolled back
+without downloading anything.
+
+Example:
+    >>> report = asyncio.run(rolling_upgrade(labels, PosixPath("~/new-bin"), wave_size=20))
+    >>> print(report.state, report.failed)
+
+"""
+
+import asyncio
+import shlex
+from collections import namedtuple
+from pathlib import PosixPath
+from typing import Any, Dict, List, Optional
+
+from src import aio, wallet
+from src.aio import AsyncInstance, AsyncVultr
+from src.coin import Coin
+from src.helpers import Label, async_call_until_returns_true, gather_limited
+
+UpgradeReport = namedtuple("UpgradeReport", ["state", "upgraded", "failed", "rolled_back", "pending"])
+
+# States of an UpgradeReport
+COMPLETED: str = "completed"
+PAUSED: str = "paused"
+ROLLED_BACK: str = "rolled_back"
+
+
+def _get_remote_paths(coin: Coin) -> Dict[str, str]:
+    path_bin: PosixPath = coin.path_remote_wallet_bin
+    return {
+        "bin": shlex.quote(str(path_bin)),
+        "new": shlex.quote(f"{path_bin}.new"),
+        "previous": shlex.quote(f"{path_bin}.previous"),
+    }
+
+
+# Time the daemon has to exit after it was told to stop, the commands fail after it
+STOP_TIMEOUT_SECONDS: int = 600
+
+
+def _get_restart_commands(coin: Coin) -> List[str]:
+    return [
+        f"({coin.path_remote_wallet_cli} stop || true)",
+        f"timeout {STOP_TIMEOUT_SECONDS} sh -c"
+        f" {shlex.quote(f'while pgrep -x {coin.daemon_name}d > /dev/null; do sleep 1; done')}",
+    ]
+
+
+async def upgrade_instance(instance: AsyncInstance, path_new_bin: PosixPath) -> None:
+    """Replace the wallet binaries of an instance and restart its wallet.
+
+    The previous binaries are moved to <path_remote_wallet_bin>.previous.
+
+    Args:
+        instance: The instance to upgrade, its IP has to be set
+        path_new_bin: Local directory of the new binaries
+
+    """
+    coin: Coin = instance.coin
+    paths: Dict[str, str] = _get_remote_paths(coin)
+
+    # Removing the previous binaries first makes sure a rollback never restores older ones
+    exit_code, _, stderr = await instance.command_send([f"rm -rf {paths['new']} {paths['previous']}"])
+    if exit_code != 0:
+        raise RuntimeError(f"Preparing the upgrade of {instance.label} failed: {stderr.strip()}")
+    await instance.send_files(
+        path_new_bin.expanduser(), PosixPath(f"{coin.path_remote_wallet_bin}.new"), is_dir=True
+    )
+
+    exit_code, _, stderr = await instance.command_send(
+        [
+            *_get_restart_commands(coin),
+            f"mv {paths['bin']} {paths['previous']}",
+            f"mv {paths['new']} {paths['bin']}",
+            f"{coin.path_remote_daemon} -daemon",
+        ]
+    )
+    if exit_code != 0:
+        raise RuntimeError(f"Upgrading {instance.label} failed: {stderr.strip()}")
+
+
+async def roll_back_instance(instance: AsyncInstance) -> None:
+    """Restore the binaries an instance had before its last upgrade and restart its wallet.
+
+    If the upgrade failed before the binaries were replaced, the wallet is only restarted.
+
+    Args:
+        instance: The instance to roll back, its IP has to be set
+
+    """
+    coin: Coin = instance.coin
+    paths: Dict[str, str] = _get_remote_paths(coin)
+
+    exit_code, _, stderr = await instance.command_send(
+        [
+            *_get_restart_commands(coin),
+            f"if [ -d {paths['previous']} ]; then rm -rf {paths['bin']} && mv {paths['previous']} {paths['bin']}; fi",
+            f"{coin.path_remote_daemon} -daemon",
+        ]
+    )
+    if exit_code != 0:
+        raise RuntimeError(f"Rolling back {instance.label} failed: {stderr.strip()}")
+
+
+async def is_healthy(instance: AsyncInstance) -> bool:
+    """Check if the wallet of an instance is running and synced."""
+    exit_code, _, _ = await instance.command_send(
+        [f"{instance.coin.path_remote_wallet_cli} getblockcount"]
+    )
+
+    return exit_code == 0 and await instance.is_synced(False)
+
+
+async def _upgrade_and_wait(
+        instance: AsyncInstance,
+        path_new_bin: PosixPath,
+        health_timeout_seconds: float,
+        health_interval_seconds: float,
+) -> None:
+    async def upgrade_and_wait() -> None:
+        await upgrade_instance(instance, path_new_bin)
+        await async_call_until_returns_true(
+            is_healthy, [instance], call_interval_seconds=health_interval_seconds
+        )
+
+    # A node hanging at any step fails, instead of stalling its wave
+    await asyncio.wait_for(upgrade_and_wait(), health_timeout_seconds)
+
+
+async def rolling_upgrade(
+        labels: List[Label],
+        path_new_bin: PosixPath,
+        coin: Optional[Coin] = None,
+        wave_size: int = 10,
+        max_failure_rate: float = 0.1,
+        rollback: bool = False,
+        health_timeout_seconds: float = 1800.0,
+        health_interval_seconds: float = 10.0,
+        vultr: Optional[AsyncVultr] = None,
+) -> UpgradeReport:
+    """Upgrade the wallet binaries of instances in waves.
+
+    A node that fails to upgrade, or is not upgraded, running and synced within
+    health_timeout_seconds, is rolled back right away. If the share of failed nodes of all nodes attempted so far
+    exceeds max_failure_rate after a wave, no further wave is started.
+
+    Args:
+        labels: Labels of the instances to upgrade, in the order of upgrading,
+        their IPs are taken from masternode.conf
+        path_new_bin: Local directory of the new binaries
+        coin: The coin of the instances, wallet.DEFAULT_COIN if not provided
+        wave_size: Number of nodes upgraded at the same time
+        max_failure_rate: Share of failed nodes that stops the upgrade
+        rollback: If True, roll back the upgraded nodes when the upgrade is stopped,
+        leave them upgraded (pause) otherwise
+        health_timeout_seconds: Time a node has to be upgraded, running and synced
+        health_interval_seconds: Interval of checking the health of upgraded nodes
+        vultr: The Vultr client to use, a new one if not provided
+
+    Returns:
+        The state of the upgrade (COMPLETED, PAUSED or ROLLED_BACK), the labels of upgraded,
+        failed and rolled back nodes and the labels that were not attempted, to resume a paused upgrade
+
+    Raises:
+        ValueError: If a label has no IP in masternode.conf, or the coin's masternodes are
+        colocated, before any node is upgraded
+
+    """
+    coin = coin if coin is not None else wallet.DEFAULT_COIN
+    # Colocated masternodes run as systemd units with their own data directories, see colocation
+    if coin.nodes_per_host > 1:
+        raise ValueError(f"Masternodes of {coin.name} are colocated, which rolling_upgrade does not support")
+    ips: Dict[Label, str] = {
+        entry.label: entry.address.rsplit(":", 1)[0]
+        for entry in wallet.read_mn_conf(coin)
+        if entry.address is not None and not entry.address.startswith("<ip>")
+    }
+    missing: List[Label] = [label for label in labels if label not in ips]
+    if missing:
+        raise ValueError(f"No IP in masternode.conf for {', '.join(missing)}")
+
+    own_vultr: bool = vultr is None
+    vultr = vultr if vultr is not None else aio.AsyncVultr()
+
+    upgraded: List[AsyncInstance] = []
+    failed: List[Label] = []
+    rolled_back: List[Label] = []
+
+    try:
+        for wave_start in range(0, len(labels), wave_size):
+            wave: List[AsyncInstance] = []
+            for label in labels[wave_start:wave_start + wave_size]:
+                instance: AsyncInstance = AsyncInstance(label, coin, vultr=vultr)
+                instance.ip = ips[label]
+                wave.append(instance)
+
+            results: List[Any] = await gather_limited(
+                [
+                    _upgrade_and_wait(
+                        instance, path_new_bin, health_timeout_seconds, health_interval_seconds
+                    )
+                    for instance in wave
+                ],
+                wave_size,
+            )
+            wave_failed: List[AsyncInstance] = [
+                instance for instance, result in zip(wave, results) if isinstance(result, BaseException)
+            ]
+            upgraded.extend(instance for instance in wave if instance not in wave_failed)
+            failed.extend(instance.label for instance in wave_failed)
+
+            for instance, result in zip(
+                    wave_failed,
+                    await gather_limited([roll_back_instance(instance) for instance in wave_failed], wave_size),
+            ):
+                if not isinstance(result, BaseException):
+                    rolled_back.append(instance.label)
+
+            if len(failed) / (len(upgraded) + len(failed)) <= max_failure_rate:
+                continue
+
+            pending: List[Label] = labels[wave_start + wave_size:]
+            if not rollback:
+                return UpgradeReport(
+                    PAUSED, [instance.label for instance in upgraded], failed, rolled_back, pending
+                )
+
+            results = await gather_limited(
+                [roll_back_instance(instance) for instance in upgraded], wave_size
+            )
+            rolled_back.extend(
+                instance.label
+                for instance, result in zip(upgraded, results)
+                if not isinstance(result, BaseException)
+            )
+            return UpgradeReport(
+                ROLLED_BACK,
+                [
+                    instance.label
+                    for instance, result in zip(upgraded, results)
+                    if isinstance(result, BaseException)
+                ],
+                failed,
+                rolled_back,
+                pending,
+            )
+
+        return UpgradeReport(COMPLETED, [instance.label for instance in upgraded], failed, rolled_back, [])
+    finally:
+        if own_vultr:
+            await vultr.close()
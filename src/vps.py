@@ -13,16 +13,23 @@
 
 """Interact with the Vultr API or send commands to servers."""
 
+import asyncio
 import contextlib
+import functools
+import hashlib
 import json
+import shlex
+from collections import namedtuple
 from pathlib import PosixPath
-from typing import Dict, List, Union, Generator, Any, Optional
+from typing import Dict, List, Union, Generator, Any, Iterable, Optional, Sequence
 
 import gevent
 import requests
 from pssh.clients import ParallelSSHClient
 
-from src import pymasternode, wallet
+from src import journal, pymasternode, wallet
+from src.capture import CapturedOutput, OutputCapture
+from src.coin import Coin
 from src.helpers import (
     Command,
     Hostname,
@@ -38,22 +45,272 @@ privkey: PosixPath = PosixPath(
     pymasternode.CONFIG["vps"]["ssh_privkey_path"]
 ).expanduser()
 
-client: ParallelSSHClient = ParallelSSHClient(
-    user="root",
-    pkey=str(privkey),
-    timeout=60,
-    tunnel_timeout=60,
-    num_retries=2,
-    retry_delay=10,
+
+def get_client(hosts: List[str]) -> ParallelSSHClient:
+    """Create an SSH client for a list of hosts.
+
+    Every call returns a new client, so that clients are never shared between threads.
+
+    Args:
+        hosts: IP's of the hosts to connect to
+
+    Returns:
+        A client connecting to all hosts in parallel
+
+    """
+    return ParallelSSHClient(
+        hosts,
+        user="root",
+        pkey=str(privkey),
+        timeout=60,
+        num_retries=2,
+        retry_delay=10,
+        pool_size=max(len(hosts), 1),
+    )
+
+
+# output_id is the id of the output in the index of an OutputCapture that spills, None otherwise
+ScriptResult = namedtuple(
+    "ScriptResult", ["exit_code", "stdout", "stderr", "output_id"], defaults=[None]
+)
+
+
+def isolate_stdin(script: str) -> str:
+    """Wrap a shell script streamed to the shell's stdin into a group reading /dev/null.
+
+    The shell reads a streamed script while running it, so a command reading stdin would
+    consume the rest of the script. The group is read completely before it is run, and
+    its commands read /dev/null instead.
+    """
+    return f"{{\n{script.rstrip()}\n}} </dev/null\n"
+
+
+def get_script_command(path_script: Path, interpreter: str = "bash") -> Command:
+    """Get a command that feeds a local script to a remote interpreter's stdin.
+
+    The script is sent inline as a here-document, so it is run without uploading it first.
+    Scripts of bash read /dev/null as their stdin, see isolate_stdin.
+    The command contains two %s, for the script's arguments and for a command run
+    after the script succeeded, see run_script.
+
+    Args:
+        path_script: The script to run
+        interpreter: The interpreter reading the script from stdin
+
+    Returns:
+        The command, with every other % escaped
+
+    """
+    script: str = path_script.read_text()
+    if interpreter == "bash":
+        script = isolate_stdin(script)
+    script = script.replace("%", "%%")
+    delimiter: str = "PYMASTERNODE_EOF_" + hashlib.sha256(script.encode()).hexdigest()[:16]
+
+    return f"{interpreter} -s -- %s <<'{delimiter}' %s\n{script.rstrip()}\n{delimiter}"
+
+
+def run_script(
+        hosts: List[str],
+        path_script: Path,
+        host_args: Optional[List[Sequence[str]]] = None,
+        interpreter: str = "bash",
+        then: Optional[Union[Command, List[Command]]] = None,
+        client: Optional[ParallelSSHClient] = None,
+        capture: Optional[OutputCapture] = None,
+) -> Dict[str, ScriptResult]:
+    """Run a local script on many hosts in parallel, with one SSH session per host.
+
+    Args:
+        hosts: IP's of the hosts to run the script on
+        path_script: The script to run
+        host_args: The arguments of the script for each host, in the order of hosts
+        interpreter: The interpreter reading the script from stdin
+        then: A command run after the script, only if it succeeded,
+        or one command for each host, in the order of hosts
+        client: A client connected to exactly the hosts, a new one if not provided
+        capture: How output is captured, all lines are kept in memory if not provided.
+        The script is indexed as <interpreter> <script name> <arguments>
+
+    Returns:
+        The exit code and the lines of stdout and stderr of every host, keyed by IP.
+        The exit code is None if the host could not be reached
+
+    """
+    host_args = host_args if host_args is not None else [()] * len(hosts)
+    host_then: List[Optional[Command]] = then if isinstance(then, list) else [then] * len(hosts)
+
+    quoted_args: List[str] = [" ".join(shlex.quote(str(arg)) for arg in args) for args in host_args]
+
+    client = client if client is not None else get_client(hosts)
+    output: List[Any] = client.run_command(
+        get_script_command(path_script, interpreter),
+        stop_on_errors=False,
+        host_args=[
+            (args, f"&& {command}" if command is not None else "")
+            for args, command in zip(quoted_args, host_then)
+        ],
+    )
+
+    return _get_results(
+        client,
+        output,
+        capture,
+        {
+            host: f"{interpreter} {path_script.name} {args}".strip()
+            for host, args in zip(hosts, quoted_args)
+        },
+    )
+
+
+def run_command(
+        hosts: List[str],
+        command: Command,
+        client: Optional[ParallelSSHClient] = None,
+        capture: Optional[OutputCapture] = None,
+) -> Dict[str, ScriptResult]:
+    """Run a command on many hosts in parallel.
+
+    Args:
+        hosts: IP's of the hosts to run the command on
+        command: The command to run
+        client: A client connected to exactly the hosts, a new one if not provided
+        capture: How output is captured, all lines are kept in memory if not provided
+
+    Returns:
+        The exit code and the lines of stdout and stderr of every host, keyed by IP.
+        The exit code is None if the host could not be reached
+
+    """
+    client = client if client is not None else get_client(hosts)
+
+    return _get_results(
+        client,
+        client.run_command(command, stop_on_errors=False),
+        capture,
+        {host: command for host in hosts},
+    )
+
+
+def _get_results(
+        client: ParallelSSHClient,
+        output: List[Any],
+        capture: Optional[OutputCapture],
+        commands: Dict[str, Command],
+) -> Dict[str, ScriptResult]:
+    # Output is consumed before joining, so that hosts never block on full channels
+    captured: Dict[str, CapturedOutput] = {}
+    for host_output in output:
+        if capture is not None:
+            captured[host_output.host] = capture.capture(
+                host_output.host,
+                commands.get(host_output.host, ""),
+                host_output.stdout,
+                host_output.stderr,
+            )
+        else:
+            captured[host_output.host] = CapturedOutput(
+                list(host_output.stdout or []), list(host_output.stderr or []), None
+            )
+    client.join(output)
+
+    return {
+        host_output.host: ScriptResult(
+            host_output.exit_code,
+            captured[host_output.host].stdout,
+            captured[host_output.host].stderr
+            + ([repr(host_output.exception)] if host_output.exception else []),
+            captured[host_output.host].output_id,
+        )
+        for host_output in output
+    }
+
+
+# Every completed setup step leaves a file named after the step, containing its checksum
+PATH_REMOTE_MARKERS: PosixPath = PosixPath("/root/.pymasternode/markers")
+
+
+def get_step_checksum(path_script: Path, *inputs: str) -> str:
+    """Get the checksum identifying a setup step's script and inputs.
+
+    Args:
+        path_script: The script run by the step
+        inputs: The arguments the script is run with
+
+    Returns:
+        The hex encoded sha256 of the script and inputs
+
+    """
+    digest = hashlib.sha256(path_script.read_bytes())
+    for step_input in inputs:
+        digest.update(b"\0" + str(step_input).encode())
+
+    return digest.hexdigest()
+
+
+def get_marker_command(step: str, checksum: str) -> Command:
+    """Get the command recording a completed setup step on a remote host."""
+    return f"mkdir -p {PATH_REMOTE_MARKERS} && echo {checksum} > {PATH_REMOTE_MARKERS / step}"
+
+
+# Prints "<step> <checksum>" for every marker on a host
+MARKERS_COMMAND: Command = (
+    f'for marker in {PATH_REMOTE_MARKERS}/*; do [ -f "$marker" ]'
+    f' && echo "$(basename "$marker") $(cat "$marker")"; done; true'
 )
 
 
+def parse_markers(lines: Iterable[str]) -> Dict[str, str]:
+    """Parse the output of MARKERS_COMMAND into the checksums of completed steps, keyed by step."""
+    return dict(line.split(maxsplit=1) for line in lines if len(line.split()) == 2)
+
+
+def gather_markers(instances: List["Instance"]) -> Dict[str, Dict[str, str]]:
+    """Get the completed setup steps of many instances with one parallel command.
+
+    The markers of every instance are also stored in its markers attribute,
+    so following setup steps skip completed work without asking the host again.
+
+    Args:
+        instances: The instances to ask
+
+    Returns:
+        The checksums of the completed setup steps, keyed by IP and step
+
+    """
+    output: List[Any] = get_client([str(instance.ip) for instance in instances]).run_command(
+        command=MARKERS_COMMAND,
+        stop_on_errors=False,
+    )
+    markers: Dict[str, Dict[str, str]] = {}
+
+    for host_output in output:
+        markers[host_output.host] = parse_markers(host_output.stdout or [])
+
+    for instance in instances:
+        instance.markers = markers.get(str(instance.ip), {})
+
+    return markers
+
+
+# The stages complete_setup runs once the server is created, with the method running each.
+# The last stage, synced, is recorded once is_synced returns True.
+SETUP_STEPS: Dict[str, str] = {
+    "built": "wait_until_built",
+    "pre_setup": "pre_setup",
+    "installed": "install_mn",
+}
+
+
 class Instance:
-    def __init__(self, label: Label) -> None:
+    def __init__(self, label: Label, coin: Optional[Coin] = None) -> None:
         self._ip: Ip = None
         self._subid: Subid = None
         self._label: Label = label
         self._hostname: Hostname = Hostname(label)
+        self._coin: Coin = coin if coin is not None else wallet.DEFAULT_COIN
+        self._markers: Optional[Dict[str, str]] = None
+        self.journal: Any = journal
 
     @property
     def ip(self) -> Ip:
@@ -71,6 +328,10 @@ class Instance:
     def hostname(self) -> str:
         return self._hostname
 
+    @property
+    def coin(self) -> Coin:
+        return self._coin
+
     @ip.setter
     def ip(self, new_value: str) -> None:
         self._ip = Ip(new_value)
@@ -87,11 +348,15 @@ class Instance:
     def hostname(self, new_value: str) -> None:
         self._hostname = Hostname(new_value)
 
+    def record_stage(self, stage: str, subid: Optional[str] = None, ip: Optional[str] = None) -> None:
+        """Record in the journal that the instance completed a stage, along with its coin."""
+        self.journal.record_stage(self.label, stage, subid=subid, ip=ip, coin_name=self.coin.name)
+
     def get_host_arg(self) -> Optional[str]:  #
         """Returns the config-line belonging to the specified label."""
-        with open(wallet.MODULE_SETTINGS["PATH_MN_CONF"], "r") as conf:
+        with open(self.coin.path_mn_conf, "r") as conf:
             for line in conf:
-                if line.startswith(self.label):
+                if line.split(maxsplit=1)[:1] == [self.label]:
                     return line.strip()
 
     # TODO: Adjust all docstrings
@@ -105,7 +370,33 @@ class Instance:
             True if all servers are active, False otherwise
 
         """
-        return pymasternode.VULTR.server.list(self.subid)
+        server_info: Dict[str, str] = pymasternode.VULTR.server.list(self.subid)
+
+        if server_info["status"] == "active" and server_info["server_state"] == "ok":
+            self.ip = server_info["main_ip"]
+            return True
+
+        return False
+
+    def adopt_existing(self) -> bool:
+        """Look up a server with this instance's label and adopt its subid and IP.
+
+        Used when resuming a setup that was interrupted while the server was being created,
+        so that the server is not created a second time.
+
+        Returns:
+            True if a server was found, False otherwise
+
+        """
+        servers: Dict[str, Dict[str, str]] = pymasternode.VULTR.server.list()
+
+        for server_info in servers.values():
+            if server_info["label"] == self.label:
+                self.subid = server_info["SUBID"]
+                self.record_stage("created", subid=self.subid)
+                return True
+
+        return False
 
     def create(
             self,
@@ -124,6 +415,7 @@ class Instance:
         """
         vps_settings: Union[str, int] = pymasternode.CONFIG["vps"]
 
+        self.record_stage("create_requested")
         created_server = Subid(
             pymasternode.VULTR.server.create(
                 vps_settings["location_id"],
@@ -134,16 +426,19 @@ class Instance:
                     "SCRIPTID": vps_settings["script_id"],
                     "hostname": self.hostname,
                     "label": self.label,
+                    "tag": self.coin.name,
                 },
             )["SUBID"]
         )
+        self._subid = created_server
+        self.record_stage("created", subid=created_server)
 
         if delay_return_until_built:
             call_until_returns_true(
-                function_name=self.is_built(),
-                function_parameters=created_server,
+                function_name=self.is_built,
                 call_interval_seconds=5.0,
             )
+            self.record_stage("built", subid=self.subid, ip=self.ip)
 
         return created_server
 
@@ -172,22 +467,22 @@ class Instance:
     def reinstall(self) -> None:
         pymasternode.VULTR.server.reinstall(self.subid)
 
-    def command_print_outputs(self, output: Dict) -> None:
+    def command_print_outputs(self, output: List[Any]) -> None:
         """Print the output of sent commands.
 
         Args:
-            output: Output object to print
+            output: The HostOutput list returned by command_send
 
         """
-        for host, host_output in output.items():
-            for line in host_output.stdout:
-                print(f"Host [{host}] - {line}")
-            for line in host_output.stderr:
-                print(f"Host [{host}] - {line}")
+        for host_output in output:
+            for line in host_output.stdout or []:
+                print(f"Host [{host_output.host}] - {line}")
+            for line in host_output.stderr or []:
+                print(f"Host [{host_output.host}] - {line}")
 
     def command_send(
             self, commands: List[Command], host_args: List[Command] = None
-    ) -> object:
+    ) -> List[Any]:
         """Send list of commands to list of hosts.
 
         Args:
@@ -195,11 +490,10 @@ class Instance:
             host_args: host specific commands
 
         Returns:
-            object: A host output object
+            The HostOutput of the instance's host, in a list
 
         """
-        client.hosts = self.ip
-        client.pool_size = len(self.ip)
+        client: ParallelSSHClient = get_client([str(self.ip)])
 
         return client.run_command(
             command=" && ".join(commands), stop_on_errors=False, host_args=host_args
@@ -214,96 +508,284 @@ class Instance:
             is_dir: Is file a directory?
 
         """
-        client.hosts = self.ip
-        client.pool_size = len(self.ip)
+        client: ParallelSSHClient = get_client([str(self.ip)])
 
         greenlets: object = client.scp_send(str(path_from), str(path_to), is_dir)
         gevent.joinall(greenlets, raise_error=True)
 
+    def _run_step(
+            self, step: str, path_script: Path, checksum: str, args: Sequence[str] = ()
+    ) -> None:
+        result: ScriptResult = run_script(
+            [str(self.ip)], path_script, [args], then=get_marker_command(step, checksum)
+        )[str(self.ip)]
+
+        if result.exit_code != 0:
+            raise RuntimeError(f"{path_script.name} failed on {self.ip}: {result.stderr[-5:]}")
+
+    @property
+    def markers(self) -> Dict[str, str]:
+        """The checksums of the setup steps completed on the instance, keyed by step.
+
+        Fetched from the instance on first access, unless set by gather_markers.
+
+        """
+        if self._markers is None:
+            self._markers = gather_markers([self]).get(str(self.ip), {})
+
+        return self._markers
+
+    @markers.setter
+    def markers(self, new_value: Dict[str, str]) -> None:
+        self._markers = new_value
+
+    def is_step_done(self, step: str, checksum: str) -> bool:
+        """Check if a setup step was completed with the same script and inputs."""
+        return self.markers.get(step) == checksum
+
     # TODO: Allow specifying script to run per argument
-    def pre_setup(self) -> None:
-        """Download and execute pre-setup script on remote host.
+    def pre_setup(self, force: bool = False) -> bool:
+        """Run the pre-setup script on the remote host, streamed over one SSH session.
 
         The script is expected to be pymasternode/data/pre_setup.sh
+        It is skipped if it already completed on the host with the same script.
 
         Args:
-            hosts: List of IP's of servers to send commands to
+            force: Run the script even if it already completed
+
+        Returns:
+            True if the script was run, False if it was skipped
 
         """
-        self.send_files(
-            path_from=Path(__file__).parents[2] / "data" / "pre_setup.sh",
-            path_to=Path("/root/pre_setup.sh"),
-        )
-        self.command_send(self.ip, ["chmod +x pre_setup.sh", "./pre_setup.sh"])
+        path_script: Path = pymasternode.PATH_PROJECT_ROOT / "data" / "pre_setup.sh"
+        checksum: str = get_step_checksum(path_script)
+
+        if not force and self.is_step_done("pre_setup", checksum):
+            return False
+
+        self._run_step("pre_setup", path_script, checksum)
+        self.markers["pre_setup"] = checksum
+
+        return True
 
     # TODO: Allow specifying script to run per argument
-    def install_mn(self) -> None:
-        """Download and execute MN install script on remote host.
+    def install_mn(self, force: bool = False) -> bool:
+        """Run the MN install script on the remote host with its config line as arguments.
 
         The script is expected to be pymasternode/data/mn_setup.sh
+        It is skipped if it already completed on the host with the same script and config line.
 
         Args:
-            hosts: List of IP's of servers to send commands to
+            force: Run the script even if it already completed
+
+        Returns:
+            True if the script was run, False if it was skipped
 
         """
-        self.send_files(
-            self.ip,
-            Path(__file__).parents[1] / "data" / "mn_setup.sh",
-            Path("/root/pre_setup.sh"),
-        )
-        host_arg = wallet.get_host_arg(self.label)
-        self.command_send(["chmod +x mn_setup.sh", "./mn_setup.sh"], [host_arg])
+        host_arg: str = self.get_host_arg()
+        path_script: Path = pymasternode.PATH_PROJECT_ROOT / "data" / "mn_setup.sh"
+        checksum: str = get_step_checksum(path_script, host_arg)
+
+        if not force and self.is_step_done("install_mn", checksum):
+            return False
+
+        self._run_step("install_mn", path_script, checksum, host_arg.split())
+        self.markers["install_mn"] = checksum
+
+        return True
 
-    # FIX: Specific to Globaltoken
     def is_synced(self, delay_return_until_synced: bool = True) -> bool:
-        """Check if remote wallets are synced (+- 100 blocks).
+        """Check if the remote wallet is synced (+- 100 blocks).
 
-        The remote block height will be specified as the minimum block height of all remote wallets.
+        The global block height is taken from the sync source of the instance's coin.
 
         Args:
-            delay_return_until_synced: if True, the function will not return unitl all instances are synced
+            delay_return_until_synced: if True, the function will not return until the instance is synced
 
         Returns:
             bool: True if synced, False otherwise
 
         """
-        json_data = json.loads(
-            requests.get(
-                "https://explorer.globaltoken.org/api/status?q=getTxOutSetInfo"
-            ).text
+        if delay_return_until_synced:
+            call_until_returns_true(
+                function_name=self.is_synced,
+                function_parameters=[False],
+                call_interval_seconds=10.0,
+            )
+            return True
+
+        json_data = json.loads(requests.get(self.coin.sync_source_url).text)
+        block_height_global: int = functools.reduce(
+            lambda data, key: data[key], self.coin.sync_source_height_keys, json_data
         )
-        block_height_global: int = json_data["txoutsetinfo"]["height"]
 
-        remote_block_heights: object = self.command_send(
+        remote_block_heights: List[Any] = self.command_send(
             commands=[
-                r"/root/globaltoken/bin/globaltoken-cli -getinfo | grep -Po '\"blocks\": *\K[0-9]*'"
+                rf"{self.coin.path_remote_wallet_cli} -getinfo | grep -Po '\"blocks\": *\K[0-9]*'"
             ],
         )
-        min_remote_block_height = int(next(remote_block_heights[self.ip].stdout))
+        remote_block_height = int(next(remote_block_heights[0].stdout))
 
-        if delay_return_until_synced:
-            call_until_returns_true(
-                function_name=self.is_synced,
-                function_parameters=self.ip,
-                call_interval_seconds=10.0,
+        return (remote_block_height + 100) >= block_height_global
+
+    def complete_setup(self, delay_return_until_synced: bool = True) -> None:
+        """Run all setup stages, skipping the ones the journal marks as completed.
+
+        Every completed stage is recorded in the journal, so that an interrupted setup
+        can be resumed by calling this method again, see resume_setup.
+
+        Args:
+            delay_return_until_synced: if True, do not return until the wallet is synced
+
+        """
+        if self.restore_server_info() == "create_requested" and self.subid is None:
+            self.adopt_existing()
+
+        if self.subid is None:
+            self.create(delay_return_until_built=False)
+
+        for stage in self.get_pending_stages():
+            getattr(self, SETUP_STEPS[stage])()
+            self.record_stage(stage, subid=self.subid, ip=self.ip)
+
+        if self.is_synced(delay_return_until_synced):
+            self.record_stage("synced")
+
+    def restore_server_info(self) -> Optional[str]:
+        """Set the subid and IP journaled for the instance.
+
+        Returns:
+            The last stage the instance completed, None if it is not journaled
+
+        """
+        subid, ip = self.journal.get_server_info(self.label)
+        if subid is not None:
+            self.subid = subid
+        if ip is not None:
+            self.ip = ip
+
+        return self.journal.get_last_stage(self.label)
+
+    def get_pending_stages(self) -> List[str]:
+        """Get the stages of SETUP_STEPS the journal does not mark as completed, in order."""
+        return [
+            stage for stage in SETUP_STEPS if not self.journal.is_completed(self.label, stage)
+        ]
+
+    def wait_until_built(self) -> None:
+        call_until_returns_true(self.is_built, call_interval_seconds=5.0)
+
+
+def apply_setup(instances: List[Instance], force: bool = False) -> Dict[str, ScriptResult]:
+    """Apply pre_setup and install_mn to many instances, skipping steps that already completed.
+
+    The completed steps of all instances are gathered with one parallel command first,
+    so re-applying the setup to configured instances does not run anything on them.
+    Each step runs on all instances that need it in parallel, install_mn only on the
+    instances whose pre_setup succeeded.
+
+    Args:
+        instances: The instances to set up, their IP's have to be set
+        force: Run all steps even if they already completed
+
+    Returns:
+        The result of the last step run on each instance, keyed by IP
+
+    """
+    if not force:
+        gather_markers(instances)
+
+    path_pre_setup: Path = pymasternode.PATH_PROJECT_ROOT / "data" / "pre_setup.sh"
+    path_mn_setup: Path = pymasternode.PATH_PROJECT_ROOT / "data" / "mn_setup.sh"
+    pre_setup_checksum: str = get_step_checksum(path_pre_setup)
+    results: Dict[str, ScriptResult] = {}
+
+    pending: List[Instance] = [
+        instance
+        for instance in instances
+        if force or not instance.is_step_done("pre_setup", pre_setup_checksum)
+    ]
+    if pending:
+        results.update(
+            run_script(
+                [str(instance.ip) for instance in pending],
+                path_pre_setup,
+                then=get_marker_command("pre_setup", pre_setup_checksum),
             )
-            return True
+        )
+    for instance in pending:
+        if results[str(instance.ip)].exit_code == 0:
+            instance.markers["pre_setup"] = pre_setup_checksum
+
+    host_args: Dict[str, str] = {}
+    checksums: Dict[str, str] = {}
+    for instance in instances:
+        if str(instance.ip) in results and results[str(instance.ip)].exit_code != 0:
+            continue
+        host_args[str(instance.ip)] = instance.get_host_arg()
+        checksums[str(instance.ip)] = get_step_checksum(path_mn_setup, host_args[str(instance.ip)])
+
+    pending = [
+        instance
+        for instance in instances
+        if str(instance.ip) in checksums
+        and (force or not instance.is_step_done("install_mn", checksums[str(instance.ip)]))
+    ]
+    if pending:
+        results.update(
+            run_script(
+                [str(instance.ip) for instance in pending],
+                path_mn_setup,
+                [host_args[str(instance.ip)].split() for instance in pending],
+                then=[
+                    get_marker_command("install_mn", checksums[str(instance.ip)])
+                    for instance in pending
+                ],
+            )
+        )
+    for instance in pending:
+        if results[str(instance.ip)].exit_code == 0:
+            instance.markers["install_mn"] = checksums[str(instance.ip)]
 
-        return (min_remote_block_height + 100) >= block_height_global
+    return results
 
-    def complete_setup(
-            self, label: Label = label, delay_return_until_synced: bool = True
-    ) -> None:
-        if self.ip is None:
-            self.create(label)
 
-        call_until_returns_true(self.is_built())
-        self.pre_setup()
-        self.install_mn()
-        self.is_synced(delay_return_until_synced)
+def resume_setup(
+        labels: Optional[List[Label]] = None,
+        delay_return_until_synced: bool = True,
+        coin: Optional[Coin] = None,
+        max_concurrency: int = 100,
+) -> List[Any]:
+    """Resume interrupted setups concurrently, at the last stage each instance completed.
+
+    The setups are run by aio.complete_setups.
+
+    Args:
+        labels: Labels of instances to resume, if not provided: all unfinished instances of the coin in the journal
+        delay_return_until_synced: if True, do not return until the wallets are synced
+        coin: The coin of the instances, wallet.DEFAULT_COIN if not provided
+        max_concurrency: Maximum number of instances being set up at the same time
+
+    Returns:
+        None for every instance set up successfully, the raised exception otherwise
+
+    """
+    # Imported here, as aio builds on this module
+    from src import aio
+
+    coin = coin if coin is not None else wallet.DEFAULT_COIN
+
+    return asyncio.run(
+        aio.complete_setups(
+            labels or journal.get_unfinished(coin.name),
+            coin,
+            max_concurrency,
+            delay_return_until_synced,
+        )
+    )
 
 
 @contextlib.contextmanager
-def setup_mn(label: Label) -> Generator[Instance, Any, None]:
-    instance: Instance = Instance(label)
+def setup_mn(label: Label, coin: Optional[Coin] = None) -> Generator[Instance, Any, None]:
+    instance: Instance = Instance(label, coin)
     yield instance
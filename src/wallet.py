@@ -13,16 +13,24 @@
 # along with Foobar.  If not, see <https://www.gnu.org/licenses/>.
 """Interact with the wallet."""
 
+import functools
 import getpass
 import json
 import re
 import subprocess
-from pathlib import PosixPath
-from typing import Dict, List, Match, Optional, Union
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from subprocess import CompletedProcess
+from typing import Any, Dict, Iterable, List, Match, Optional, Tuple, Union
 
-from src import pymasternode, helpers
-from src.helpers import Genkey, Label, Path, ReceivingAddress
+import requests
 
+from src import hd, helpers, keys, pymasternode
+from src.coin import Coin, get_coin
+from src.helpers import Genkey, Label, LabelScheme, Path, ReceivingAddress
+
+# Mirrors the settings of DEFAULT_COIN, kept for code that predates per-coin contexts
 MODULE_SETTINGS: Dict[str, Union[str, int, Path]] = {
     "PATH_MN_CONF": Path(""),
     "PATH_WALLET_CLI": Path(""),
@@ -30,29 +38,144 @@ MODULE_SETTINGS: Dict[str, Union[str, int, Path]] = {
     "NODE_PORT": -1,
 }
 
+# The coin used by functions that are not passed a coin explicitly
+DEFAULT_COIN: Optional[Coin] = None
+
+# A line of masternode.conf, txhash and txindex are placeholders until the collateral is sent
+ConfEntry = namedtuple("ConfEntry", ["label", "address", "genkey", "txhash", "txindex"])
+
+# An entry of the network's masternode list, outpoint is formatted as <txhash>-<txindex>
+MasternodeListEntry = namedtuple(
+    "MasternodeListEntry", ["outpoint", "status", "address", "payee"]
+)
+
+_rpc_sessions: threading.local = threading.local()
+
+# The smallest units of one coin
+SATOSHIS_PER_COIN: int = 100_000_000
+
+
+def to_satoshis(amount: float) -> int:
+    """Convert an amount of a coin, e.g. of the wallet's RPC, to satoshis, which compare exactly."""
+    return round(amount * SATOSHIS_PER_COIN)
+
+
+class RpcError(Exception):
+    """An error returned by the wallet's RPC server."""
+
+    def __init__(self, error: Dict[str, Any]) -> None:
+        super().__init__(error.get("message"))
+        self.code: Optional[int] = error.get("code")
+        self.message: str = error.get("message", "")
+
 
-# TODO: Clean up
 def set_coin(name: str) -> None:
-    """Set MODULE_SETTINGS["PATH_MN_CONF"] and MODULE_SETTINGS["PATH_WALLET_CLI"] to the paths of the chosen coin.
+    """Set the default coin and update MODULE_SETTINGS to its settings.
+
+    To work on multiple coins at the same time, pass coin.get_coin(name) to the functions instead.
 
     Args:
         name: The name of the coin to be used
 
     """
-    # noinspection PyTypeChecker
-    MODULE_SETTINGS["PATH_MN_CONF"] = PosixPath(
-        pymasternode.CONFIG["coins"][name]["path_mn_conf"]
-    ).expanduser()
-    # noinspection PyTypeChecker
-    MODULE_SETTINGS["PATH_WALLET_BIN"] = PosixPath(
-        pymasternode.CONFIG["coins"][name]["path_wallet_bin"]
-    ).expanduser()
-    # noinspection PyTypeChecker
-    MODULE_SETTINGS["NODE_PORT"] = int(pymasternode.CONFIG["coins"][name]["node_port"])
-    if name == "SMART":
-        MODULE_SETTINGS["NODE_TERM"] = "smartnode"
-    else:
-        MODULE_SETTINGS["NODE_TERM"] = "masternode"
+    global DEFAULT_COIN
+
+    DEFAULT_COIN = get_coin(name)
+    MODULE_SETTINGS["PATH_MN_CONF"] = DEFAULT_COIN.path_mn_conf
+    MODULE_SETTINGS["PATH_WALLET_BIN"] = DEFAULT_COIN.path_wallet_bin
+    MODULE_SETTINGS["PATH_WALLET_CLI"] = DEFAULT_COIN.path_wallet_cli
+    MODULE_SETTINGS["NODE_PORT"] = DEFAULT_COIN.node_port
+    MODULE_SETTINGS["NODE_TERM"] = DEFAULT_COIN.node_term
+
+
+def _get_coin(coin: Optional[Coin]) -> Coin:
+    return coin if coin is not None else DEFAULT_COIN
+
+
+def _run_cli(coin: Coin, *args: str) -> CompletedProcess:
+    """Run a command of the coin's wallet cli.
+
+    Raises subprocess.CalledProcessError if the command fails.
+
+    """
+    return subprocess.run(
+        [coin.path_wallet_cli, "-server", *args],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        encoding="utf-8",
+        check=True,
+    )
+
+
+def rpc_batch(
+        calls: List[Tuple[str, List[Any]]], coin: Optional[Coin] = None
+) -> List[Dict[str, Any]]:
+    """Send multiple calls to the wallet's RPC server in one request.
+
+    Requires rpc_port, rpc_user and rpc_password to be configured for the coin.
+
+    Args:
+        calls: Tuples of method name and parameters
+        coin: The coin to use, DEFAULT_COIN if not provided
+
+    Returns:
+        The replies in the order of calls, each with the keys result and error
+
+    """
+    coin = _get_coin(coin)
+
+    if coin.rpc_url is None:
+        raise ValueError(f"No RPC server configured for {coin.name}.")
+
+    if not hasattr(_rpc_sessions, "session"):
+        _rpc_sessions.session = requests.Session()
+
+    response: requests.Response = _rpc_sessions.session.post(
+        coin.rpc_url,
+        json=[
+            {"jsonrpc": "1.0", "id": i, "method": method, "params": params}
+            for i, (method, params) in enumerate(calls)
+        ],
+        auth=(coin.rpc_user, coin.rpc_password),
+        timeout=60,
+    )
+    response.raise_for_status()
+
+    return sorted(response.json(), key=lambda reply: reply["id"])
+
+
+def call(method: str, *params: Any, coin: Optional[Coin] = None) -> Any:
+    """Call a wallet command, over RPC if configured for the coin, with the wallet cli otherwise.
+
+    Raises RpcError or subprocess.CalledProcessError if the command fails.
+
+    Args:
+        method: The command to call
+        params: The parameters of the command
+        coin: The coin to use, DEFAULT_COIN if not provided
+
+    Returns:
+        The result of the command, parsed from JSON if possible
+
+    """
+    coin = _get_coin(coin)
+
+    if coin.rpc_url is not None:
+        reply: Dict[str, Any] = rpc_batch([(method, list(params))], coin)[0]
+        if reply["error"]:
+            raise RpcError(reply["error"])
+        return reply["result"]
+
+    output: str = _run_cli(
+        coin,
+        method,
+        *[param if isinstance(param, str) else json.dumps(param) for param in params],
+    ).stdout.strip()
+
+    try:
+        return json.loads(output)
+    except json.decoder.JSONDecodeError:
+        return output
 
 
 def generate_label(addr_scheme: str, iterator: int) -> Label:
@@ -67,60 +190,146 @@ def generate_label(addr_scheme: str, iterator: int) -> Label:
         The generated address
 
     """
-    return (
-            addr_scheme.split("###", 2)[0]
-            + str(iterator).zfill(addr_scheme.count("#"))
-            + addr_scheme.split("###", 2)[1]
-    )
+    return get_label_scheme(addr_scheme).format(iterator)
+
+
+@functools.lru_cache(maxsize=None)
+def get_label_scheme(addr_scheme: str) -> LabelScheme:
+    """Get the compiled label scheme of a naming scheme, compiled once per scheme."""
+    return LabelScheme(addr_scheme)
+
 
+def get_conf_labels(coin: Optional[Coin] = None) -> List[Label]:
+    """Get the labels of all masternodes in masternode.conf.
 
-def generate_address(label: Label) -> ReceivingAddress:
+    Args:
+        coin: The coin to use, DEFAULT_COIN if not provided
+
+    Returns:
+        The labels of all masternodes in masternode.conf
+
+    """
+    return [entry.label for entry in read_mn_conf(coin)]
+
+
+def generate_address(label: Label, coin: Optional[Coin] = None) -> ReceivingAddress:
     """Generate a receiving address.
 
     Args:
         label: The label of the generated receiving address
+        coin: The coin to use, DEFAULT_COIN if not provided
 
     Returns:
         The generated receiving address
 
     """
     return ReceivingAddress(
-        subprocess.run(
-            [
-                MODULE_SETTINGS["PATH_WALLET_CLI"],
-                "-server",
-                "getnewaddress",
-                str(label),
-            ],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            encoding="utf-8",
-            check=True,
-        ).stdout
+        _run_cli(_get_coin(coin), "getnewaddress", str(label)).stdout.strip()
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def _get_xpub(serialized: str) -> hd.ExtendedPublicKey:
+    return hd.ExtendedPublicKey.parse(serialized)
+
+
+def derive_addresses(
+        labels: Iterable[Label], addr_scheme: str, coin: Optional[Coin] = None
+) -> Dict[Label, ReceivingAddress]:
+    """Derive the receiving addresses of labels from the coin's collateral_xpub, without the wallet.
+
+    The address of a label is derived by collateral_path from the label's iterator.
+
+    Args:
+        labels: The labels of the receiving addresses
+        addr_scheme: The naming scheme of the labels, see generate_label
+        coin: The coin to use, DEFAULT_COIN if not provided
+
+    Returns:
+        The derived receiving addresses keyed by label
+
+    Raises:
+        ValueError: If collateral_xpub or address_version is not configured for the coin,
+        or a label does not match the naming scheme
+
+    """
+    coin = _get_coin(coin)
+    if coin.collateral_xpub is None or coin.address_version is None:
+        raise ValueError(f"collateral_xpub and address_version of {coin.name} have to be configured")
+
+    scheme: LabelScheme = get_label_scheme(addr_scheme)
+    iterators: Dict[Label, Optional[int]] = {label: scheme.parse(label) for label in labels}
+    unmatched: List[Label] = [label for label, iterator in iterators.items() if iterator is None]
+    if unmatched:
+        raise ValueError(f"Labels do not match {addr_scheme}: {unmatched}")
+
+    addresses: Dict[int, str] = hd.derive_addresses(
+        _get_xpub(coin.collateral_xpub),
+        coin.collateral_path,
+        iterators.values(),
+        coin.address_version,
     )
 
+    return {label: ReceivingAddress(addresses[iterator]) for label, iterator in iterators.items()}
+
+
+def import_watch_only(
+        addresses: Dict[Label, ReceivingAddress], rescan: bool = False, coin: Optional[Coin] = None
+) -> Dict[Label, str]:
+    """Import receiving addresses into the wallet as watch-only.
+
+    With RPC configured for the coin, all addresses are imported in one request,
+    otherwise one wallet cli process is run per address.
+
+    Args:
+        addresses: The addresses keyed by label, which becomes their label in the wallet
+        rescan: Whether the wallet rescans the chain for transactions of the addresses,
+        not needed for new addresses
+        coin: The coin to use, DEFAULT_COIN if not provided
+
+    Returns:
+        The reason the import failed, keyed by label of the addresses that failed
+
+    """
+    coin = _get_coin(coin)
+    errors: Dict[Label, str] = {}
+
+    if coin.rpc_url is not None:
+        replies: List[Dict[str, Any]] = rpc_batch(
+            [("importaddress", [str(address), str(label), rescan]) for label, address in addresses.items()],
+            coin,
+        )
+        for label, reply in zip(addresses, replies):
+            if reply["error"]:
+                errors[label] = reply["error"].get("message", "")
+    else:
+        for label, address in addresses.items():
+            try:
+                call("importaddress", str(address), str(label), rescan, coin=coin)
+            except subprocess.CalledProcessError as error:
+                errors[label] = error.stderr.strip()
+
+    return errors
 
-def generate_genkey() -> Genkey:
+
+def generate_genkey(coin: Optional[Coin] = None) -> Genkey:
     """Generate a masternode genkey.
 
+    The genkey is generated in-process if the coin's secret_key_version is configured,
+    see keys.generate_genkeys, by the wallet otherwise.
+
+    Args:
+        coin: The coin to use, DEFAULT_COIN if not provided
+
     Returns:
         The generated masternode genkey
 
     """
-    return Genkey(
-        subprocess.run(
-            [
-                MODULE_SETTINGS["PATH_WALLET_CLI"],
-                "-server",
-                MODULE_SETTINGS["NODE_TERM"],
-                "genkey",
-            ],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            encoding="utf-8",
-            check=True,
-        ).stdout
-    )
+    coin = _get_coin(coin)
+    if coin.secret_key_version is not None:
+        return keys.generate_genkey(coin)
+
+    return Genkey(_run_cli(coin, coin.node_term, "genkey").stdout.strip())
 
 
 def generate_config_lines(
@@ -128,63 +337,292 @@ def generate_config_lines(
         iterator_start: int,
         iterator_end: int,
         append_to_config: bool = False,
+        coin: Optional[Coin] = None,
+        watch_only: bool = False,
 ) -> None:
     """Generate config lines consisting of the following items; label, port, genkey and address.
 
+    If collateral_xpub is configured for the coin, the addresses are derived in-process,
+    see derive_addresses, otherwise the wallet generates them.
+
     Args:
         addr_scheme: The naming scheme of the labels, insert ### to indicate the label iterator
         iterator_start: The start of the label iterator
         iterator_end: The inclusive end of the label iterator
-        append_to_config: Lines will be appended to the existing config if True, written into data/conf_lines.txt otherwise
+        append_to_config: Lines will be appended to the existing config if True, written into data/conf_lines_<coin>.txt otherwise
+        coin: The coin to use, DEFAULT_COIN if not provided
+        watch_only: Whether derived addresses are imported into the wallet as watch-only
 
     """
-    iterator: int = int(iterator_start)
+    coin = _get_coin(coin)
     lines: List[str] = []
+    labels: List[Label] = list(get_label_scheme(addr_scheme).labels(iterator_start, iterator_end))
 
-    for _ in range(iterator_start, iterator_end + 1):
-        label: Label = generate_label(addr_scheme, iterator)
+    if coin.collateral_xpub is not None:
+        addresses: Dict[Label, ReceivingAddress] = derive_addresses(labels, addr_scheme, coin)
+        if watch_only:
+            for label, error in import_watch_only(addresses, coin=coin).items():
+                print(f"Importing the address of {label} failed: {error}")
+    else:
+        addresses = {label: generate_address(label, coin) for label in labels}
 
+    for label in labels:
         # TODO: Address tag should be removed later
-        line: str = f"{label} <ip>:{str(MODULE_SETTINGS['NODE_PORT'])} {generate_genkey()} <tx_hash> <tx_id> <address={generate_address(label)}>\n"
+        line: str = f"{label} <ip>:{str(coin.node_port)} {generate_genkey(coin)} <tx_hash> <tx_id> <address={addresses[label]}>\n"
 
         print(line, "\n")
         lines.append(line)
-        iterator += 1
 
     if append_to_config:
-        with open(MODULE_SETTINGS["PATH_MN_CONF"], "a") as config:
+        with coin.conf_lock, open(coin.path_mn_conf, "a") as config:
             config.writelines(lines)
         print("Line(s) appended to existing config file.")
     else:
         with open(
-                pymasternode.PATH_PROJECT_ROOT / "data" / "conf_lines.txt", "w"
+                pymasternode.PATH_PROJECT_ROOT / "data" / f"conf_lines_{coin.name}.txt", "w"
         ) as output:
             output.writelines(lines)
-        print("Saving output to data/conf_lines.txt.")
+        print(f"Saving output to data/conf_lines_{coin.name}.txt.")
 
 
-def get_unconfimed_transactions() -> None:
-    pass
+def get_unconfimed_transactions(
+        min_conf: int = 1, coin: Optional[Coin] = None
+) -> Dict[str, int]:
+    """Get the wallet's transactions with less than min_conf confirmations.
 
+    Args:
+        min_conf: The confirmations a transaction needs to count as confirmed
+        coin: The coin to use, DEFAULT_COIN if not provided
 
-def make_transactions() -> None:
-    pass
+    Returns:
+        The confirmations of each unconfirmed transaction, keyed by txid
 
+    """
+    coin = _get_coin(coin)
+    block_count: int = call("getblockcount", coin=coin)
+    # Transactions in blocks after this one have less than min_conf confirmations
+    since_block: str = call(
+        "getblockhash", max(block_count - max(min_conf, 1) + 1, 0), coin=coin
+    )
+    transactions: List[Dict[str, Any]] = call(
+        "listsinceblock", since_block, coin=coin
+    )["transactions"]
+
+    return {
+        transaction["txid"]: transaction["confirmations"]
+        for transaction in transactions
+        if transaction["confirmations"] < min_conf
+    }
+
+
+def make_transactions(
+        masternodes: Optional[List[Label]] = None,
+        min_conf: int = 1,
+        coin: Optional[Coin] = None,
+) -> str:
+    """Send the collateral of many masternodes in one transaction and fill in their config lines.
+
+    The collateral is sent to the addresses in the <address=...> tags written by generate_config_lines.
+    Outputs holding exactly one collateral are locked while the transaction is created,
+    so that the collateral of running masternodes is never spent. Calls for the same
+    coin are serialized, so that concurrent calls never fund a masternode twice. The
+    txhash is written right after sending, output indexes a failed call did not fill in
+    are filled in by the next call.
 
-def get_mn_outputs() -> None:
-    mn_outputs_json: CompletedProcess = subprocess.run(
-        [MODULE_SETTINGS["PATH_WALLET_CLI"], "-server", "masternode", "outputs"],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        encoding="utf-8",
-        check=True,
+    Args:
+        masternodes: Labels of masternodes to fund, if not provided: all masternodes without collateral
+        min_conf: Only spend outputs with at least this many confirmations
+        coin: The coin to use, DEFAULT_COIN if not provided
+
+    Returns:
+        The hash of the sent transaction
+
+    """
+    coin = _get_coin(coin)
+
+    if coin.collateral is None:
+        raise ValueError(f"No collateral configured for {coin.name}.")
+
+    # Held until the config lines are filled in, so that concurrent calls do not fund the same labels
+    with coin.funding_lock:
+        addresses: Dict[Label, str] = {}
+        # Labels funded by an earlier call, which failed before filling in the output index
+        sent: Dict[str, Dict[Label, str]] = {}
+
+        with coin.conf_lock, open(coin.path_mn_conf) as conf:
+            for line in conf:
+                entries: List[ConfEntry] = parse_mn_conf([line])
+                match: Optional[Match[str]] = re.search(r"<address=(\w+)>", line)
+                if entries and entries[0].txhash == "<tx_hash>" and match:
+                    addresses[entries[0].label] = match.group(1)
+                elif entries and entries[0].txindex == "<tx_id>" and match:
+                    sent.setdefault(entries[0].txhash, {})[entries[0].label] = match.group(1)
+
+        for sent_txhash, sent_addresses in sent.items():
+            fill_in_output_indices(sent_txhash, sent_addresses, coin)
+
+        if masternodes is not None:
+            addresses = {label: addresses[label] for label in masternodes if label in addresses}
+
+        if not addresses:
+            raise ValueError("No masternodes to fund.")
+
+        total: float = coin.collateral * len(addresses)
+        unspent: List[Dict[str, Any]] = call("listunspent", min_conf, coin=coin)
+        # Compared in satoshis, as amounts parsed into floats are not exact
+        collateral: int = to_satoshis(coin.collateral)
+        collateral_outputs: List[Dict[str, Any]] = [
+            {"txid": output["txid"], "vout": output["vout"]}
+            for output in unspent
+            if to_satoshis(output["amount"]) == collateral
+        ]
+
+        if (
+                sum(
+                    to_satoshis(output["amount"])
+                    for output in unspent
+                    if to_satoshis(output["amount"]) != collateral
+                )
+                < to_satoshis(total + coin.fee_margin)
+        ):
+            raise ValueError(
+                f"Insufficient spendable balance to send {total} {coin.name} and its fee."
+            )
+
+        if collateral_outputs:
+            call("lockunspent", False, collateral_outputs, coin=coin)
+        try:
+            txhash: str = call(
+                "sendmany",
+                "",
+                {address: coin.collateral for address in addresses.values()},
+                min_conf,
+                coin=coin,
+            )
+            # Written before anything else can fail, the output indexes can be looked up again later
+            fill_in_outpoints({label: (txhash, None) for label in addresses}, coin)
+        finally:
+            if collateral_outputs:
+                call("lockunspent", True, collateral_outputs, coin=coin)
+
+        fill_in_output_indices(txhash, addresses, coin)
+        print(f"Sent collateral for {len(addresses)} masternode(s) in {txhash}.")
+
+        return txhash
+
+
+def get_output_addresses(output: Dict[str, Any]) -> List[str]:
+    """Get the addresses of a decoded transaction output.
+
+    Newer wallets report a single address, older ones a list of addresses.
+    """
+    script: Dict[str, Any] = output["scriptPubKey"]
+
+    return ([script["address"]] if "address" in script else []) + script.get("addresses", [])
+
+
+def fill_in_output_indices(
+        txhash: str, addresses: Dict[Label, str], coin: Optional[Coin] = None
+) -> None:
+    """Fill in the output indexes of masternodes funded by a transaction in masternode.conf.
+
+    Args:
+        txhash: The hash of the transaction sending the collaterals
+        addresses: The collateral addresses of the masternodes, keyed by label
+        coin: The coin to use, DEFAULT_COIN if not provided
+
+    Raises:
+        ValueError: If the transaction has no output to the address of a masternode
+
+    """
+    coin = _get_coin(coin)
+    transaction: Dict[str, Any] = call(
+        "decoderawtransaction", call("gettransaction", txhash, coin=coin)["hex"], coin=coin
+    )
+    output_indices: Dict[str, int] = {
+        address: output["n"]
+        for output in transaction["vout"]
+        for address in get_output_addresses(output)
+    }
+
+    missing: List[Label] = [
+        label for label, address in addresses.items() if address not in output_indices
+    ]
+    if missing:
+        raise ValueError(f"{txhash} has no output to the address of {', '.join(missing)}.")
+
+    fill_in_outpoints(
+        {label: (txhash, output_indices[address]) for label, address in addresses.items()},
+        coin,
     )
+
+
+def fill_in_outpoints(
+        outpoints: Dict[Label, Tuple[str, Optional[int]]], coin: Optional[Coin] = None
+) -> None:
+    """Replace the <tx_hash> <tx_id> placeholders and the address tag in masternode.conf.
+
+    Without an output index only the txhash is filled in and the <tx_id> placeholder
+    and the address tag are kept, so that the index can be filled in later.
+
+    Args:
+        outpoints: Tuples of txhash and output index, keyed by label
+        coin: The coin to use, DEFAULT_COIN if not provided
+
+    """
+    coin = _get_coin(coin)
+
+    with coin.conf_lock:
+        with open(coin.path_mn_conf) as conf:
+            config_lines: List[str] = conf.readlines()
+
+        for line_i, line in enumerate(config_lines):
+            fields: List[str] = line.split()
+            if fields and fields[0] in outpoints and "<tx_id>" in fields[3:5]:
+                txhash, output_index = outpoints[fields[0]]
+                config_lines[line_i] = " ".join(
+                    fields[:3] + [txhash, "<tx_id>"] + fields[5:]
+                    if output_index is None
+                    else fields[:3] + [txhash, str(output_index)]
+                ) + "\n"
+
+        with open(coin.path_mn_conf, "w") as conf:
+            conf.writelines(config_lines)
+
+
+def fill_in_ips(ips: Dict[Label, str], coin: Optional[Coin] = None) -> None:
+    """Replace the <ip> placeholders in masternode.conf.
+
+    Args:
+        ips: The IP's of the masternodes, keyed by label
+        coin: The coin to use, DEFAULT_COIN if not provided
+
+    """
+    coin = _get_coin(coin)
+
+    with coin.conf_lock:
+        with open(coin.path_mn_conf) as conf:
+            config_lines: List[str] = conf.readlines()
+
+        for line_i, line in enumerate(config_lines):
+            fields: List[str] = line.split()
+            if len(fields) > 1 and fields[0] in ips and fields[1].startswith("<ip>:"):
+                config_lines[line_i] = line.replace("<ip>:", f"{ips[fields[0]]}:", 1)
+
+        with open(coin.path_mn_conf, "w") as conf:
+            conf.writelines(config_lines)
+
+
+def get_mn_outputs(coin: Optional[Coin] = None) -> None:
+    coin = _get_coin(coin)
+    mn_outputs_json: CompletedProcess = _run_cli(coin, coin.node_term, "outputs")
     mn_outputs_dict = json.loads(mn_outputs_json.stdout.strip())
-    with open(MODULE_SETTINGS["PATH_MN_CONF"]) as conf:
-        config_lines: List[str] = conf.readlines()
 
-    with open(MODULE_SETTINGS["PATH_MN_CONF"]) as conf:
-        for line_i, line in enumerate(conf):
+    with coin.conf_lock:
+        with open(coin.path_mn_conf) as conf:
+            config_lines: List[str] = conf.readlines()
+
+        for line_i, line in enumerate(list(config_lines)):
             # Line ending in 0 or 1 (TX-ID)
             if not re.search(r"\W\b[01]$", line):
                 # Line ending in a mixed-char-string of length 64 (TX_hash)
@@ -197,12 +635,14 @@ def get_mn_outputs() -> None:
                                 + mn_outputs_dict[key].get("txoutput")
                                 + "\n"
                         )
-    # Writes updated lines to file
-    with open(MODULE_SETTINGS["PATH_MN_CONF"], "w") as conf:
-        conf.writelines(config_lines)
+        # Writes updated lines to file
+        with open(coin.path_mn_conf, "w") as conf:
+            conf.writelines(config_lines)
 
 
-def unlock_wallet(timeout: int = 60, max_attempts: int = 3) -> None:
+def unlock_wallet(
+        timeout: int = 60, max_attempts: int = 3, coin: Optional[Coin] = None
+) -> None:
     """Unlock the wallet with your passphrase for a specified time.
 
     internal helper function will be called max_attempts times until the unlock is successful.
@@ -210,8 +650,10 @@ def unlock_wallet(timeout: int = 60, max_attempts: int = 3) -> None:
     Args:
         timeout: time in seconds to unlock the wallet for
         max_attempts: maximum attempts before aborting
+        coin: The coin to use, DEFAULT_COIN if not provided
 
     """
+    coin = _get_coin(coin)
 
     def unlock(timeout: int) -> bool:
         """Internal helper.
@@ -223,7 +665,7 @@ def unlock_wallet(timeout: int = 60, max_attempts: int = 3) -> None:
         try:
             subprocess.run(
                 [
-                    MODULE_SETTINGS["PATH_WALLET_CLI"],
+                    coin.path_wallet_cli,
                     "walletpassphrase",
                     getpass.getpass("Enter passphrase: "),
                     str(timeout),
@@ -248,43 +690,186 @@ def unlock_wallet(timeout: int = 60, max_attempts: int = 3) -> None:
             print(f"{max_attempts - i} attempt(s) left")
 
 
-def start_mn(masternode: Label = None) -> None:
+def start_mn(masternode: Label = None, coin: Optional[Coin] = None) -> None:
     """Start masternodes.
 
     Args:
         masternode: Labels of masternodes to be started, if not provided: all missing MN's will be started
+        coin: The coin to use, DEFAULT_COIN if not provided
 
     """
+    coin = _get_coin(coin)
+
     if masternode:
-        subprocess.run(
-            [
-                MODULE_SETTINGS["PATH_WALLET_CLI"],
-                "-server",
-                MODULE_SETTINGS["NODE_TERM"],
-                "start-alias",
-                masternode,
-            ],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            encoding="utf-8",
-            check=True,
-        )
+        _run_cli(coin, coin.node_term, "start-alias", masternode)
     else:
-        subprocess.run(
-            [
-                MODULE_SETTINGS["PATH_WALLET_CLI"],
-                "-server",
-                MODULE_SETTINGS["NODE_TERM"],
-                "start-missing",
-            ],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            encoding="utf-8",
-            check=True,
-        )
+        _run_cli(coin, coin.node_term, "start-missing")
     print("Masternodes started.")
 
 
+def read_mn_conf(coin: Optional[Coin] = None) -> List[ConfEntry]:
+    """Read the entries of masternode.conf, skipping comments and empty lines.
+
+    Args:
+        coin: The coin to use, DEFAULT_COIN if not provided
+
+    Returns:
+        The entries of masternode.conf
+
+    """
+    coin = _get_coin(coin)
+
+    with coin.conf_lock, open(coin.path_mn_conf) as conf:
+        return parse_mn_conf(conf)
+
+
+def parse_mn_conf(lines: Iterable[str]) -> List[ConfEntry]:
+    """Parse lines in the format of masternode.conf.
+
+    Args:
+        lines: The lines to parse
+
+    Returns:
+        An entry for each line, missing fields are None
+
+    """
+    entries: List[ConfEntry] = []
+
+    for line in lines:
+        fields: List[str] = line.split()
+        if not fields or fields[0].startswith("#"):
+            continue
+
+        fields = (fields + [None] * 5)[:5]
+        entries.append(ConfEntry(*fields))
+
+    return entries
+
+
+def parse_masternode_list(masternode_list: Dict[str, str]) -> Dict[str, MasternodeListEntry]:
+    """Parse the output of "masternode list full".
+
+    Args:
+        masternode_list: The output of "masternode list full", keys are collateral outpoints formatted as
+        <txhash>-<txindex> or COutPoint(<txhash>, <txindex>)
+
+    Returns:
+        The entries of the list, keyed by outpoint formatted as <txhash>-<txindex>
+
+    """
+    entries: Dict[str, MasternodeListEntry] = {}
+
+    for key, value in masternode_list.items():
+        match: Optional[Match[str]] = re.search(r"(\w{64})\W+(\d+)", key)
+        if not match:
+            continue
+
+        outpoint: str = f"{match.group(1)}-{match.group(2)}"
+        # status protocol payee lastseen activeseconds lastpaidtime lastpaidblock address
+        fields: List[str] = value.split()
+        entries[outpoint] = MasternodeListEntry(
+            outpoint,
+            fields[0] if fields else "",
+            fields[-1] if len(fields) > 1 else None,
+            fields[2] if len(fields) > 2 else None,
+        )
+
+    return entries
+
+
+def get_masternode_list(coin: Optional[Coin] = None) -> Dict[str, MasternodeListEntry]:
+    """Get the network's masternode list with one wallet call.
+
+    Args:
+        coin: The coin to use, DEFAULT_COIN if not provided
+
+    Returns:
+        The entries of the list, keyed by outpoint formatted as <txhash>-<txindex>
+
+    """
+    coin = _get_coin(coin)
+
+    return parse_masternode_list(call(coin.node_term, "list", "full", coin=coin))
+
+
+def start_mns(
+        masternodes: Optional[List[Label]] = None,
+        max_concurrency: int = 8,
+        batch_size: int = 50,
+        coin: Optional[Coin] = None,
+) -> Dict[Label, str]:
+    """Start many masternodes concurrently and verify their status in the network's masternode list.
+
+    With RPC configured for the coin, the start-alias calls are sent in batches of batch_size,
+    otherwise one wallet cli process is run per masternode.
+
+    Args:
+        masternodes: Labels of masternodes to be started, if not provided: all masternodes in masternode.conf
+        max_concurrency: Maximum number of batches or processes running at the same time
+        batch_size: Number of start-alias calls per RPC request
+        coin: The coin to use, DEFAULT_COIN if not provided
+
+    Returns:
+        The status of each masternode in the masternode list, or the reason it failed to start
+
+    """
+    coin = _get_coin(coin)
+    conf_entries: Dict[Label, ConfEntry] = {
+        entry.label: entry for entry in read_mn_conf(coin)
+    }
+    labels: List[Label] = list(conf_entries if masternodes is None else masternodes)
+    start_errors: Dict[Label, str] = {}
+
+    def start_batch(batch: List[Label]) -> None:
+        replies: List[Dict[str, Any]] = rpc_batch(
+            [(coin.node_term, ["start-alias", label]) for label in batch], coin
+        )
+        for label, reply in zip(batch, replies):
+            if reply["error"]:
+                start_errors[label] = reply["error"].get("message", "")
+            elif reply["result"].get("result") != "successful":
+                start_errors[label] = reply["result"].get("errorMessage", "")
+
+    def start_single(label: Label) -> None:
+        try:
+            result: Any = call(coin.node_term, "start-alias", label, coin=coin)
+            if isinstance(result, dict) and result.get("result") != "successful":
+                start_errors[label] = result.get("errorMessage", "")
+        except subprocess.CalledProcessError as error:
+            start_errors[label] = error.stderr.strip()
+
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        if coin.rpc_url is not None:
+            batches: List[List[Label]] = [
+                labels[i:i + batch_size] for i in range(0, len(labels), batch_size)
+            ]
+            list(executor.map(start_batch, batches))
+        else:
+            list(executor.map(start_single, labels))
+
+    masternode_list: Dict[str, MasternodeListEntry] = get_masternode_list(coin)
+    statuses: Dict[Label, str] = {}
+
+    for label in labels:
+        entry: Optional[ConfEntry] = conf_entries.get(label)
+        list_entry: Optional[MasternodeListEntry] = entry and masternode_list.get(
+            f"{entry.txhash}-{entry.txindex}"
+        )
+
+        if entry is None:
+            statuses[label] = "NOT_IN_CONF"
+        elif list_entry is not None:
+            statuses[label] = list_entry.status
+        else:
+            statuses[label] = start_errors.get(label) or "MISSING"
+
+    print(
+        f"{sum(status == 'ENABLED' or status == 'PRE_ENABLED' for status in statuses.values())}"
+        f" of {len(labels)} masternodes started."
+    )
+    return statuses
+
+
 def main() -> None:
     set_coin("GLT")
 
@@ -0,0 +1,170 @@
+#!/bin/python
+import atexit
+import contextlib
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from aiohttp import web
+
+# The tests read the example config and keep their databases in a temporary directory,
+# never the local config or databases in data/, set before src.pymasternode is imported
+PATH_TEST_DATA = Path(tempfile.mkdtemp(prefix="pymasternode-tests-"))
+atexit.register(shutil.rmtree, PATH_TEST_DATA, True)
+shutil.copy(Path(__file__).parents[1] / "data" / "Settings.json.example", PATH_TEST_DATA / "Settings.json")
+(PATH_TEST_DATA / "api_key_vultr.txt").write_text("key")
+os.environ["PYMASTERNODE_DATA"] = str(PATH_TEST_DATA)
+
+from src import aio  # noqa: E402
+from src.coin import Coin  # noqa: E402
+
+
+class FakeSSHClient:
+    """A ParallelSSHClient answering run_command like parallel-ssh 2.x, with a list of HostOutput.
+
+    Args:
+        hosts: The hosts of the client
+        replies: The exit code, stdout lines and stderr lines of a command, by host and command,
+        by default every command succeeds without output
+
+    """
+
+    def __init__(self, hosts, replies=None):
+        self.hosts = list(hosts)
+        self.replies = replies or (lambda host, command: (0, [], []))
+        self.commands = []
+
+    def run_command(self, command, stop_on_errors=True, host_args=None):
+        output = []
+        for i, host in enumerate(self.hosts):
+            host_command = command % host_args[i] if host_args is not None else command
+            self.commands.append((host, host_command))
+            exit_code, stdout, stderr = self.replies(host, host_command)
+            output.append(
+                SimpleNamespace(
+                    host=host,
+                    stdout=iter(stdout),
+                    stderr=iter(stderr),
+                    exit_code=None,
+                    exception=None,
+                    _exit_code=exit_code,
+                )
+            )
+        return output
+
+    def join(self, output):
+        for host_output in output:
+            host_output.exit_code = host_output._exit_code
+
+
+class FakeVultrApi:
+    """A local service answering the Vultr API v1 calls of aio.AsyncVultr.
+
+    Every call changing a server or snapshot is recorded in calls, as its path below
+    /v1/ and its parameters. /status answers like a sync source with the height 100.
+    """
+
+    def __init__(self):
+        self.servers = {}
+        self.snapshots = {}
+        self.calls = []
+
+    def app(self):
+        app = web.Application()
+        app.router.add_post("/v1/server/create", self.server_create)
+        app.router.add_get("/v1/server/list", self.server_list)
+        app.router.add_post("/v1/server/label_set", self.server_label_set)
+        app.router.add_post("/v1/server/reinstall", self.server_call)
+        app.router.add_post("/v1/server/destroy", self.server_call)
+        app.router.add_post("/v1/snapshot/create", self.snapshot_create)
+        app.router.add_get("/v1/snapshot/list", self.snapshot_list)
+        app.router.add_get("/status", self.status)
+        return app
+
+    async def _record(self, request):
+        params = dict(await request.post())
+        self.calls.append((request.path[len("/v1/"):], params))
+        return params
+
+    async def status(self, request):
+        return web.json_response({"height": 100})
+
+    async def server_create(self, request):
+        params = await self._record(request)
+        subid = str(10000000 + len(self.servers))
+        self.servers[subid] = {
+            "SUBID": subid,
+            "label": params["label"],
+            "tag": params.get("tag", ""),
+            "main_ip": f"10.0.0.{len(self.servers) + 1}",
+            "status": "active",
+            "server_state": "ok",
+        }
+        return web.json_response({"SUBID": subid})
+
+    async def server_list(self, request):
+        subid = request.query.get("SUBID")
+        return web.json_response(self.servers[subid] if subid else self.servers)
+
+    async def server_label_set(self, request):
+        params = await self._record(request)
+        self.servers[params["SUBID"]]["label"] = params["label"]
+        return web.Response()
+
+    async def server_call(self, request):
+        params = await self._record(request)
+        if request.path.endswith("destroy"):
+            self.servers.pop(params["SUBID"])
+        return web.Response()
+
+    async def snapshot_create(self, request):
+        await self._record(request)
+        self.snapshots["snap1"] = {"SNAPSHOTID": "snap1", "status": "complete"}
+        return web.json_response({"SNAPSHOTID": "snap1"})
+
+    async def snapshot_list(self, request):
+        return web.json_response(self.snapshots)
+
+    @contextlib.asynccontextmanager
+    async def serve(self, requests_per_second=1000):
+        """Serve the API on a free local port, yielding an AsyncVultr using it."""
+        runner = web.AppRunner(self.app())
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", 0).start()
+        try:
+            endpoint = f"http://127.0.0.1:{runner.addresses[0][1]}"
+            async with aio.AsyncVultr("key", requests_per_second, endpoint) as vultr:
+                yield vultr
+        finally:
+            await runner.cleanup()
+
+
+@pytest.fixture
+def fake_vultr_api():
+    return FakeVultrApi()
+
+
+@pytest.fixture
+def fake_ssh_client():
+    return FakeSSHClient
+
+
+@pytest.fixture
+def make_coin(tmp_path):
+    """Make a GLT coin whose masternode.conf and wallet binaries are in tmp_path, settings override the defaults."""
+
+    def make(**settings):
+        return Coin(
+            "GLT",
+            {
+                "path_mn_conf": str(tmp_path / "masternode.conf"),
+                "path_wallet_bin": str(tmp_path),
+                "node_port": 9319,
+                **settings,
+            },
+        )
+
+    return make
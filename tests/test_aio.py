@@ -0,0 +1,104 @@
+#!/bin/python
+import asyncio
+
+from src import aio, pymasternode, vps
+from src.journal import MemoryJournal
+
+
+def test_async_vultr_throttles_requests(fake_vultr_api):
+    async def run():
+        async with fake_vultr_api.serve(requests_per_second=20) as vultr:
+            started = asyncio.get_running_loop().time()
+            await asyncio.gather(*[vultr.server_list() for _ in range(5)])
+            return asyncio.get_running_loop().time() - started, vultr.request_count
+
+    elapsed, request_count = asyncio.run(run())
+
+    # The first request is sent at once, every other one 1/20 s after the previous
+    assert elapsed >= 0.2
+    assert request_count == 5
+
+
+def test_complete_setup_resumes(make_coin, fake_vultr_api, monkeypatch):
+    scripts = {
+        vps.isolate_stdin((pymasternode.PATH_PROJECT_ROOT / "data" / name).read_text()).encode(): name
+        for name in ["pre_setup.sh", "mn_setup.sh"]
+    }
+    ran = []
+
+    async def command_send(self, commands_sent, stdin=None):
+        if stdin is not None:
+            ran.append((self.label, scripts.get(stdin)))
+        return 0, "", ""
+
+    async def is_synced(self, delay_return_until_synced=True):
+        return True
+
+    monkeypatch.setattr(aio.AsyncInstance, "command_send", command_send)
+    monkeypatch.setattr(aio.AsyncInstance, "is_synced", is_synced)
+    coin = make_coin()
+    coin.path_mn_conf.write_text(
+        f"MN001 <ip>:9319 {'k' * 50} <tx_hash> <tx_id>\n"
+        f"MN002 10.0.0.2:9319 {'k' * 50} <tx_hash> <tx_id>\n"
+    )
+    fake_vultr_api.servers["10000000"] = {
+        "SUBID": "10000000",
+        "label": "MN001",
+        "main_ip": "10.0.0.1",
+        "status": "active",
+        "server_state": "ok",
+    }
+    setup_journal = MemoryJournal()
+    # MN001 was interrupted while its server was created, MN002 after its pre_setup
+    setup_journal.record_stage("MN001", "create_requested", coin_name="GLT")
+    setup_journal.record_stage("MN002", "built", subid="10000001", ip="10.0.0.2", coin_name="GLT")
+    setup_journal.record_stage("MN002", "pre_setup", coin_name="GLT")
+
+    async def run():
+        async with fake_vultr_api.serve() as vultr:
+            await asyncio.gather(
+                *[
+                    aio.AsyncInstance(label, coin, vultr=vultr, setup_journal=setup_journal).complete_setup()
+                    for label in ["MN001", "MN002"]
+                ]
+            )
+
+    asyncio.run(run())
+
+    assert fake_vultr_api.calls == []
+    assert setup_journal.get_server_info("MN001") == ("10000000", "10.0.0.1")
+    assert setup_journal.get_unfinished() == []
+    assert sorted(ran) == [("MN001", "mn_setup.sh"), ("MN001", "pre_setup.sh"), ("MN002", "mn_setup.sh")]
+
+
+def test_setup_steps_skip_completed(make_coin, monkeypatch):
+    pre_setup_checksum = vps.get_step_checksum(pymasternode.PATH_PROJECT_ROOT / "data" / "pre_setup.sh")
+    sent = []
+
+    async def command_send(self, commands_sent, stdin=None):
+        sent.append(commands_sent)
+        if commands_sent == [vps.MARKERS_COMMAND]:
+            return 0, f"pre_setup {pre_setup_checksum}\ninstall_mn outdated\n", ""
+        return 0, "", ""
+
+    monkeypatch.setattr(aio.AsyncInstance, "command_send", command_send)
+    coin = make_coin()
+    coin.path_mn_conf.write_text(f"MN001 10.0.0.1:9319 {'k' * 50} <tx_hash> <tx_id>\n")
+    instance = aio.AsyncInstance("MN001", coin, vultr=aio.AsyncVultr("key"), setup_journal=MemoryJournal())
+    instance.ip = "10.0.0.1"
+
+    async def run():
+        return [
+            await instance.pre_setup(),
+            await instance.install_mn(),
+            await instance.install_mn(),
+            await instance.pre_setup(force=True),
+        ]
+
+    assert asyncio.run(run()) == [False, True, False, True]
+    # The markers are fetched once, every script run records its marker
+    assert sent.count([vps.MARKERS_COMMAND]) == 1
+    assert [commands[1] for commands in sent[1:]] == [
+        vps.get_marker_command("install_mn", instance.markers["install_mn"]),
+        vps.get_marker_command("pre_setup", pre_setup_checksum),
+    ]
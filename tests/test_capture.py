@@ -0,0 +1,79 @@
+#!/bin/python
+import pickle
+
+from src import vps
+from src.capture import OutputCapture, read_spill
+
+
+def test_capture_keeps_tail_in_memory():
+    capture = OutputCapture(tail_lines=3)
+    lines = (f"line {i}" for i in range(10000))
+
+    captured = capture.capture("1.2.3.4", "seq", lines, None)
+
+    assert captured.stdout == ["line 9997", "line 9998", "line 9999"]
+    assert captured.stderr == [] and captured.output_id is None
+    assert capture.find() == []
+
+
+def test_capture_spills_and_indexes(tmp_path):
+    capture = OutputCapture(tail_lines=2, path_spill_dir=tmp_path / "output")
+
+    first = capture.capture("1.2.3.4", "uptime", iter(["a", "b", "c"]), iter(["error"]))
+    capture.capture("1.2.3.5", "uptime", iter(["d"]), iter([]))
+    capture.capture("1.2.3.4", "df -h", iter(["e"]), iter([]))
+
+    assert first.stdout == ["b", "c"] and first.stderr == ["error"]
+    entries = capture.find(host="1.2.3.4")
+    assert [entry.command for entry in entries] == ["uptime", "df -h"]
+    assert entries[0].output_id == first.output_id
+    assert entries[0].stdout_lines == 3 and entries[0].stderr_lines == 1
+    assert list(read_spill(entries[0].path_stdout)) == ["a", "b", "c"]
+    assert list(read_spill(entries[0].path_stderr)) == ["error"]
+    assert [entry.host for entry in capture.find(command="uptime")] == ["1.2.3.4", "1.2.3.5"]
+    assert capture.find(host="1.2.3.4", command="uptime", since=entries[1].timestamp + 1) == []
+
+
+def test_capture_spills_same_command_in_same_millisecond(tmp_path, monkeypatch):
+    monkeypatch.setattr("src.capture.time.time", lambda: 1000.0)
+    capture = OutputCapture(path_spill_dir=tmp_path / "output")
+
+    capture.capture("1.2.3.4", "uptime", iter(["first"]), iter([]))
+    capture.capture("1.2.3.4", "uptime", iter(["second"]), iter([]))
+
+    assert [list(read_spill(entry.path_stdout)) for entry in capture.find()] == [["first"], ["second"]]
+
+
+def test_capture_pickles_settings_only(tmp_path):
+    capture = OutputCapture(tail_lines=5, path_spill_dir=tmp_path)
+    capture.capture("1.2.3.4", "uptime", iter(["a"]), iter([]))
+
+    copy = pickle.loads(pickle.dumps(capture))
+
+    assert copy.tail_lines == 5 and copy.path_spill_dir == tmp_path
+    assert [entry.command for entry in copy.find()] == ["uptime"]
+
+
+def test_run_command_captures_before_join(tmp_path, fake_ssh_client):
+    consumed = []
+
+    def stdout():
+        for line in ["a", "b", "c"]:
+            consumed.append(line)
+            yield line
+
+    class Client(fake_ssh_client):
+        def run_command(self, command, stop_on_errors=True, host_args=None):
+            output = super().run_command(command, stop_on_errors, host_args)
+            output[0].stdout = stdout()
+            return output
+
+        def join(self, output):
+            assert consumed == ["a", "b", "c"]
+            super().join(output)
+
+    capture = OutputCapture(tail_lines=1, path_spill_dir=tmp_path)
+    results = vps.run_command(["1.2.3.4"], "uptime", Client(["1.2.3.4"]), capture)
+
+    assert results["1.2.3.4"].exit_code == 0 and results["1.2.3.4"].stdout == ["c"]
+    assert capture.find(host="1.2.3.4")[0].output_id == results["1.2.3.4"].output_id
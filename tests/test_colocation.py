@@ -0,0 +1,176 @@
+#!/bin/python
+import asyncio
+import subprocess
+
+import pytest
+
+from src import aio, colocation, pymasternode, vps
+from src.journal import MemoryJournal
+
+
+def test_get_slots(tmp_path, make_coin):
+    coin = make_coin(nodes_per_host=2)
+    (tmp_path / "masternode.conf").write_text(
+        "MN001 1.2.3.4:9319 key1 <tx_hash> <tx_id>\n"
+        "MN002 1.2.3.5:9319 key2 <tx_hash> <tx_id>\n"
+        "MN003 <ip>:9319 key3 <tx_hash> <tx_id>\n"
+    )
+
+    slots = colocation.get_slots(["MN001", "MN002"], coin)
+
+    assert colocation.group_labels(["MN001", "MN002", "MN003"], coin) == [["MN001", "MN002"], ["MN003"]]
+    assert [(slot.ip, slot.genkey, slot.rpc_port, slot.unit) for slot in slots] == [
+        ("1.2.3.4", "key1", 9320, "globaltoken-mn0"), ("1.2.3.5", "key2", 9321, "globaltoken-mn1")
+    ]
+    assert [str(slot.datadir) for slot in slots] == ["/root/.globaltoken", "/root/.globaltoken-1"]
+
+
+def test_share_chain(tmp_path):
+    src, dst = tmp_path / "src", tmp_path / "dst"
+    (src / "blocks" / "index").mkdir(parents=True)
+    (src / "chainstate").mkdir()
+    for name in ["blk00000.dat", "blk00001.dat", "rev00000.dat", "rev00001.dat"]:
+        (src / "blocks" / name).write_text(name)
+    (src / "blocks" / "index" / "000001.ldb").write_text("index")
+    (src / "chainstate" / "000001.ldb").write_text("chainstate")
+    script = pymasternode.PATH_PROJECT_ROOT / "data" / "share_chain.sh"
+
+    subprocess.run(["bash", str(script), str(src), str(dst)], check=True)
+    (src / "blocks" / "blk00001.dat").write_text("appended")
+    (src / "chainstate" / "000001.ldb").write_text("changed")
+    subprocess.run(["bash", str(script), str(src), str(dst)], check=True)
+
+    assert (dst / "blocks" / "blk00000.dat").read_text() == "blk00000.dat"
+    assert (dst / "blocks" / "rev00000.dat").read_text() == "rev00000.dat"
+    # The newest files and the databases are the new node's own
+    assert (dst / "blocks" / "blk00001.dat").read_text() == "blk00001.dat"
+    assert (dst / "blocks" / "index" / "000001.ldb").read_text() == "index"
+    assert (dst / "chainstate" / "000001.ldb").read_text() == "chainstate"
+
+
+class FakeVultr:
+    def __init__(self):
+        self.ips = [
+            {"ip": "10.0.9.9", "type": "reserved"},
+            {"ip": "10.0.0.1", "type": "main_ip"},
+        ]
+
+    async def server_list_ipv4(self, subid):
+        return list(self.ips)
+
+    async def server_create_ipv4(self, subid, reboot=False):
+        # Vultr does not list additional IPs in the order they were ordered
+        self.ips.insert(0, {"ip": f"10.0.1.{10 - len(self.ips)}", "type": "secondary_ip"})
+
+
+def test_assign_ips_is_stable(tmp_path, make_coin):
+    coin = make_coin()
+    conf = "".join(f"MN00{i} <ip>:9319 key{i} <tx_hash> <tx_id>\n" for i in range(1, 4))
+    (tmp_path / "masternode.conf").write_text(conf)
+    fake_vultr = FakeVultr()
+    host = colocation.AsyncHost(
+        "HOST01", ["MN001", "MN002", "MN003"], coin, vultr=fake_vultr, setup_journal=MemoryJournal()
+    )
+    host.ip = "10.0.0.1"
+    host.subid = "10000001"
+
+    assigned = asyncio.run(host.assign_ips())
+    (tmp_path / "masternode.conf").write_text(conf)
+    fake_vultr.ips.reverse()
+
+    assert assigned == {"MN001": "10.0.0.1", "MN002": "10.0.1.7", "MN003": "10.0.1.8"}
+    assert asyncio.run(host.assign_ips()) == assigned
+    assert len(fake_vultr.ips) == 4
+
+
+def test_setup_shares_chain_once_synced(tmp_path, make_coin, monkeypatch):
+    commands = []
+    synced = []
+
+    async def command_send(self, commands_sent, stdin=None):
+        commands.append((commands_sent, stdin))
+        return 0, "", ""
+
+    async def is_synced(self, delay_return_until_synced=True):
+        return bool(synced)
+
+    monkeypatch.setattr(aio.AsyncInstance, "command_send", command_send)
+    monkeypatch.setattr(colocation.AsyncHost, "is_synced", is_synced)
+    coin = make_coin(max_memory_mb=1024)
+    (tmp_path / "masternode.conf").write_text(
+        "".join(f"MN00{i} <ip>:9319 key{i} <tx_hash> <tx_id>\n" for i in range(1, 4))
+    )
+    setup_journal = MemoryJournal()
+    host = colocation.AsyncHost(
+        "HOST01", ["MN001", "MN002", "MN003"], coin, vultr=FakeVultr(), setup_journal=setup_journal
+    )
+    host.ip = "10.0.0.1"
+    host.subid = "10000001"
+    scripts = {
+        name: vps.isolate_stdin((pymasternode.PATH_PROJECT_ROOT / "data" / name).read_text()).encode()
+        for name in ["mn_setup.sh", "mn_colocate.sh", "share_chain.sh"]
+    }
+
+    def ran():
+        return [(name, sent[0]) for sent, stdin in commands for name, script in scripts.items() if stdin == script]
+
+    asyncio.run(host.install_mn())
+    asyncio.run(host.finish_setup(delay_return_until_synced=False))
+
+    assert [name for name, _ in ran()] == ["mn_setup.sh", "mn_colocate.sh"]
+    assert "10.0.0.1:9319 key1" in ran()[0][1]
+    assert setup_journal.get_last_stage("HOST01") is None
+
+    synced.append(True)
+    asyncio.run(host.finish_setup(delay_return_until_synced=False))
+
+    assert [name for name, _ in ran()] == [
+        "mn_setup.sh", "mn_colocate.sh", "share_chain.sh", "share_chain.sh", "mn_colocate.sh", "mn_colocate.sh"
+    ]
+    assert ran()[4][1].split()[2:] == [
+        "--", "globaltoken-mn1", "/root/.globaltoken-1", "/root/.globaltoken-1/globaltoken.conf",
+        "10.0.1.7", "9319", "9321", "key2", "/root/globaltoken/bin/globaltokend",
+        "/root/globaltoken/bin/globaltoken-cli", "1024",
+    ]
+    assert (["systemctl stop globaltoken-mn0"], None) in commands
+    assert commands[-3] == (["systemctl start globaltoken-mn0"], None)
+    assert setup_journal.get_last_stage("HOST01") == "synced"
+
+
+def test_share_chain_skips_datadirs_with_chain(tmp_path, make_coin, monkeypatch):
+    commands = []
+    with_chain = ["/root/.globaltoken-1"]
+    start_exit_code = []
+
+    async def command_send(self, commands_sent, stdin=None):
+        commands.append(commands_sent[0].split()[:2])
+        if commands_sent[0].startswith("for datadir"):
+            return 0, "".join(f"{datadir}\n" for datadir in with_chain), ""
+        if commands_sent[0].startswith("systemctl start"):
+            return (start_exit_code or [0])[0], "", "unit failed"
+        return 0, "", ""
+
+    monkeypatch.setattr(aio.AsyncInstance, "command_send", command_send)
+    (tmp_path / "masternode.conf").write_text(
+        "".join(f"MN00{i} 10.0.0.{i}:9319 key{i} <tx_hash> <tx_id>\n" for i in range(1, 4))
+    )
+    coin = make_coin()
+    host = colocation.AsyncHost("HOST01", ["MN001", "MN002", "MN003"], coin, vultr=FakeVultr())
+    host.ip = "10.0.0.1"
+    slots = colocation.get_slots(host.node_labels, coin)[1:]
+
+    asyncio.run(host.share_chain(slots))
+
+    assert commands[1:] == [["systemctl", "stop"], ["bash", "-s"], ["systemctl", "start"]]
+
+    commands.clear()
+    start_exit_code.append(1)
+    with pytest.raises(RuntimeError, match="Starting globaltoken-mn0"):
+        asyncio.run(host.share_chain(slots))
+
+    commands.clear()
+    with_chain.append("/root/.globaltoken-2")
+    asyncio.run(host.share_chain(slots))
+
+    # Every data directory has a chain, the first masternode keeps running
+    assert commands == [["for", "datadir"]]
@@ -0,0 +1,99 @@
+#!/bin/python
+import pytest
+
+from src import confirmations, wallet
+
+
+class FakeChain:
+    """Answers wallet calls for a chain with transactions at fixed heights."""
+
+    def __init__(self, heights):
+        self.block_count = 100
+        self.heights = heights
+        self.calls = []
+
+    def __call__(self, method, *params):
+        self.calls.append(method)
+        if method == "getblockcount":
+            return self.block_count
+        if method == "getblockhash":
+            return params[0]
+        if method == "listsinceblock":
+            return {
+                "transactions": [
+                    {"txid": txid, "confirmations": self._confirmations(height)}
+                    for txid, height in self.heights.items()
+                    if height is None or height > params[0]
+                ]
+            }
+        if method == "gettransaction":
+            if params[0] not in self.heights:
+                raise wallet.RpcError({"code": -5, "message": "Invalid or non-wallet transaction id"})
+            return {"confirmations": self._confirmations(self.heights[params[0]])}
+
+    def _confirmations(self, height):
+        return 0 if height is None else self.block_count - height + 1
+
+
+def test_watcher_notifies_at_threshold():
+    chain = FakeChain({"tx1": None, "tx2": 100, "tx_old": 10})
+    watcher = confirmations.ConfirmationWatcher(call=chain)
+    notified = []
+
+    for txid in ("tx1", "tx2", "tx_old"):
+        watcher.track(txid, min_conf=3, subscriber=lambda txid, conf: notified.append(txid))
+
+    assert watcher.poll() == ["tx_old"]
+    assert watcher.poll() == []
+
+    chain.heights["tx1"] = 101
+    chain.block_count = 102
+    assert watcher.poll() == ["tx2"]
+
+    chain.block_count = 103
+    assert watcher.poll() == ["tx1"]
+    assert notified == ["tx_old", "tx2", "tx1"]
+    assert chain.calls.count("listsinceblock") == 3
+
+
+def test_watcher_wait_unknown_transaction():
+    chain = FakeChain({})
+    watcher = confirmations.ConfirmationWatcher(poll_interval_seconds=0.01, call=chain)
+
+    assert not watcher.wait(["unknown"], timeout=0.05)
+
+
+def test_watcher_wait_raises_failed_poll():
+    chain = FakeChain({"tx1": None})
+    watcher = confirmations.ConfirmationWatcher(poll_interval_seconds=0.01, call=chain)
+
+    def call(method, *params):
+        if method == "getblockcount" and chain.calls:
+            raise wallet.RpcError({"code": -28, "message": "Loading block index..."})
+        return chain(method, *params)
+
+    watcher._call = call
+    watcher.start()
+    try:
+        with pytest.raises(wallet.RpcError, match="Loading block index"):
+            watcher.wait(["tx1"])
+    finally:
+        watcher.stop()
+
+
+def test_watcher_checks_transaction_tracked_during_poll():
+    chain = FakeChain({"tx1": 10, "tx2": 90})
+    watcher = confirmations.ConfirmationWatcher(call=chain)
+
+    def call(method, *params):
+        # tx2 is tracked while the poll asks for tx1, after it listed the transactions to check
+        if method == "gettransaction" and "tx2" not in watcher._min_conf:
+            watcher.track("tx2", min_conf=3)
+        return chain(method, *params)
+
+    watcher._call = call
+    watcher.track("tx1", min_conf=3)
+
+    assert watcher.poll() == ["tx1"]
+    # No new block, but tx2 was not checked yet
+    assert watcher.poll() == ["tx2"]
@@ -0,0 +1,112 @@
+#!/bin/python
+import asyncio
+import http.client
+import json
+import sqlite3
+
+import pytest
+from aiohttp import web
+
+from src import client, controller, database, pymasternode, status
+from src.wallet import MasternodeListEntry
+
+HASH_A = "a" * 64
+
+
+@pytest.fixture
+def tmp_database(tmp_path, monkeypatch):
+    """Point the database module at a database in tmp_path, synced with no servers."""
+    db = sqlite3.connect(tmp_path / "server_info.db", check_same_thread=False)
+    monkeypatch.setattr(database, "DB", db)
+    monkeypatch.setattr(database, "curs", db.cursor())
+    monkeypatch.setattr(pymasternode.VULTR.server, "list", lambda: {})
+    yield database
+    db.close()
+
+
+def test_controller_answers_client(tmp_path, make_coin, tmp_database):
+    conf = tmp_path / "masternode.conf"
+    conf.write_text(f"MN001 1.2.3.4:9319 {'k' * 50} {HASH_A} 1\nMN002 <ip>:9319 {'k' * 50} <tx_hash> <tx_id>\n")
+    coin = make_coin()
+    fetches = []
+
+    def fetch():
+        fetches.append(1)
+        return {f"{HASH_A}-1": MasternodeListEntry(f"{HASH_A}-1", "ENABLED", "1.2.3.4:9319", "payee")}
+
+    instance = controller.Controller([coin])
+    instance.status_indexes["GLT"] = status.StatusIndex(coin, fetch=fetch)
+    path_socket = tmp_path / "controller.sock"
+
+    async def run():
+        server = asyncio.create_task(controller.serve(path_socket, controller=instance))
+        while "GLT" not in instance.status_refreshed:
+            await asyncio.sleep(0.01)
+
+        loop = asyncio.get_running_loop()
+        try:
+            statuses = await loop.run_in_executor(
+                None, lambda: client.request("/status", {"coin": "GLT"}, path_socket=path_socket)
+            )
+            one = await loop.run_in_executor(
+                None, lambda: client.request("/status/1.2.3.4", path_socket=path_socket)
+            )
+            with pytest.raises(RuntimeError, match="Unknown masternode"):
+                await loop.run_in_executor(
+                    None, lambda: client.request("/status/MN003", path_socket=path_socket)
+                )
+            return statuses, one
+        finally:
+            server.cancel()
+
+    statuses, one = asyncio.run(run())
+
+    assert statuses == {"MN001": "ENABLED", "MN002": status.MISSING}
+    assert one["label"] == "MN001" and one["status"] == "ENABLED"
+    # Answered from the warm index, refreshed once at startup
+    assert len(fetches) == 1
+
+
+def test_run_only_on_unix_socket(tmp_path, make_coin, tmp_database):
+    instance = controller.Controller([make_coin()])
+    instance.status_indexes["GLT"] = status.StatusIndex(make_coin(), fetch=lambda: {})
+    ran = []
+    instance._run = lambda hosts, command: ran.append(command) or {}
+    path_socket = tmp_path / "controller.sock"
+
+    def post(connection, path, content_type):
+        connection.request(
+            "POST",
+            path,
+            body=json.dumps({"labels": [], "command": "id"}),
+            headers={"Content-Type": content_type},
+        )
+        response = connection.getresponse()
+        response.read()
+        connection.close()
+        return response.status
+
+    async def run():
+        runner = web.AppRunner(instance.app())
+        await runner.setup()
+        await web.UnixSite(runner, str(path_socket)).start()
+        await web.TCPSite(runner, "127.0.0.1", 0).start()
+        port = [address for address in runner.addresses if isinstance(address, tuple)][0][1]
+        loop = asyncio.get_running_loop()
+        try:
+            return await asyncio.gather(
+                *[
+                    loop.run_in_executor(None, post, connection, path, content_type)
+                    for connection, path, content_type in [
+                        (http.client.HTTPConnection("127.0.0.1", port), "/run", "application/json"),
+                        (client.UnixHTTPConnection(path_socket), "/run", "text/plain"),
+                        (http.client.HTTPConnection("127.0.0.1", port), "/refresh", "text/plain"),
+                        (client.UnixHTTPConnection(path_socket), "/run", "application/json"),
+                    ]
+                ]
+            )
+        finally:
+            await runner.cleanup()
+
+    assert asyncio.run(run()) == [403, 415, 415, 200]
+    assert ran == ["id"]
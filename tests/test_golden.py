@@ -0,0 +1,80 @@
+#!/bin/python
+import asyncio
+
+from src import aio, golden, pymasternode, vps
+from src.journal import MemoryJournal
+
+
+def test_provision_from_golden(make_coin, monkeypatch, fake_vultr_api):
+    commands = {}
+
+    async def command_send(self, commands_sent, stdin=None):
+        commands.setdefault(self.label, []).extend(commands_sent)
+        if stdin is not None:
+            commands[self.label].append(stdin.decode())
+        return 0, "100", ""
+
+    async def send_files(self, path_from, path_to, is_dir=False):
+        commands.setdefault(self.label, []).append(f"scp {path_from.name}")
+
+    monkeypatch.setattr(aio.AsyncInstance, "command_send", command_send)
+    monkeypatch.setattr(aio.AsyncInstance, "send_files", send_files)
+
+    labels = ["MN001", "MN002", "MN003"]
+    conf = make_coin().path_mn_conf
+    conf.write_text(
+        "".join(f"{label} <ip>:9319 {label * 10} <tx_hash> <tx_id>\n" for label in labels)
+    )
+
+    async def run():
+        async with fake_vultr_api.serve() as vultr:
+            coin = make_coin(
+                sync_source={"url": f"{vultr.endpoint}/status", "height_keys": ["height"]}
+            )
+            return await golden.provision_from_golden(
+                labels, coin, vultr=vultr, setup_journal=MemoryJournal()
+            )
+
+    assert asyncio.run(run()) == [None, None, None]
+
+    creates = [params for call, params in fake_vultr_api.calls if call == "server/create"]
+    assert "SNAPSHOTID" not in creates[0]
+    assert [params.get("SNAPSHOTID") for params in creates[1:]] == ["snap1", "snap1"]
+    mn_setup = vps.isolate_stdin((pymasternode.PATH_PROJECT_ROOT / "data" / "mn_setup.sh").read_text())
+    assert mn_setup in commands["MN001"]
+    assert mn_setup not in commands["MN002"]
+    assert any("masternodeprivkey" in command and "MN002" * 10 in command for command in commands["MN002"])
+    assert conf.read_text().splitlines()[1].startswith("MN002 10.0.0.2:9319")
+
+
+def test_setup_from_snapshot_adopts_created_server(make_coin, monkeypatch, fake_vultr_api):
+    async def command_send(self, commands_sent, stdin=None):
+        return 0, "", ""
+
+    async def is_synced(self, delay_return_until_synced=True):
+        return True
+
+    monkeypatch.setattr(aio.AsyncInstance, "command_send", command_send)
+    monkeypatch.setattr(aio.AsyncInstance, "is_synced", is_synced)
+    coin = make_coin()
+    coin.path_mn_conf.write_text(f"MN001 <ip>:9319 {'k' * 50} <tx_hash> <tx_id>\n")
+    fake_vultr_api.servers["10000000"] = {
+        "SUBID": "10000000",
+        "label": "MN001",
+        "main_ip": "10.0.0.1",
+        "status": "active",
+        "server_state": "ok",
+    }
+    setup_journal = MemoryJournal()
+    setup_journal.record_stage("MN001", "create_requested", coin_name="GLT")
+
+    async def run():
+        async with fake_vultr_api.serve() as vultr:
+            instance = aio.AsyncInstance("MN001", coin, vultr=vultr, setup_journal=setup_journal)
+            await golden.setup_from_snapshot(instance, "snap1")
+
+    asyncio.run(run())
+
+    assert fake_vultr_api.calls == []
+    assert setup_journal.get_server_info("MN001") == ("10000000", "10.0.0.1")
+    assert setup_journal.get_last_stage("MN001") == "synced"
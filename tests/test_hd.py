@@ -0,0 +1,97 @@
+#!/bin/python
+import pytest
+
+from src import hd, wallet
+
+# Test vector 1 of BIP32, m/0H and its public child m/0H/1
+XPUB_MASTER = "xpub661MyMwAqRbcFtXgS5sYJABqqG9YLmC4Q1Rdap9gSE8NqtwybGhePY2gZ29ESFjqJoCu1Rupje8YtGqsefD265TMg7usUDFdp6W1EGMcet8"
+XPUB_0H = "xpub68Gmy5EdvgibQVfPdqkBBCHxA5htiqg55crXYuXoQRKfDBFA1WEjWgP6LHhwBZeNK1VTsfTFUHCdrfp1bgwQ9xv5ski8PX9rL2dZXvgGDnw"
+XPUB_0H_1 = "xpub6ASuArnXKPbfEwhqN6e3mwBcDTgzisQN1wXN9BJcM47sSikHjJf3UFHKkNAWbWMiGj7Wf5uMash7SyYq527Hqck2AxYysAA7xmALppuCkwQ"
+
+
+def test_public_key_and_address_known_vectors():
+    public_key = hd.get_public_key((1).to_bytes(32, "big"))
+
+    assert public_key.hex() == "0279be667ef9dcbbac55a06295ce870b07029bfcdb2dce28d959f2815b16f81798"
+    assert hd.p2pkh_address(public_key, b"\x00") == "1BgGZ9tcN4rm9KBzDn7KprQz87SZ26SAMH"
+    assert hd.decompress(public_key) == hd._G
+
+
+@pytest.mark.parametrize(
+    "data, digest",
+    [
+        (b"", "9c1185a5c5e9fc54612808977ee8f548b2258d31"),
+        (b"abc", "8eb208f7e05d987a9b044a8e98c6b087f15a0bfc"),
+        (b"1234567890" * 8, "9b752e45573d4b39f4dbd3323cab82bf63326bfb"),
+    ],
+)
+def test_ripemd160_known_vectors(data, digest):
+    assert hd.ripemd160(data).hex() == digest
+
+
+def test_hash160_without_openssl_ripemd160(monkeypatch):
+    def new(name, data=b""):
+        raise ValueError(f"unsupported hash type {name}")
+
+    monkeypatch.setattr(hd.hashlib, "new", new)
+    public_key = hd.get_public_key((1).to_bytes(32, "big"))
+
+    assert hd.p2pkh_address(public_key, b"\x00") == "1BgGZ9tcN4rm9KBzDn7KprQz87SZ26SAMH"
+
+
+def test_parse_and_serialize():
+    xpub = hd.ExtendedPublicKey.parse(XPUB_MASTER)
+
+    assert xpub.depth == 0 and xpub.serialize() == XPUB_MASTER
+    assert hd.p2pkh_address(xpub.public_key, b"\x00") == "15mKKb2eos1hWa6tisdPwwDC1a5J1y9nma"
+
+
+def test_derive_child_known_vector():
+    child = hd.ExtendedPublicKey.parse(XPUB_0H).derive_path("1")
+
+    assert child.serialize() == XPUB_0H_1
+
+
+def test_derive_child_rejects_hardened():
+    with pytest.raises(ValueError):
+        hd.ExtendedPublicKey.parse(XPUB_0H).derive_child(hd.HARDENED)
+
+
+def test_derive_addresses_matches_single_derivation():
+    xpub = hd.ExtendedPublicKey.parse(XPUB_0H)
+    addresses = hd.derive_addresses(xpub, "0/{index}", [3, 1], b"\x4c")
+
+    assert addresses[1] == hd.p2pkh_address(xpub.derive_path("0/1").public_key, b"\x4c")
+    assert addresses[3] == hd.p2pkh_address(xpub.derive_path("0/3").public_key, b"\x4c")
+    assert all(address.startswith("X") and len(address) == 34 for address in addresses.values())
+
+
+def test_wallet_derive_addresses_by_label_iterator(make_coin):
+    coin = make_coin(collateral_xpub=XPUB_0H, address_version="4c")
+    addresses = wallet.derive_addresses(["MN001", "MN002"], "MN###", coin)
+
+    expected = hd.derive_addresses(hd.ExtendedPublicKey.parse(XPUB_0H), "0/{index}", [1, 2], b"\x4c")
+    assert {label: str(address) for label, address in addresses.items()} == {
+        "MN001": expected[1], "MN002": expected[2]
+    }
+    with pytest.raises(ValueError):
+        wallet.derive_addresses(["OTHER"], "MN###", coin)
+
+
+def test_import_watch_only_in_one_batch(make_coin, monkeypatch):
+    batches = []
+
+    def rpc_batch(calls, coin=None):
+        batches.append(calls)
+        return [
+            {"result": None, "error": {"message": "failed"} if params[1] == "MN002" else None}
+            for method, params in calls
+        ]
+
+    monkeypatch.setattr(wallet, "rpc_batch", rpc_batch)
+    coin = make_coin(collateral_xpub=XPUB_0H, address_version="4c", rpc_port=9320)
+    addresses = wallet.derive_addresses(["MN001", "MN002"], "MN###", coin)
+
+    assert wallet.import_watch_only(addresses, coin=coin) == {"MN002": "failed"}
+    assert len(batches) == 1
+    assert batches[0][0] == ("importaddress", [str(addresses["MN001"]), "MN001", False])
@@ -11,3 +11,23 @@ def test_count_consecutive():
 def test_count_consecutive_none():
     result = helpers.count_successive_repetitions("F#o##o###", "*")
     assert result.values == [0]
+
+
+def test_label_scheme_round_trip():
+    scheme = helpers.LabelScheme("Coin-W##-MN###")
+    assert scheme.format(1234) == "Coin-W01-MN234"
+    assert scheme.parse("Coin-W01-MN234") == 1234
+    assert scheme.format(1234567) == "Coin-W1234-MN567"
+    assert scheme.parse("Coin-W1234-MN567") == 1234567
+    assert scheme.parse("Coin-W01-MN23") is None
+    assert list(scheme.labels(9, 10)) == ["Coin-W00-MN009", "Coin-W00-MN010"]
+
+
+def test_label_index_allocate():
+    scheme = helpers.LabelScheme("MN###")
+    index = scheme.index(["MN000", "MN001", "MN002", "MN004", "MN005", "Other"])
+    assert index.next_free() == 3
+    assert index.next_free(4) == 6
+    assert list(index.gaps()) == [(3, 3)]
+    assert index.allocate(3) == ["MN003", "MN006", "MN007"]
+    assert index.next_free() == 8
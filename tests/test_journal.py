@@ -0,0 +1,90 @@
+#!/bin/python
+import sqlite3
+
+import pytest
+
+from src import aio, journal, vps
+from src.journal import MemoryJournal
+
+
+@pytest.fixture
+def tmp_journal(tmp_path, monkeypatch):
+    """Point the journal module at a database in tmp_path."""
+    db = journal.connect(tmp_path / "setup_journal.db")
+    monkeypatch.setattr(journal, "DB", db)
+    monkeypatch.setattr(journal, "curs", db.cursor())
+    yield journal
+    db.close()
+
+
+def test_connect_migrates_old_journal(tmp_path):
+    path = tmp_path / "setup_journal.db"
+    db = sqlite3.connect(path)
+    db.execute(
+        "CREATE TABLE journal("
+        "label TEXT NOT NULL, stage TEXT NOT NULL, subid TEXT, ip TEXT, timestamp REAL NOT NULL)"
+    )
+    db.execute("INSERT INTO journal VALUES('MN001', 'built', '10000001', '10.0.0.1', 0)")
+    db.commit()
+    db.close()
+
+    db = journal.connect(path)
+    assert db.execute("SELECT label, spare, coin FROM journal").fetchall() == [("MN001", 0, None)]
+    db.close()
+
+
+@pytest.mark.parametrize("setup_journal", ["module", "memory"])
+def test_get_unfinished_by_coin(setup_journal, request):
+    setup_journal = request.getfixturevalue("tmp_journal") if setup_journal == "module" else MemoryJournal()
+    setup_journal.record_stage("GLT-MN001", "built", coin_name="GLT")
+    setup_journal.record_stage("SMART-MN001", "built", coin_name="SMART")
+    setup_journal.record_stage("OLD-MN001", "built")
+    setup_journal.record_stage("GLT-SPARE-0000", "pre_setup", coin_name="GLT", spare=True)
+
+    assert setup_journal.get_unfinished("GLT") == ["GLT-MN001"]
+    assert setup_journal.get_unfinished("SMART") == ["SMART-MN001"]
+    assert setup_journal.get_unfinished() == ["GLT-MN001", "SMART-MN001", "OLD-MN001"]
+
+
+def test_record_stage(tmp_journal):
+    assert tmp_journal.get_last_stage("MN001") is None
+    assert tmp_journal.get_server_info("MN001") == (None, None)
+
+    tmp_journal.record_stage("MN001", "create_requested", coin_name="GLT")
+    tmp_journal.record_stage("MN001", "created", subid="10000001", coin_name="GLT")
+    tmp_journal.record_stage("MN001", "built", ip="10.0.0.1", coin_name="GLT")
+
+    assert tmp_journal.get_last_stage("MN001") == "built"
+    assert tmp_journal.is_completed("MN001", "created")
+    assert not tmp_journal.is_completed("MN001", "pre_setup")
+    assert tmp_journal.get_server_info("MN001") == ("10000001", "10.0.0.1")
+    with pytest.raises(ValueError):
+        tmp_journal.record_stage("MN001", "unknown")
+
+
+def test_get_unfinished_and_forget(tmp_journal):
+    for label in ("MN002", "MN001", "MN003"):
+        tmp_journal.record_stage(label, "created", coin_name="GLT")
+    tmp_journal.record_stage("MN003", "synced", coin_name="GLT")
+
+    assert tmp_journal.get_unfinished() == ["MN002", "MN001"]
+
+    tmp_journal.forget("MN002")
+    assert tmp_journal.get_last_stage("MN002") is None
+    assert tmp_journal.get_unfinished() == ["MN001"]
+
+
+def test_resume_setup(tmp_journal, make_coin, monkeypatch):
+    resumed = []
+
+    async def complete_setups(labels, coin=None, max_concurrency=100, delay_return_until_synced=True):
+        resumed.append((labels, coin.name, max_concurrency, delay_return_until_synced))
+        return [None] * len(labels)
+
+    monkeypatch.setattr(aio, "complete_setups", complete_setups)
+    tmp_journal.record_stage("MN001", "pre_setup", coin_name="GLT")
+    tmp_journal.record_stage("SMART-MN001", "pre_setup", coin_name="SMART")
+    tmp_journal.record_stage("MN002", "installed", coin_name="GLT")
+
+    assert vps.resume_setup(coin=make_coin(), delay_return_until_synced=False, max_concurrency=5) == [None, None]
+    assert resumed == [(["MN001", "MN002"], "GLT", 5, False)]
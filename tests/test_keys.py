@@ -0,0 +1,48 @@
+#!/bin/python
+import pytest
+
+from src import keys
+
+# The example of the Bitcoin wiki's "Wallet import format", version 0x80
+SECRET = bytes.fromhex("0C28FCA386C7A227600B2FE50B7CAE11EC86D3BF1FBE471BE89827E19D72AA1D")
+WIF = "5HueCGU8rMjxEXxiPuD5BDku4MkFqeZyd4dZ1jvhTVqvbTLvyTJ"
+WIF_COMPRESSED = "KwdMAjGmerYanjeui5SHS7JkmpZvVipYvB2LJGU1ZxJwYvP98617"
+
+
+def test_encode_wif_known_vectors():
+    assert keys.encode_wif(SECRET, b"\x80") == WIF
+    assert keys.encode_wif(SECRET, b"\x80", compressed=True) == WIF_COMPRESSED
+
+
+def test_decode_wif_known_vectors():
+    assert keys.decode_wif(WIF, b"\x80") == (SECRET, False)
+    assert keys.decode_wif(WIF_COMPRESSED, b"\x80") == (SECRET, True)
+
+
+def test_decode_wif_rejects_invalid():
+    with pytest.raises(ValueError):
+        keys.decode_wif(WIF[:-1] + "U", b"\x80")
+    with pytest.raises(ValueError):
+        keys.decode_wif(WIF, b"\xcc")
+    with pytest.raises(ValueError):
+        keys.decode_wif(keys.encode_wif(b"\x00" * 32, b"\x80"), b"\x80")
+
+
+def test_base58_leading_zeros():
+    assert keys.base58_encode(b"\x00\x00\x01") == "112"
+    assert keys.base58_decode("112") == b"\x00\x00\x01"
+
+
+def test_generate_genkeys(make_coin):
+    coin = make_coin(secret_key_version="cc")
+    genkeys = keys.generate_genkeys(2000, coin)
+
+    assert len({str(genkey) for genkey in genkeys}) == 2000
+    assert all(keys.is_valid_genkey(str(genkey), coin) for genkey in genkeys)
+    # The daemon's uncompressed genkeys of version 0xcc start with 7
+    assert all(str(genkey).startswith("7") and len(genkey) == 51 for genkey in genkeys)
+
+
+def test_generate_genkeys_needs_version(make_coin):
+    with pytest.raises(ValueError):
+        keys.generate_genkeys(1, make_coin(secret_key_version=""))
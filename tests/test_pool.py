@@ -0,0 +1,85 @@
+#!/bin/python
+import asyncio
+
+from src import aio, pool
+from src.journal import MemoryJournal
+
+
+def test_warm_pool(make_coin, monkeypatch, fake_vultr_api):
+    scripts = []
+
+    async def command_send(self, commands_sent, stdin=None):
+        if stdin is not None:
+            scripts.append(self.label)
+        return 0, "", ""
+
+    async def forget_host_key(self, ip):
+        pass
+
+    monkeypatch.setattr(aio.AsyncInstance, "command_send", command_send)
+    monkeypatch.setattr(pool.WarmPool, "_forget_host_key", forget_host_key)
+
+    coin = make_coin()
+    setup_journal = MemoryJournal()
+
+    async def run():
+        async with fake_vultr_api.serve() as vultr:
+            warm_pool = pool.WarmPool(
+                coin, size=2, vultr=vultr, setup_journal=setup_journal, reinstall_settle_seconds=0
+            )
+            assert await warm_pool.refill() == [None, None]
+            assert sorted(await warm_pool.get_ready()) == ["GLT-SPARE-0000", "GLT-SPARE-0001"]
+            assert setup_journal.get_unfinished() == []
+
+            instance = await warm_pool.claim("GLT-MN0001")
+            claimed_stage = setup_journal.get_last_stage("GLT-MN0001")
+            assert setup_journal.get_unfinished() == ["GLT-MN0001"]
+            await warm_pool._refill_task
+            spares = await warm_pool.get_spares()
+
+            warm_pool.size = 3
+            assert await warm_pool.recycle(instance)
+            await asyncio.gather(*warm_pool._preparing.values())
+            recycled = await warm_pool.get_ready()
+
+            retired = warm_pool._get_instance("GLT-SPARE-0001")
+            retired.subid = spares["GLT-SPARE-0001"]["SUBID"]
+            destroyed = await warm_pool.recycle(retired)
+            await warm_pool.close()
+            return instance, claimed_stage, spares, recycled, destroyed
+
+    instance, claimed_stage, spares, recycled, destroyed = asyncio.run(run())
+
+    assert str(instance.subid) == "10000000" and str(instance.ip) == "10.0.0.1"
+    assert claimed_stage == "pre_setup"
+    assert setup_journal.get_last_stage("GLT-MN0001") is None
+    assert sorted(spares) == ["GLT-SPARE-0000", "GLT-SPARE-0001"]
+    assert spares["GLT-SPARE-0000"]["SUBID"] == "10000002"
+    assert scripts.count("GLT-SPARE-0000") == 2
+    assert sorted(recycled) == ["GLT-SPARE-0000", "GLT-SPARE-0001", "GLT-SPARE-0002"]
+    assert ("server/reinstall", {"SUBID": "10000000"}) in fake_vultr_api.calls
+    assert destroyed is False
+    assert ("server/destroy", {"SUBID": "10000001"}) in fake_vultr_api.calls
+
+
+def test_claim_failed_relabel(make_coin):
+    class FailingVultr:
+        async def server_list(self):
+            return {"10000001": {"SUBID": "10000001", "label": "GLT-SPARE-0000", "tag": "GLT", "main_ip": "10.0.0.1"}}
+
+        async def server_label_set(self, subid, label):
+            raise RuntimeError("Vultr API error 503 on server/label_set")
+
+    coin = make_coin()
+    setup_journal = MemoryJournal()
+    setup_journal.record_stage("GLT-SPARE-0000", "pre_setup", spare=True)
+    warm_pool = pool.WarmPool(coin, size=1, vultr=FailingVultr(), setup_journal=setup_journal)
+
+    async def claim():
+        try:
+            await warm_pool.claim("GLT-MN0001")
+        except RuntimeError:
+            return await warm_pool.get_ready()
+
+    assert asyncio.run(claim()) == ["GLT-SPARE-0000"]
+    assert setup_journal.get_last_stage("GLT-MN0001") is None
@@ -0,0 +1,80 @@
+#!/bin/python
+import asyncio
+import socket
+import struct
+
+from src import probe
+
+MAGIC = bytes.fromhex("f9beb4d9")
+
+
+def get_closed_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def answer_version(reader, writer):
+    command, payload = await probe.read_message(reader, MAGIC)
+    assert command == "version"
+    writer.write(probe.build_message(MAGIC, "version", struct.pack("<i", 70210) + payload[4:]))
+    await writer.drain()
+    writer.close()
+
+
+async def probe_local_listeners():
+    server = await asyncio.start_server(answer_version, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    closed_port = get_closed_port()
+    nodes = [(f"MN{i:04}", "127.0.0.1", port) for i in range(200)]
+    nodes.append(("Closed", "127.0.0.1", closed_port))
+
+    async with server:
+        plain = await probe.probe_all(nodes, max_concurrency=50, timeout_seconds=2.0)
+        handshake = await probe.probe_all(nodes, MAGIC, max_concurrency=50, timeout_seconds=2.0)
+    return plain, handshake
+
+
+def test_probe_all():
+    plain, handshake = asyncio.run(probe_local_listeners())
+
+    assert len(plain) == 201
+    assert plain["MN0000"].reachable and plain["MN0000"].rtt_seconds is not None
+    assert plain["MN0000"].version is None
+    assert not plain["Closed"].reachable and plain["Closed"].error
+    assert all(result.version == 70210 for label, result in handshake.items() if label != "Closed")
+
+
+def test_probe_wrong_magic():
+    async def run():
+        server = await asyncio.start_server(answer_version, "127.0.0.1", 0)
+        async with server:
+            return await probe.probe(
+                "127.0.0.1", server.sockets[0].getsockname()[1], magic=b"\0\0\0\0", timeout_seconds=2.0
+            )
+
+    result = asyncio.run(run())
+    assert result.rtt_seconds is not None and not result.reachable
+
+
+def test_probe_fleet_uses_conf_ports(make_coin):
+    async def run():
+        server = await asyncio.start_server(answer_version, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        coin = make_coin(node_port=get_closed_port())
+        coin.path_mn_conf.write_text(
+            f"MN001 127.0.0.1:{port} genkey txhash 0\n"
+            f"MN002 127.0.0.1:{get_closed_port()} genkey txhash 0\n"
+            "MN003 <ip>:9319 genkey <tx_hash> <tx_id>\n"
+            "MN004 127.0.0.1:<port> genkey txhash 0\n"
+            "MN005 [<ip>]:9319 genkey txhash 0\n"
+        )
+        async with server:
+            return await probe.async_probe_fleet(coin, timeout_seconds=2.0)
+
+    results = asyncio.run(run())
+
+    assert sorted(results) == ["MN001", "MN002", "MN004", "MN005"]
+    assert results["MN001"].reachable and not results["MN002"].reachable
+    assert results["MN004"].error == "Invalid address: 127.0.0.1:<port>"
+    assert not results["MN005"].reachable and results["MN005"].port is None
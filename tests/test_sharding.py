@@ -0,0 +1,67 @@
+#!/bin/python
+import os
+from collections import Counter
+
+from src import sharding
+
+
+def get_pids(targets, suffix):
+    return {label: (os.getpid(), target + suffix) for label, target in targets.items()}
+
+
+def fail(targets):
+    raise ValueError("unreachable")
+
+
+def test_hash_ring_is_consistent():
+    labels = [f"MN{i:05}" for i in range(10000)]
+    four = sharding.HashRing(4)
+    five = sharding.HashRing(5)
+
+    counts = Counter(four.get_shard(label) for label in labels)
+    assert all(1500 < count < 3500 for count in counts.values())
+
+    moved = sum(four.get_shard(label) != five.get_shard(label) for label in labels)
+    assert moved < 0.3 * len(labels)
+
+
+def test_sharded_executor_merges_results():
+    targets = {f"MN{i:03}": f"10.0.0.{i}" for i in range(100)}
+
+    with sharding.ShardedExecutor(workers=3) as executor:
+        first = dict(executor.map_shards(get_pids, targets, "!"))
+        second = dict(executor.map_shards(get_pids, targets, "?"))
+        failed = dict(executor.map_shards(fail, {"MN001": "10.0.0.1"}))
+
+    assert first.keys() == targets.keys()
+    assert first["MN042"][1] == "10.0.0.42!"
+    assert len({pid for pid, _ in first.values()}) == 3
+    # Every label stays on its worker
+    assert all(first[label][0] == second[label][0] for label in targets)
+    assert isinstance(failed["MN001"], ValueError)
+
+
+def test_run_command_and_script_in_worker(tmp_path, fake_ssh_client, monkeypatch):
+    clients = []
+
+    def get_client(hosts):
+        clients.append(fake_ssh_client(hosts, lambda host, command: (0, [host], [])))
+        return clients[-1]
+
+    monkeypatch.setattr(sharding.vps, "get_client", get_client)
+    monkeypatch.setattr(sharding, "_clients", sharding.OrderedDict())
+    script = tmp_path / "script.sh"
+    script.write_text("echo $1\n")
+    targets = {"MN002": "10.0.0.2", "MN001": "10.0.0.1"}
+
+    commands = sharding._run_command(targets, "uptime", None)
+    scripts = sharding._run_script(targets, script, {"MN001": ["a"]}, {"MN002": "touch done"}, None)
+
+    assert {label: result.stdout for label, result in commands.items()} == {
+        "MN002": ["10.0.0.2"], "MN001": ["10.0.0.1"]
+    }
+    assert all(result.exit_code == 0 for result in scripts.values())
+    # The client of the shard is kept connected between calls
+    assert len(clients) == 1
+    assert clients[0].commands[2][1].startswith("bash -s -- a <<")
+    assert clients[0].commands[3][1].startswith("bash -s --  <<") and "&& touch done" in clients[0].commands[3][1]
@@ -0,0 +1,40 @@
+#!/bin/python
+from src import simulation
+
+
+def fixed(seconds, failure_rate=0.0):
+    return simulation.DependencyModel(lambda rng: seconds, failure_rate)
+
+
+def test_simulate_projects_wall_time(make_coin):
+    models = {name: fixed(1.0) for name in simulation.DEFAULT_MODELS}
+    models.update({"server_build": fixed(100.0), "chain_sync": fixed(50.0)})
+
+    report = simulation.simulate(20, make_coin(), max_concurrency=5, models=models, vultr_requests_per_second=100)
+
+    assert report.succeeded == 20 and report.failed == 0
+    assert report.api_calls["vultr:/v1/server/create"] == 20
+    assert report.peak_concurrency == 5
+    # 4 waves of at least the build time and the chain sync
+    assert report.wall_time_seconds > 4 * 150
+
+
+def test_simulate_failures(make_coin):
+    models = {"mn_setup.sh": fixed(1.0, failure_rate=1.0)}
+
+    report = simulation.simulate(10, make_coin(), models=models)
+
+    assert report.failed == 10
+    assert "pre_setup.sh" in report.api_calls
+
+
+def test_simulate_same_seed_same_report(make_coin):
+    models = {name: simulation.DependencyModel.lognormal(1.0, 0.5, 0.05) for name in simulation.DEFAULT_MODELS}
+
+    reports = [
+        simulation.simulate(50, make_coin(), max_concurrency=10, models=models, seed=1)._replace(real_time_seconds=0)
+        for _ in range(3)
+    ]
+
+    assert reports[0] == reports[1] == reports[2]
+    assert 0 < reports[0].failed < 50
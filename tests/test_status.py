@@ -0,0 +1,53 @@
+#!/bin/python
+import time
+
+from src import status
+from src.wallet import MasternodeListEntry
+
+HASH_A = "a" * 64
+HASH_B = "b" * 64
+
+
+def make_index(make_coin, masternode_list):
+    coin = make_coin()
+    coin.path_mn_conf.write_text(
+        f"MN001 1.2.3.4:9319 {'k' * 50} {HASH_A} 1\n"
+        f"MN002 1.2.3.5:9319 {'k' * 50} {HASH_B} 0\n"
+    )
+    return status.StatusIndex(coin, fetch=lambda: dict(masternode_list))
+
+
+def test_status_index_queries(make_coin):
+    masternode_list = {
+        f"{HASH_A}-1": MasternodeListEntry(f"{HASH_A}-1", "ENABLED", "1.2.3.4:9319", "payee"),
+    }
+    index = make_index(make_coin, masternode_list)
+    index.refresh()
+
+    assert index.enabled() == ["MN001"]
+    assert index.missing() == ["MN002"]
+    assert index.get_status("1.2.3.4") == "ENABLED"
+    assert index.get_status(f"{HASH_A}-1") == "ENABLED"
+    assert index.get_status("MN002") == status.MISSING
+
+
+def test_status_index_changed_since(make_coin):
+    masternode_list = {
+        f"{HASH_A}-1": MasternodeListEntry(f"{HASH_A}-1", "ENABLED", "1.2.3.4:9319", "payee"),
+    }
+    index = make_index(make_coin, masternode_list)
+    index.refresh()
+    checkpoint = time.time()
+
+    assert index.refresh() == []
+    assert index.changed_since(checkpoint) == []
+
+    masternode_list[f"{HASH_B}-0"] = MasternodeListEntry(
+        f"{HASH_B}-0", "PRE_ENABLED", "1.2.3.5:9319", "payee"
+    )
+    del masternode_list[f"{HASH_A}-1"]
+    index.refresh()
+
+    assert sorted(index.changed_since(checkpoint)) == ["MN001", "MN002"]
+    assert index.missing() == ["MN001"]
+    assert index.with_status("PRE_ENABLED") == ["MN002"]
@@ -0,0 +1,93 @@
+#!/bin/python
+import asyncio
+from pathlib import PosixPath
+
+import pytest
+
+from src import aio, upgrade
+
+
+def run_upgrade(tmp_path, make_coin, monkeypatch, broken_labels, hanging_labels=(), **kwargs):
+    commands = {}
+
+    async def command_send(self, commands_sent, stdin=None):
+        commands.setdefault(self.label, []).extend(commands_sent)
+        if any(command.endswith("bin.new /root/globaltoken/bin") for command in commands_sent):
+            if self.label in broken_labels:
+                return 1, "", "daemon crashed"
+            if self.label in hanging_labels:
+                await asyncio.sleep(3600)
+        return 0, "100", ""
+
+    async def send_files(self, path_from, path_to, is_dir=False):
+        commands.setdefault(self.label, []).append(f"scp {path_to}")
+
+    async def is_synced(self, delay_return_until_synced=True):
+        return True
+
+    monkeypatch.setattr(aio.AsyncInstance, "command_send", command_send)
+    monkeypatch.setattr(aio.AsyncInstance, "send_files", send_files)
+    monkeypatch.setattr(aio.AsyncInstance, "is_synced", is_synced)
+
+    labels = [f"MN{i:03}" for i in range(10)]
+    conf = tmp_path / "masternode.conf"
+    conf.write_text(
+        "".join(f"{label} 10.0.0.{i}:9319 genkey txhash 0\n" for i, label in enumerate(labels))
+    )
+    coin = make_coin()
+
+    async def run():
+        async with aio.AsyncVultr("key") as vultr:
+            return await upgrade.rolling_upgrade(
+                labels, PosixPath(tmp_path), coin, vultr=vultr, health_interval_seconds=0.01, **kwargs
+            )
+
+    return asyncio.run(run()), commands
+
+
+def test_rolling_upgrade_completes(tmp_path, make_coin, monkeypatch):
+    report, commands = run_upgrade(tmp_path, make_coin, monkeypatch, {"MN004"}, wave_size=3, max_failure_rate=0.2)
+
+    assert report.state == upgrade.COMPLETED
+    assert len(report.upgraded) == 9 and report.failed == ["MN004"]
+    assert report.rolled_back == ["MN004"]
+    assert "scp /root/globaltoken/bin.new" in commands["MN000"]
+
+
+def test_rolling_upgrade_pauses(tmp_path, make_coin, monkeypatch):
+    report, commands = run_upgrade(tmp_path, make_coin, monkeypatch, {"MN003", "MN004"}, wave_size=3)
+
+    assert report.state == upgrade.PAUSED
+    assert report.upgraded == ["MN000", "MN001", "MN002", "MN005"]
+    assert report.pending == ["MN006", "MN007", "MN008", "MN009"]
+    assert "MN006" not in commands
+
+
+def test_rolling_upgrade_rolls_back(tmp_path, make_coin, monkeypatch):
+    report, _ = run_upgrade(tmp_path, make_coin, monkeypatch, {"MN003", "MN004"}, wave_size=3, rollback=True)
+
+    assert report.state == upgrade.ROLLED_BACK
+    assert report.upgraded == []
+    assert sorted(report.rolled_back) == ["MN000", "MN001", "MN002", "MN003", "MN004", "MN005"]
+
+
+def test_rolling_upgrade_times_out_hanging_node(tmp_path, make_coin, monkeypatch):
+    report, _ = run_upgrade(
+        tmp_path, make_coin, monkeypatch, set(), {"MN001"}, wave_size=5, max_failure_rate=0.5, health_timeout_seconds=0.1
+    )
+
+    assert report.state == upgrade.COMPLETED
+    assert report.failed == ["MN001"] and report.rolled_back == ["MN001"]
+
+
+def test_rolling_upgrade_rejects_colocated_masternodes(tmp_path, make_coin):
+    with pytest.raises(ValueError, match="colocated"):
+        asyncio.run(upgrade.rolling_upgrade(["MN000"], PosixPath(tmp_path), make_coin(nodes_per_host=2)))
+
+
+def test_rolling_upgrade_rejects_labels_without_ip(tmp_path, make_coin):
+    coin = make_coin()
+    coin.path_mn_conf.write_text("MN000 10.0.0.1:9319 genkey txhash 0\nMN001 <ip>:9319 genkey <tx_hash> <tx_id>\n")
+
+    with pytest.raises(ValueError, match="MN001, MN002"):
+        asyncio.run(upgrade.rolling_upgrade(["MN000", "MN001", "MN002"], PosixPath(tmp_path), coin))
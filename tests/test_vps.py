@@ -0,0 +1,121 @@
+#!/bin/python
+import subprocess
+
+from src import vps
+
+
+def test_get_script_command(tmp_path):
+    script = tmp_path / "script.sh"
+    script.write_text('echo "$# $1|$2"\necho "100%"\n')
+
+    command = vps.get_script_command(script) % ("'a b' c", "&& echo marker")
+    output = subprocess.run(["bash", "-c", command], capture_output=True, text=True).stdout
+
+    assert output.splitlines() == ["2 a b|c", "100%", "marker"]
+
+
+def test_get_script_command_failure_skips_then(tmp_path):
+    script = tmp_path / "script.sh"
+    script.write_text("exit 3\n")
+
+    command = vps.get_script_command(script) % ("", "&& echo marker")
+    process = subprocess.run(["bash", "-c", command], capture_output=True, text=True)
+
+    assert process.returncode == 3 and process.stdout == ""
+
+
+def test_get_script_command_isolates_stdin(tmp_path):
+    script = tmp_path / "script.sh"
+    script.write_text("cat\necho done\n")
+
+    command = vps.get_script_command(script) % ("", "")
+    output = subprocess.run(["bash", "-c", command], capture_output=True, text=True).stdout
+
+    assert output == "done\n"
+
+
+def test_run_command_reads_list_output(fake_ssh_client):
+    client = fake_ssh_client(
+        ["10.0.0.1", "10.0.0.2"],
+        lambda host, command: (0, [host], []) if host == "10.0.0.1" else (1, [], ["failed"]),
+    )
+
+    results = vps.run_command(["10.0.0.1", "10.0.0.2"], "hostname", client)
+
+    assert results == {
+        "10.0.0.1": vps.ScriptResult(0, ["10.0.0.1"], [], None),
+        "10.0.0.2": vps.ScriptResult(1, [], ["failed"], None),
+    }
+
+
+def test_run_script_passes_host_args(tmp_path, fake_ssh_client):
+    script = tmp_path / "script.sh"
+    script.write_text("echo $1\n")
+    client = fake_ssh_client(["10.0.0.1", "10.0.0.2"])
+
+    results = vps.run_script(
+        ["10.0.0.1", "10.0.0.2"], script, [["a b"], ["c"]], then="touch done", client=client
+    )
+
+    assert [result.exit_code for result in results.values()] == [0, 0]
+    assert "'a b'" in client.commands[0][1] and "&& touch done" in client.commands[0][1]
+    assert client.commands[1][1].startswith("bash -s -- c <<")
+
+
+def get_instances(make_coin, tmp_path, count):
+    coin = make_coin()
+    (tmp_path / "masternode.conf").write_text(
+        "".join(f"MN00{i} 10.0.0.{i}:9319 key{i} <tx_hash> <tx_id>\n" for i in range(1, count + 1))
+    )
+    instances = []
+    for i in range(1, count + 1):
+        instance = vps.Instance(f"MN00{i}", coin)
+        instance.ip = f"10.0.0.{i}"
+        instances.append(instance)
+
+    return instances
+
+
+def test_gather_markers(tmp_path, make_coin, fake_ssh_client, monkeypatch):
+    instances = get_instances(make_coin, tmp_path, 2)
+
+    def replies(host, command):
+        return (0, ["pre_setup abc", "install_mn def"], []) if host == "10.0.0.1" else (0, [], [])
+
+    monkeypatch.setattr(vps, "get_client", lambda hosts: fake_ssh_client(hosts, replies))
+
+    markers = vps.gather_markers(instances)
+
+    assert markers == {"10.0.0.1": {"pre_setup": "abc", "install_mn": "def"}, "10.0.0.2": {}}
+    assert instances[0].is_step_done("install_mn", "def")
+    assert not instances[1].is_step_done("pre_setup", "abc")
+
+
+def test_apply_setup_skips_completed_and_failed(tmp_path, make_coin, fake_ssh_client, monkeypatch):
+    instances = get_instances(make_coin, tmp_path, 3)
+    path_data = vps.pymasternode.PATH_PROJECT_ROOT / "data"
+    pre_setup = vps.get_step_checksum(path_data / "pre_setup.sh")
+    install_mn = vps.get_step_checksum(path_data / "mn_setup.sh", "MN001 10.0.0.1:9319 key1 <tx_hash> <tx_id>")
+    clients = []
+
+    def replies(host, command):
+        if "basename" in command:
+            return (0, [f"pre_setup {pre_setup}", f"install_mn {install_mn}"], []) if host == "10.0.0.1" else (0, [], [])
+        if "pre_setup" in command and host == "10.0.0.3":
+            return 1, [], ["apt failed"]
+        return 0, [], []
+
+    def get_client(hosts):
+        clients.append(fake_ssh_client(hosts, replies))
+        return clients[-1]
+
+    monkeypatch.setattr(vps, "get_client", get_client)
+
+    results = vps.apply_setup(instances)
+
+    assert [client.hosts for client in clients] == [
+        ["10.0.0.1", "10.0.0.2", "10.0.0.3"], ["10.0.0.2", "10.0.0.3"], ["10.0.0.2"]
+    ]
+    assert "MN002" in clients[2].commands[0][1]
+    assert results["10.0.0.2"].exit_code == 0 and results["10.0.0.3"].stderr == ["apt failed"]
+    assert instances[1].markers["install_mn"] and "install_mn" not in instances[2].markers
@@ -1,5 +1,9 @@
 #!/bin/python
 import subprocess
+import threading
+import time
+
+import pytest
 
 from src import wallet
 
@@ -37,6 +41,182 @@ def setup_module():
         assert generated_label == "COINW001MN100"
 
 
+def test_parse_mn_conf():
+    entries = wallet.parse_mn_conf(
+        [
+            "# Format: alias IP:port masternodeprivkey collateral_output_txid collateral_output_index\n",
+            "\n",
+            f"MN001 1.2.3.4:9319 {'k' * 50} {'a' * 64} 1\n",
+            "MN002 <ip>:9319 genkey <tx_hash> <tx_id> <address=addr>\n",
+            "MN003 5.6.7.8:9319\n",
+        ]
+    )
+    assert [entry.label for entry in entries] == ["MN001", "MN002", "MN003"]
+    assert entries[0].txhash == "a" * 64 and entries[0].txindex == "1"
+    assert entries[2].genkey is None
+
+
+def test_parse_masternode_list():
+    masternode_list = wallet.parse_masternode_list(
+        {
+            f"{'a' * 64}-1": "  ENABLED 70208 payee1 1512345678 123456 1512345000 12345 1.2.3.4:9319",
+            f"COutPoint({'b' * 64}, 0)": " NEW_START_REQUIRED 70208 payee2 0 0 0 0 5.6.7.8:9319",
+        }
+    )
+    assert masternode_list[f"{'a' * 64}-1"].status == "ENABLED"
+    assert masternode_list[f"{'a' * 64}-1"].address == "1.2.3.4:9319"
+    assert masternode_list[f"{'b' * 64}-0"].status == "NEW_START_REQUIRED"
+    assert masternode_list[f"{'b' * 64}-0"].payee == "payee2"
+
+
+def test_fill_in_outpoints(make_coin):
+    coin = make_coin()
+    conf = coin.path_mn_conf
+    conf.write_text(
+        f"MN001 <ip>:9319 {'k' * 50} <tx_hash> <tx_id> <address=addr1>\n"
+        f"MN002 <ip>:9319 {'k' * 50} <tx_hash> <tx_id> <address=addr2>\n"
+    )
+
+    wallet.fill_in_outpoints({"MN002": ("a" * 64, 3)}, coin)
+
+    lines = conf.read_text().splitlines()
+    assert lines[0].endswith("<tx_hash> <tx_id> <address=addr1>")
+    assert lines[1] == f"MN002 <ip>:9319 {'k' * 50} {'a' * 64} 3"
+
+
+class FakeWalletRpc:
+    """Answers the wallet calls of make_transactions, sending takes a while."""
+
+    def __init__(self):
+        self.sent = []
+
+    def __call__(self, method, *params, coin=None):
+        if method == "listunspent":
+            return [{"txid": "c" * 64, "vout": 0, "amount": 5000}]
+        if method == "sendmany":
+            time.sleep(0.05)
+            self.sent.append(params[1])
+            return "d" * 64
+        if method == "gettransaction":
+            return {"hex": "00"}
+        if method == "decoderawtransaction":
+            return {
+                "vout": [
+                    {"n": n, "scriptPubKey": {"addresses": [address]}}
+                    for n, address in enumerate(self.sent[-1])
+                ]
+            }
+
+
+def test_make_transactions_concurrently(make_coin, monkeypatch):
+    coin = make_coin(collateral=1000)
+    coin.path_mn_conf.write_text(
+        f"MN001 <ip>:9319 {'k' * 50} <tx_hash> <tx_id> <address=addr1>\n"
+        f"MN002 <ip>:9319 {'k' * 50} <tx_hash> <tx_id> <address=addr2>\n"
+    )
+    rpc = FakeWalletRpc()
+    monkeypatch.setattr(wallet, "call", rpc)
+    results = []
+
+    def fund():
+        try:
+            results.append(wallet.make_transactions(coin=coin))
+        except ValueError as error:
+            results.append(error)
+
+    threads = [threading.Thread(target=fund) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert rpc.sent == [{"addr1": 1000, "addr2": 1000}]
+    assert "d" * 64 in results
+    assert [line.split()[3:] for line in coin.path_mn_conf.read_text().splitlines()] == [
+        ["d" * 64, "0"],
+        ["d" * 64, "1"],
+    ]
+
+
+def test_make_transactions_resumes_output_indices(make_coin, monkeypatch):
+    coin = make_coin(collateral=1000)
+    coin.path_mn_conf.write_text(
+        f"MN001 <ip>:9319 {'k' * 50} <tx_hash> <tx_id> <address=addr1>\n"
+    )
+    rpc = FakeWalletRpc()
+
+    def failing_decode(method, *params, coin=None):
+        if method == "gettransaction":
+            raise wallet.RpcError({"code": -28, "message": "Rescanning..."})
+        return rpc(method, *params, coin=coin)
+
+    monkeypatch.setattr(wallet, "call", failing_decode)
+    with pytest.raises(wallet.RpcError):
+        wallet.make_transactions(coin=coin)
+    assert coin.path_mn_conf.read_text().split()[3:] == ["d" * 64, "<tx_id>", "<address=addr1>"]
+
+    # Newer wallets report one address per output
+    monkeypatch.setattr(
+        wallet,
+        "call",
+        lambda method, *params, coin=None: (
+            {"vout": [{"n": 0, "scriptPubKey": {"address": "addr1"}}]}
+            if method == "decoderawtransaction"
+            else rpc(method, *params, coin=coin)
+        ),
+    )
+    with pytest.raises(ValueError, match="No masternodes to fund"):
+        wallet.make_transactions(coin=coin)
+    assert rpc.sent == [{"addr1": 1000}]
+    assert coin.path_mn_conf.read_text().split()[3:] == ["d" * 64, "0"]
+
+
+def test_make_transactions_keeps_fee_margin(make_coin, monkeypatch):
+    coin = make_coin(collateral=2500, fee_margin=1)
+    coin.path_mn_conf.write_text(
+        f"MN001 <ip>:9319 {'k' * 50} <tx_hash> <tx_id> <address=addr1>\n"
+        f"MN002 <ip>:9319 {'k' * 50} <tx_hash> <tx_id> <address=addr2>\n"
+    )
+    rpc = FakeWalletRpc()
+    monkeypatch.setattr(wallet, "call", rpc)
+
+    with pytest.raises(ValueError, match="Insufficient spendable balance"):
+        wallet.make_transactions(coin=coin)
+    assert rpc.sent == []
+
+
+def test_make_transactions_locks_inexact_collateral(make_coin, monkeypatch):
+    coin = make_coin(collateral=0.3)
+    coin.path_mn_conf.write_text(f"MN001 <ip>:9319 {'k' * 50} <tx_hash> <tx_id> <address=addr1>\n")
+    rpc = FakeWalletRpc()
+    locked = []
+
+    def call(method, *params, coin=None):
+        if method == "listunspent":
+            # 0.1 + 0.2 != 0.3 as floats
+            return [{"txid": "e" * 64, "vout": 1, "amount": 0.1 + 0.2}, *rpc(method, *params)]
+        if method == "lockunspent":
+            locked.append((params[0], params[1]))
+        return rpc(method, *params, coin=coin)
+
+    monkeypatch.setattr(wallet, "call", call)
+    wallet.make_transactions(coin=coin)
+
+    assert locked == [(False, [{"txid": "e" * 64, "vout": 1}]), (True, [{"txid": "e" * 64, "vout": 1}])]
+    assert wallet.to_satoshis(0.1 + 0.2) == wallet.to_satoshis(0.3) == 30_000_000
+
+
+def test_start_mns_empty_list(make_coin, monkeypatch):
+    coin = make_coin()
+    coin.path_mn_conf.write_text(f"MN001 1.2.3.4:9319 {'k' * 50} {'a' * 64} 1\n")
+    calls = []
+    monkeypatch.setattr(wallet, "call", lambda method, *params, coin=None: calls.append(params))
+    monkeypatch.setattr(wallet, "get_masternode_list", lambda coin=None: {})
+
+    assert wallet.start_mns([], coin=coin) == {}
+    assert calls == []
+
+
 # FIX: Specific to globaltoken
 def teardown_module(module):
     """Teardown any state that was previously setup with a setup_module method."""